@@ -0,0 +1,391 @@
+"""
+Micro-benchmarks for the env, solver and prompt hot paths, with regression gating.
+
+The suite runs in ``--rounds`` interleaved rounds, so a slow spell on the
+machine hits every benchmark rather than one. In each round a benchmark does one
+warm-up run and keeps the fastest of ``--repeat`` timed runs. The reported
+throughput is the median over rounds, and ``noise`` is how far the rounds spread
+around it, (max - min) / median. Results are written as JSON and compared with a
+stored baseline. A benchmark counts as a regression when it falls below the
+baseline by more than ``--threshold`` plus the noise band recorded with the
+baseline (capped at MAX_NOISE_BAND, with a warning), and is still that slow when
+measured again. The script then exits with status 1.
+
+    python benchmark_tictactoe.py --save-baseline    # record a baseline on this machine
+    python benchmark_tictactoe.py                    # compare with benchmarks/baseline.json
+
+Throughput depends on the host, so the baseline is not kept in the repository;
+record one on each machine that runs the gate.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import tictactoe_solver
+from tictactoe_board import CELL_MASKS, MOVES, legal_mask, to_cells, winner
+from tictactoe_env import TicTacToeEnv
+from tictactoe_game import EMPTY, build_prompt, check_winner, minimax, parse_move
+
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+# Widest noise band a baseline may add to the threshold. Without a cap, a baseline
+# recorded on a busy machine would push the limit to zero and switch the gate off.
+MAX_NOISE_BAND = 0.15
+
+# A benchmark builds its inputs and returns (operations per run, function doing one run).
+Benchmark = Callable[[], Tuple[int, Callable[[], None]]]
+
+
+def _positions_by_depth() -> Dict[int, List[Tuple[int, int]]]:
+    """Non-terminal (X, O) masks reachable with X moving first, grouped by marks on the board."""
+    by_depth: Dict[int, List[Tuple[int, int]]] = {}
+    seen = set()
+    stack = [(0, 0)]
+    while stack:
+        human, ai = stack.pop()
+        if (human, ai) in seen or winner(human, ai) is not None or not legal_mask(human, ai):
+            continue
+        seen.add((human, ai))
+        depth = bin(human | ai).count("1")
+        by_depth.setdefault(depth, []).append((human, ai))
+        for idx in MOVES[legal_mask(human, ai)]:
+            if depth % 2 == 0:
+                stack.append((human | CELL_MASKS[idx], ai))
+            else:
+                stack.append((human, ai | CELL_MASKS[idx]))
+    return {depth: sorted(positions) for depth, positions in sorted(by_depth.items())}
+
+
+def _sample_boards(count: int, seed: int = 0) -> List[List[str]]:
+    positions = [pos for group in _positions_by_depth().values() for pos in group]
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(positions), size=count)
+    return [to_cells(*positions[pick], empty=EMPTY) for pick in picks]
+
+
+def bench_env_step(steps: int = 20_000) -> Tuple[int, Callable[[], None]]:
+    env = TicTacToeEnv()
+    actions = np.random.default_rng(0).integers(0, 9, size=steps).tolist()
+
+    def run() -> None:
+        env.reset(seed=0)
+        for action in actions:
+            if env.step(action)[2]:
+                env.reset()
+
+    return steps, run
+
+
+def _bench_vec_env(backend: str, n_envs: int = 64, steps: int = 500, stats: bool = False) -> Benchmark:
+    def setup() -> Tuple[int, Callable[[], None]]:
+        from stable_baselines3.common.vec_env import DummyVecEnv
+
+        from tictactoe_vec_env import BatchedTicTacToeVecEnv
+
+        if backend == "batched":
+            vec_env = BatchedTicTacToeVecEnv(n_envs, seed=0)
+        else:
+            vec_env = DummyVecEnv([TicTacToeEnv for _ in range(n_envs)])
+        if stats:
+            from tictactoe_telemetry import VecEpisodeStats
+
+            vec_env = VecEpisodeStats(vec_env)
+        actions = np.random.default_rng(0).integers(0, 9, size=(steps, n_envs))
+
+        def run() -> None:
+            vec_env.reset()
+            for step_actions in actions:
+                vec_env.step(step_actions)
+
+        return steps * n_envs, run
+
+    return setup
+
+
+def bench_opponent_move(count: int = 20_000) -> Tuple[int, Callable[[], None]]:
+    # The env's agent plays X here, so X-to-move positions become opponent-to-move after one agent move.
+    env = TicTacToeEnv()
+    env.reset(seed=0)
+    positions = [pos for depth, group in _positions_by_depth().items() if depth % 2 for pos in group]
+    picks = np.random.default_rng(0).integers(0, len(positions), size=count)
+    masks = [list(positions[pick]) for pick in picks]
+
+    def run() -> None:
+        for pair in masks:
+            env.bits.masks = pair
+            env._opponent_move()
+
+    return count, run
+
+
+def bench_check_winner(count: int = 20_000) -> Tuple[int, Callable[[], None]]:
+    boards = _sample_boards(count)
+
+    def run() -> None:
+        for board in boards:
+            check_winner(board)
+
+    return count, run
+
+
+def bench_minimax_full_tree() -> Tuple[int, Callable[[], None]]:
+    def run() -> None:
+        tictactoe_solver.solved_table.cache_clear()
+        tictactoe_solver.solved_table()
+
+    return 1, run
+
+
+def bench_minimax_lookup(count: int = 20_000) -> Tuple[int, Callable[[], None]]:
+    boards = _sample_boards(count)
+
+    def run() -> None:
+        for board in boards:
+            minimax(board, True)
+
+    return count, run
+
+
+def _bench_best_move(depth: int, count: int = 5_000) -> Benchmark:
+    def setup() -> Tuple[int, Callable[[], None]]:
+        positions = _positions_by_depth()[depth]
+        picks = np.random.default_rng(depth).integers(0, len(positions), size=count)
+        boards = [to_cells(*positions[pick], empty=EMPTY) for pick in picks]
+        maximizing = depth % 2 == 1
+
+        def run() -> None:
+            for board in boards:
+                tictactoe_solver.best_move(board, maximizing)
+
+        return count, run
+
+    return setup
+
+
+def bench_build_prompt(count: int = 20_000) -> Tuple[int, Callable[[], None]]:
+    boards = _sample_boards(count)
+
+    def run() -> None:
+        for board in boards:
+            build_prompt(board)
+
+    return count, run
+
+
+def bench_parse_move(count: int = 20_000) -> Tuple[int, Callable[[], None]]:
+    replies = [
+        "Taking the center blocks both diagonals.\nMOVE: 4",
+        "X threatens the top row, so I must block at 2.\nMove: 2",
+        "The corner at 8 sets up a fork. Final answer: 8",
+        "I would play cell 6 because 0 and 3 are taken.",
+    ]
+    boards = _sample_boards(count)
+    pairs = [(replies[idx % len(replies)], board) for idx, board in enumerate(boards)]
+
+    def run() -> None:
+        for text, board in pairs:
+            parse_move(text, board)
+
+    return count, run
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "env_step": bench_env_step,
+    "vec_env_step_dummy": _bench_vec_env("dummy"),
+    "vec_env_step_batched": _bench_vec_env("batched"),
+    "vec_env_step_batched_stats": _bench_vec_env("batched", stats=True),
+    "opponent_move": bench_opponent_move,
+    "check_winner": bench_check_winner,
+    "minimax_full_tree": bench_minimax_full_tree,
+    "minimax_lookup": bench_minimax_lookup,
+    **{f"best_move_depth_{depth}": _bench_best_move(depth) for depth in range(9)},
+    "build_prompt": bench_build_prompt,
+    "parse_move": bench_parse_move,
+}
+
+
+def _best_run(run: Callable[[], None], repeat: int) -> float:
+    run()
+    best = float("inf")
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return best
+
+
+def run_suite(names: List[str], repeat: int, rounds: int) -> Dict[str, Dict[str, float]]:
+    benchmarks = {name: BENCHMARKS[name]() for name in names}
+    times: Dict[str, List[float]] = {name: [] for name in names}
+    for _ in range(rounds):
+        for name, (_, run) in benchmarks.items():
+            times[name].append(_best_run(run, repeat))
+    results: Dict[str, Dict[str, float]] = {}
+    for name, (ops, _) in benchmarks.items():
+        rates = ops / np.array(times[name])
+        median = float(np.median(rates))
+        results[name] = {
+            "ops_per_sec": median,
+            "us_per_op": 1e6 / median,
+            "noise": float((rates.max() - rates.min()) / median),
+        }
+        print(
+            f"  {name:<28} {median:>14,.0f} ops/s {results[name]['us_per_op']:>12.3f} us/op "
+            f"(±{results[name]['noise'] / 2:.0%})"
+        )
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float
+) -> List[str]:
+    """
+    Names of benchmarks whose throughput fell below the baseline by more than
+    ``threshold`` plus the noise band recorded with the baseline (at most MAX_NOISE_BAND).
+    """
+    regressions = []
+    widened = []
+    print(f"Compared with baseline (fail below {1 - threshold:.0%} of baseline throughput, less its noise band):")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"  {name:<28} no baseline")
+            continue
+        ratio = result["ops_per_sec"] / baseline[name]["ops_per_sec"]
+        noise = baseline[name].get("noise", 0.0)
+        band = min(noise, MAX_NOISE_BAND)
+        limit = 1 - threshold - band
+        if band > 0:
+            widened.append(name)
+        slower = ratio < limit
+        if slower:
+            regressions.append(name)
+        print(
+            f"  {name:<28} {ratio:>7.2f}x  limit {limit:.2f}x (band {band:.2f}{', capped' if noise > band else ''})"
+            f"  {'REGRESSION' if slower else 'ok'}"
+        )
+    if widened:
+        print(
+            f"Warning: baseline noise lowered the limit of {len(widened)} benchmark(s) (bands capped at "
+            f"{MAX_NOISE_BAND:.0%}); record the baseline on a quiet machine to keep the gate tight."
+        )
+    return regressions
+
+
+def _noisy(results: Dict[str, Dict[str, float]]) -> List[str]:
+    """Benchmarks whose spread is wider than MAX_NOISE_BAND, so their band would be capped."""
+    return [name for name, result in results.items() if result["noise"] > MAX_NOISE_BAND]
+
+
+def _metadata() -> Dict[str, str]:
+    return {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def _write_json(path: str, results: Dict[str, Dict[str, float]]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump({"meta": _metadata(), "results": results}, handle, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark TicTacToe hot paths and gate on regressions.")
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE, help="Baseline JSON to compare against.")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Write these results to --baseline instead of comparing against it.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="",
+        help="Where to write this run's results (default: runs/bench-<timestamp>.json).",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed fractional slowdown before a benchmark counts as a regression.",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark and round; the fastest is kept.")
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=5,
+        help="Interleaved rounds over the suite; the median is compared and the spread sets each noise band.",
+    )
+    parser.add_argument(
+        "--filter",
+        type=str,
+        default="",
+        help="Comma-separated substrings; only benchmarks whose name contains one of them run.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    patterns = [part.strip() for part in args.filter.split(",") if part.strip()]
+    names = [name for name in BENCHMARKS if not patterns or any(part in name for part in patterns)]
+    if not names:
+        raise SystemExit(f"No benchmark matches '{args.filter}'. Available: {', '.join(BENCHMARKS)}.")
+
+    print(f"Running {len(names)} benchmark(s), median over {args.rounds} rounds of best of {args.repeat}:")
+    results = run_suite(names, args.repeat, args.rounds)
+    output = args.output or os.path.join("runs", f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+
+    if args.save_baseline:
+        _write_json(output, results)
+        print(f"Results written to {output}")
+        _write_json(args.baseline, results)
+        print(f"Baseline written to {args.baseline}")
+        noisy = _noisy(results)
+        if noisy:
+            print(
+                f"Warning: {', '.join(noisy)} varied by more than {MAX_NOISE_BAND:.0%} between rounds; "
+                f"their noise bands are capped at {MAX_NOISE_BAND:.0%}. Re-record on a quieter machine."
+            )
+        return 0
+    if not os.path.exists(args.baseline):
+        _write_json(output, results)
+        print(f"Results written to {output}")
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        # One bad stretch on a shared machine should not fail the gate: a real regression survives a second look.
+        print(f"Measuring {', '.join(regressions)} again:")
+        results.update(run_suite(regressions, args.repeat, args.rounds))
+        regressions = compare({name: results[name] for name in regressions}, baseline, args.threshold)
+    # Written after any re-measure, so the file holds the numbers the gate used.
+    _write_json(output, results)
+    print(f"Results written to {output}")
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
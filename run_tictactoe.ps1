@@ -6,7 +6,8 @@ param(
     [string]$Entity = "am893120",
     [string]$Group = "ppo-tictactoe",
     [int]$TotalTimesteps = 500000,
-    [int]$NEnvs = 8
+    [int]$NEnvs = 8,
+    [int]$MaxWorkers = 0
 )
 
 if (-not $OpenAIKey) {
@@ -25,13 +26,14 @@ if (-not $seedList) {
     exit 1
 }
 
-foreach ($seed in $seedList) {
-    Write-Host "=== Running seed $seed ===" -ForegroundColor Cyan
-    python train_tictactoe_wandb.py `
-        --project $Project `
-        --entity $Entity `
-        --group $Group `
-        --total-timesteps $TotalTimesteps `
-        --n-envs $NEnvs `
-        --seed $seed
-}
+$wandbMode = if ($WandbKey) { "online" } else { "offline" }
+
+python sweep_tictactoe.py `
+    --seeds ($seedList -join ",") `
+    --max-workers $MaxWorkers `
+    --wandb-mode $wandbMode `
+    --project $Project `
+    --entity $Entity `
+    --group $Group `
+    --total-timesteps $TotalTimesteps `
+    --n-envs $NEnvs
@@ -9,6 +9,7 @@ ENTITY="${ENTITY:-am893120}"
 GROUP="${GROUP:-ppo-tictactoe}"
 TOTAL_TIMESTEPS="${TOTAL_TIMESTEPS:-500000}"
 N_ENVS="${N_ENVS:-8}"
+MAX_WORKERS="${MAX_WORKERS:-0}"
 
 if [[ -z "$OPENAI_KEY" ]]; then
   read -r -p "Enter OPENAI_API_KEY (blank to skip OpenAI): " OPENAI_KEY || true
@@ -32,23 +33,22 @@ if ! command -v "$PYTHON_BIN" >/dev/null 2>&1; then
   fi
 fi
 
-IFS=',' read -ra SEED_LIST <<< "$SEEDS"
-if [[ ${#SEED_LIST[@]} -eq 0 ]]; then
+if [[ -z "${SEEDS//[, ]/}" ]]; then
   echo "No seeds provided. Set SEEDS env var like '0,1,2,3'." >&2
   exit 1
 fi
 
-for seed in "${SEED_LIST[@]}"; do
-  seed_trimmed="$(echo "$seed" | xargs)"
-  if [[ -z "$seed_trimmed" ]]; then
-    continue
-  fi
-  echo "=== Running seed $seed_trimmed ==="
-  $PYTHON_BIN train_tictactoe_wandb.py \
-    --project "$PROJECT" \
-    --entity "$ENTITY" \
-    --group "$GROUP" \
-    --total-timesteps "$TOTAL_TIMESTEPS" \
-    --n-envs "$N_ENVS" \
-    --seed "$seed_trimmed"
-done
+WANDB_MODE_ARG="offline"
+if [[ -n "$WANDB_KEY" ]]; then
+  WANDB_MODE_ARG="online"
+fi
+
+$PYTHON_BIN sweep_tictactoe.py \
+  --seeds "$SEEDS" \
+  --max-workers "$MAX_WORKERS" \
+  --wandb-mode "$WANDB_MODE_ARG" \
+  --project "$PROJECT" \
+  --entity "$ENTITY" \
+  --group "$GROUP" \
+  --total-timesteps "$TOTAL_TIMESTEPS" \
+  --n-envs "$N_ENVS"
@@ -0,0 +1,239 @@
+import argparse
+import csv
+import itertools
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def _parse_bool(value: str) -> bool:
+    if value.lower() in ("1", "true", "on", "yes"):
+        return True
+    if value.lower() in ("0", "false", "off", "no"):
+        return False
+    raise ValueError(f"Expected on/off, got '{value}'.")
+
+
+# Grid axes: sweep option dest -> (training flag, value type). Boolean axes toggle a store_true flag.
+# Axis options are named so they never clash with the training flags passed through.
+GRID_AXES: Dict[str, Tuple[str, Any]] = {
+    "seeds": ("--seed", int),
+    "learning_rates": ("--learning-rate", float),
+    "n_steps": ("--n-steps", int),
+    "draw_rewards": ("--draw-reward", float),
+    "step_penalties": ("--step-penalty", float),
+    "invalid_penalties": ("--invalid-penalty", float),
+    "action_masking": ("--action-masking", _parse_bool),
+}
+
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+
+def _split(values: str, cast: Any) -> List[Any]:
+    return [cast(value.strip()) for value in values.split(",") if value.strip()]
+
+
+def build_jobs(args: argparse.Namespace, train_argv: Sequence[str]) -> List[Dict[str, Any]]:
+    axes = [(name, flag, _split(getattr(args, name), cast)) for name, (flag, cast) in GRID_AXES.items()]
+    axes = [(name, flag, values) for name, flag, values in axes if values]
+    jobs = []
+    for combo in itertools.product(*(values for _, _, values in axes)):
+        params = {name: value for (name, _, _), value in zip(axes, combo)}
+        argv = list(train_argv)
+        for (_, flag, _), value in zip(axes, combo):
+            if isinstance(value, bool):
+                argv += [flag] if value else []
+            else:
+                argv += [flag, str(value)]
+        jobs.append({"params": params, "argv": argv})
+    return jobs
+
+
+def _limit_threads(threads: int, wandb_mode: str) -> None:
+    # Runs in each fresh worker before torch/numpy are imported there.
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    os.environ["WANDB_MODE"] = wandb_mode
+    os.environ.setdefault("WANDB_SILENT", "true")
+
+
+def _run_job(argv: List[str], threads: int) -> Dict[str, Any]:
+    import torch
+
+    from train_tictactoe_wandb import parse_args, train
+
+    torch.set_num_threads(threads)
+    return train(parse_args(argv))
+
+
+def run_sweep(
+    jobs: List[Dict[str, Any]], max_workers: int, threads: int, wandb_mode: str
+) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = [{} for _ in jobs]
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=ctx,
+        initializer=_limit_threads,
+        initargs=(threads, wandb_mode),
+        max_tasks_per_child=1,
+    ) as pool:
+        futures = {pool.submit(_run_job, job["argv"], threads): idx for idx, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            job = jobs[futures[future]]
+            row: Dict[str, Any] = dict(job["params"])
+            try:
+                row.update(future.result())
+                row["status"] = "ok"
+            except Exception as exc:
+                row["status"] = f"failed: {exc}"
+            print(f"[sweep] {job['params']} -> {row['status']}")
+            results[futures[future]] = row
+    return results
+
+
+def write_summary(results: List[Dict[str, Any]], path: str) -> None:
+    results = [{key: value for key, value in row.items() if key != "curve"} for row in results]
+    columns: List[str] = []
+    for row in results:
+        columns.extend(key for key in row if key not in columns)
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(results)
+
+    widths = {col: max(len(col), *(len(_fmt(row.get(col, ""))) for row in results)) for col in columns}
+    print("  ".join(col.ljust(widths[col]) for col in columns))
+    for row in results:
+        print("  ".join(_fmt(row.get(col, "")).ljust(widths[col]) for col in columns))
+    print(f"[sweep] Summary written to {path}")
+
+
+def write_curves(jobs: List[Dict[str, Any]], results: List[Dict[str, Any]], path: str) -> None:
+    """
+    Long-format CSV of every run's exploitability evaluations (one row per run and
+    evaluation), then the curves averaged over seeds for each remaining grid point.
+    """
+    rows: List[Dict[str, Any]] = []
+    for job, result in zip(jobs, results):
+        for point in result.get("curve", []):
+            rows.append({**job["params"], **point})
+    if not rows:
+        return
+    columns: List[str] = []
+    for row in rows:
+        columns.extend(key for key in row if key not in columns)
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    groups: Dict[Tuple[Any, ...], Dict[int, List[Dict[str, Any]]]] = {}
+    for job, result in zip(jobs, results):
+        label = tuple((name, value) for name, value in job["params"].items() if name != "seeds")
+        for point in result.get("curve", []):
+            groups.setdefault(label, {}).setdefault(point["timesteps"], []).append(point)
+    metrics = ("ep_rew_mean", "illegal_moves", "losing_moves", "mean_regret")
+    for label, by_step in groups.items():
+        print(f"[sweep] curve {dict(label) or 'all runs'} (mean over seeds)")
+        print("  " + "  ".join(name.rjust(13) for name in ("timesteps",) + metrics))
+        for timesteps in sorted(by_step):
+            points = by_step[timesteps]
+            means = [sum(point[name] for point in points) / len(points) for name in metrics]
+            print("  " + "  ".join(_fmt(value).rjust(13) for value in [timesteps, *means]))
+    print(f"[sweep] Curves written to {path}")
+
+
+def _fmt(value: Any) -> str:
+    return f"{value:.4g}" if isinstance(value, float) else str(value)
+
+
+def parse_sweep_args(argv: Optional[Sequence[str]] = None) -> Tuple[argparse.Namespace, List[str]]:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Run a grid of train_tictactoe_wandb.py runs in parallel. "
+            "Unrecognised flags are passed through to every training run."
+        ),
+        # No prefix matching: --seed 3 is a training flag, not an abbreviation of --seeds.
+        allow_abbrev=False,
+    )
+    parser.add_argument("--seeds", type=str, default="0,1,2,3", help="Comma-separated seeds.")
+    parser.add_argument("--learning-rates", type=str, default="", help="Comma-separated learning rates.")
+    parser.add_argument(
+        "--n-steps-values", dest="n_steps", type=str, default="", help="Comma-separated rollout lengths."
+    )
+    parser.add_argument("--draw-rewards", type=str, default="", help="Comma-separated draw rewards.")
+    parser.add_argument("--step-penalties", type=str, default="", help="Comma-separated step penalties.")
+    parser.add_argument("--invalid-penalties", type=str, default="", help="Comma-separated invalid-move rewards.")
+    parser.add_argument(
+        "--action-masking-values",
+        dest="action_masking",
+        type=str,
+        default="",
+        help='Masked vs. unmasked PPO on the same seeds, e.g. "off,on".',
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=0,
+        help="Runs in flight at once (0 = one per CPU, at most the number of runs).",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=0,
+        help="torch/BLAS threads per run (0 = CPUs divided evenly between workers).",
+    )
+    parser.add_argument(
+        "--wandb-mode",
+        type=str,
+        choices=("offline", "online"),
+        default="offline",
+        help="W&B mode for every run; offline runs can be synced later with `wandb sync`.",
+    )
+    parser.add_argument(
+        "--summary",
+        type=str,
+        default="",
+        help="CSV path for the combined results (default: runs/sweep-<timestamp>.csv).",
+    )
+    args, train_argv = parser.parse_known_args(argv)
+    for name, (flag, _) in GRID_AXES.items():
+        if getattr(args, name) and any(arg == flag or arg.startswith(flag + "=") for arg in train_argv):
+            parser.error(f"{flag} is set per run by the sweep grid; give its values to the sweep's option instead.")
+    return args, train_argv
+
+
+def main() -> None:
+    args, train_argv = parse_sweep_args()
+    jobs = build_jobs(args, train_argv)
+    if not jobs:
+        raise SystemExit("No runs to launch; pass at least one seed.")
+
+    # Fail fast on bad passthrough flags instead of inside every worker.
+    from train_tictactoe_wandb import parse_args
+
+    parse_args(jobs[0]["argv"])
+
+    cpus = os.cpu_count() or 1
+    max_workers = args.max_workers or min(cpus, len(jobs))
+    threads = args.threads_per_worker or max(1, cpus // max_workers)
+    print(f"[sweep] {len(jobs)} runs, {max_workers} at a time, {threads} thread(s) each.")
+
+    results = run_sweep(jobs, max_workers, threads, args.wandb_mode)
+    os.makedirs("runs", exist_ok=True)
+    summary = args.summary or os.path.join("runs", f"sweep-{time.strftime('%Y%m%d-%H%M%S')}.csv")
+    write_summary(results, summary)
+    write_curves(jobs, results, os.path.splitext(summary)[0] + "-curves.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+A local stand-in for the chat completions endpoint, for tests of the HTTP clients.
+
+    with StandIn(delay=0.05) as server:
+        client = OpenAIClient("test-key", server.base_url)
+
+It speaks HTTP/1.1 with keep-alive and counts the connections it accepts, the
+requests it answers and the most it had in flight at once. Every request waits
+``delay`` seconds, and a ``rate_limit`` share of them get HTTP 429 instead of an
+answer. ``close_after_response`` closes each connection after answering while
+still advertising keep-alive, which is what an idle timeout on the real API
+looks like to a pooled connection; ``drop`` closes it without answering at all.
+"""
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+Reply = Callable[[Dict[str, Any]], str]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.standin.lock:
+            self.server.standin.connections += 1
+
+    def do_POST(self) -> None:
+        standin = self.server.standin
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if standin.drop:
+            self.close_connection = True
+            return
+        with standin.lock:
+            standin.in_flight += 1
+            standin.max_in_flight = max(standin.max_in_flight, standin.in_flight)
+            limited = standin.rng.random() < standin.rate_limit
+        try:
+            if standin.delay:
+                standin.stopped.wait(standin.delay)
+            if limited:
+                status = 429
+                body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests"}})
+            else:
+                status = 200
+                body = json.dumps({"choices": [{"message": {"content": standin.reply(payload)}}]})
+            with standin.lock:
+                if limited:
+                    standin.rate_limited += 1
+                else:
+                    standin.requests += 1
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except ConnectionError:
+            # The client went away (timed out or was killed) before the answer.
+            self.close_connection = True
+        finally:
+            with standin.lock:
+                standin.in_flight -= 1
+        if standin.close_after_response:
+            self.close_connection = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    standin: "StandIn"
+
+
+class StandIn:
+    def __init__(
+        self,
+        reply: Optional[Reply] = None,
+        delay: float = 0.0,
+        rate_limit: float = 0.0,
+        close_after_response: bool = False,
+        drop: bool = False,
+        seed: int = 0,
+    ) -> None:
+        self.reply: Reply = reply or (lambda payload: "MOVE: 4")
+        self.delay = delay
+        self.rate_limit = rate_limit
+        self.close_after_response = close_after_response
+        self.drop = drop
+        self.rng = random.Random(seed)
+        self.connections = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.httpd = _Server(("127.0.0.1", 0), _Handler)
+        self.httpd.standin = self
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self) -> "StandIn":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stopped.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,137 @@
+"""BackendChain fallback order, deadlines and metrics, with stub backends in front of the solver."""
+import threading
+import time
+
+import pytest
+
+import tictactoe_solver
+from tictactoe_backends import Backend, BackendChain, LLMBackend, SolverBackend
+from tictactoe_solver import EMPTY
+
+# X took the centre; O (the AI) is to move.
+BOARD = [EMPTY] * 4 + ["X"] + [EMPTY] * 4
+
+
+class SlowBackend(Backend):
+    name = "slow"
+
+    def __init__(self, budget, release):
+        super().__init__(budget)
+        self.release = release
+
+    def move(self, board, timeout):
+        self.release.wait(10)
+        return board.index(EMPTY)
+
+
+class RaisingBackend(Backend):
+    name = "raising"
+
+    def move(self, board, timeout):
+        raise RuntimeError("backend down")
+
+
+class IllegalBackend(Backend):
+    name = "illegal"
+
+    def move(self, board, timeout):
+        return board.index("X")
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    # Let abandoned slow calls finish so no worker thread outlives the test.
+    event.set()
+
+
+def _chain(backends, deadline):
+    chain = BackendChain(backends, deadline)
+    chain.load()
+    return chain
+
+
+def test_falls_back_to_the_solver_within_the_deadline(release):
+    chain = _chain([SlowBackend(0.1, release), RaisingBackend(0.1), IllegalBackend(0.1), SolverBackend(0.5)], 1.0)
+    started = time.perf_counter()
+    move, served_by = chain.move(BOARD)
+    elapsed = time.perf_counter() - started
+    chain.close()
+
+    assert (move, served_by) == (tictactoe_solver.best_move(BOARD), "solver")
+    assert elapsed < chain.deadline
+    snap = chain.metrics.snapshot()
+    assert snap["moves"] == 1 and snap["unanswered"] == 0 and snap["deadline_exceeded"] == 0
+    expected = {"slow": "timeout", "raising": "error", "illegal": "miss", "solver": "success"}
+    for name, outcome in expected.items():
+        data = snap["backends"][name]
+        assert data["calls"] == 1
+        assert data["outcomes"][outcome] == 1
+        assert data["fallbacks"] == (0 if name == "solver" else 1)
+        assert data["served"] == (1 if name == "solver" else 0)
+    # The slow backend was abandoned at its budget, not waited on.
+    assert 0.1 <= snap["backends"]["slow"]["latency_sum_seconds"] < 0.5
+
+
+def test_prometheus_text_matches_the_counters(release):
+    chain = _chain([SlowBackend(0.05, release), IllegalBackend(0.1), SolverBackend(0.5)], 1.0)
+    for _ in range(2):
+        chain.move(BOARD)
+    chain.close()
+    lines = set(chain.metrics.to_prometheus().splitlines())
+
+    for line in (
+        'tictactoe_ai_backend_calls_total{backend="slow",outcome="timeout"} 2',
+        'tictactoe_ai_backend_calls_total{backend="illegal",outcome="miss"} 2',
+        'tictactoe_ai_backend_calls_total{backend="solver",outcome="success"} 2',
+        'tictactoe_ai_backend_calls_total{backend="solver",outcome="error"} 0',
+        'tictactoe_ai_backend_fallbacks_total{backend="slow"} 2',
+        'tictactoe_ai_backend_fallbacks_total{backend="solver"} 0',
+        'tictactoe_ai_moves_total{backend="solver"} 2',
+        'tictactoe_ai_moves_total{backend="slow"} 0',
+        'tictactoe_ai_moves_total{backend="none"} 0',
+        "tictactoe_ai_deadline_exceeded_total 0",
+    ):
+        assert line in lines, line
+    for name in ("slow", "illegal", "solver"):
+        # Buckets are cumulative: +Inf holds every call.
+        assert f'tictactoe_ai_backend_latency_seconds_bucket{{backend="{name}",le="+Inf"}} 2' in lines
+        assert f'tictactoe_ai_backend_latency_seconds_count{{backend="{name}"}} 2' in lines
+    # A call abandoned after its 50 ms budget never lands in the buckets up to 25 ms.
+    assert 'tictactoe_ai_backend_latency_seconds_bucket{backend="slow",le="0.025"} 0' in lines
+
+
+def test_deadline_stops_the_chain_before_the_solver(release):
+    # The slow backend's budget is cut to the whole deadline, which is then used up.
+    chain = _chain([SlowBackend(1.0, release), SolverBackend(0.5)], 0.2)
+    started = time.perf_counter()
+    assert chain.move(BOARD) == (None, None)
+    elapsed = time.perf_counter() - started
+    chain.close()
+
+    assert elapsed < chain.deadline + 0.1
+    snap = chain.metrics.snapshot()
+    assert snap["unanswered"] == 1 and snap["deadline_exceeded"] == 1
+    assert snap["backends"]["solver"]["calls"] == 0
+    lines = chain.metrics.to_prometheus().splitlines()
+    assert 'tictactoe_ai_moves_total{backend="none"} 1' in lines
+    assert "tictactoe_ai_deadline_exceeded_total 1" in lines
+
+
+def test_llm_gets_at_most_its_budget_and_illegal_replies_fall_through():
+    calls = []
+
+    def request_fn(board, model, api_key, timeout, client=None):
+        calls.append(timeout)
+        return board.index("X")
+
+    llm = LLMBackend(0.3, request_fn, "model", "key", timeout=30.0, base_url="", prompt_version="v")
+    # No load(): the stub needs no HTTP client.
+    chain = BackendChain([llm, SolverBackend(0.5)], 1.0)
+    move, served_by = chain.move(BOARD)
+    chain.close()
+
+    assert served_by == "solver" and move == tictactoe_solver.best_move(BOARD)
+    assert calls and calls[0] <= 0.3
+    assert chain.metrics.snapshot()["backends"]["llm"]["outcomes"]["miss"] == 1
@@ -0,0 +1,32 @@
+"""The benchmark gate's comparison with a stored baseline."""
+import json
+
+import benchmark_tictactoe
+from benchmark_tictactoe import MAX_NOISE_BAND, compare
+
+
+def _result(ops, noise=0.0):
+    return {"ops_per_sec": ops, "us_per_op": 1e6 / ops, "noise": noise}
+
+
+def test_noisy_baseline_cannot_switch_the_gate_off(capsys):
+    # Noise 0.9 would put the limit at 1 - 0.25 - 0.9 < 0 without the cap.
+    baseline = {"fast": _result(100.0, noise=0.9)}
+    assert compare({"fast": _result(50.0)}, baseline, threshold=0.25) == ["fast"]
+    assert compare({"fast": _result(100.0 * (1 - 0.25 - MAX_NOISE_BAND) + 1)}, baseline, threshold=0.25) == []
+    assert "Warning: baseline noise" in capsys.readouterr().out
+
+
+def test_quiet_baseline_prints_no_warning(capsys):
+    assert compare({"fast": _result(80.0)}, {"fast": _result(100.0)}, threshold=0.25) == []
+    assert "Warning" not in capsys.readouterr().out
+
+
+def test_results_file_holds_the_remeasured_numbers(tmp_path, monkeypatch):
+    baseline, output = tmp_path / "baseline.json", tmp_path / "out.json"
+    baseline.write_text(json.dumps({"meta": {}, "results": {"fast": _result(100.0)}}))
+    # A slow first measurement, then a normal one on the second look.
+    runs = iter([{"fast": _result(10.0)}, {"fast": _result(99.0)}])
+    monkeypatch.setattr(benchmark_tictactoe, "run_suite", lambda names, repeat, rounds: next(runs))
+    assert benchmark_tictactoe.main(["--filter", "check_winner", "--baseline", str(baseline), "--output", str(output)]) == 0
+    assert json.loads(output.read_text())["results"]["fast"]["ops_per_sec"] == 99.0
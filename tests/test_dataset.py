@@ -0,0 +1,59 @@
+"""Generated trajectory shards, read back through TrajectoryDataset."""
+import numpy as np
+import pytest
+
+import tictactoe_solver
+from tictactoe_board import from_array
+from tictactoe_dataset import TrajectoryDataset, generate
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("dataset"))
+    # Three shards, so counts are summed across shards.
+    generate(root, ("solver", "random"), transitions=6000, shard_rows=2000, workers=1, seed=0)
+    return TrajectoryDataset(root)
+
+
+def _rows(dataset):
+    batches = list(dataset.iter_batches(batch_size=512))
+    return {name: np.concatenate([batch[name] for batch in batches]) for name in batches[0]}
+
+
+def test_row_and_game_counts(dataset):
+    rows = _rows(dataset)
+    assert len(dataset.shards) == 3
+    assert len(rows["action"]) == len(dataset)
+    assert 0 < len(dataset) <= 6000
+    assert int((rows["ply"] == 0).sum()) == dataset.games
+
+
+def test_legal_mask_matches_empty_cells(dataset):
+    rows = _rows(dataset)
+    np.testing.assert_array_equal(rows["legal"], rows["obs"] == 0)
+    assert rows["legal"][np.arange(len(rows["action"])), rows["action"]].all()
+
+
+def test_values_agree_with_the_solver(dataset):
+    rows = _rows(dataset)
+    for obs, value, action, action_value in zip(rows["obs"], rows["value"], rows["action"], rows["action_value"]):
+        mover, other = from_array(obs)
+        assert value == tictactoe_solver.lookup_masks(other, mover, True)[0]
+        # After the move it is the other side's turn; the value is still the mover's.
+        assert action_value == tictactoe_solver.lookup_masks(other, mover | 1 << int(action), False)[0]
+
+
+def test_each_player_gets_a_terminal_row_with_the_result(dataset):
+    rows = _rows(dataset)
+    starts = np.flatnonzero(rows["ply"] == 0)
+    saw_loss = False
+    for start, stop in zip(starts, list(starts[1:]) + [len(rows["ply"])]):
+        done = np.flatnonzero(rows["done"][start:stop])
+        # The last two moves, one per player.
+        assert list(done) == [stop - start - 2, stop - start - 1]
+        reward, outcome = rows["reward"][start:stop], rows["outcome"][start:stop]
+        np.testing.assert_array_equal(reward[done], outcome[done])
+        assert not reward[: done[0]].any()
+        assert reward[done].sum() == 0
+        saw_loss |= bool((reward[done] == -1).any())
+    assert saw_loss
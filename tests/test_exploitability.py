@@ -0,0 +1,17 @@
+"""The exploitability CLI on PPO and MaskablePPO zips."""
+import pytest
+
+from test_policy import _tiny_model
+from tictactoe_exploitability import main
+
+
+@pytest.mark.parametrize("algo_name", ["PPO", "MaskablePPO"])
+def test_cli_reads_the_algorithm_from_the_zip(tmp_path, capsys, algo_name):
+    path = tmp_path / "model.zip"
+    _tiny_model(algo_name).save(path)
+    assert main([str(path), "--worst", "0"]) == 0
+    report = capsys.readouterr().out
+    assert "Positions evaluated: 4520" in report
+    if algo_name == "MaskablePPO":
+        # Scored masked, as it acts in training: it can never pick an occupied cell.
+        assert "P(illegal):       0.0000" in report
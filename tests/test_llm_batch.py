@@ -0,0 +1,113 @@
+"""tictactoe_llm_batch end to end against a local stand-in with latency and 429s."""
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+import tictactoe_llm_batch
+from openai_standin import StandIn
+from tictactoe_cache import board_key
+from tictactoe_llm_batch import ai_positions, main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIMIT = 60
+
+
+def first_empty_cells(payload):
+    # A well-behaved model: one "BOARD n: MOVE: m" line per board, picking its first empty cell.
+    prompt = payload["messages"][-1]["content"]
+    lines = []
+    for number, cells in re.findall(r"BOARD (\d+): ((?:\d:\S\s?)+)", prompt):
+        free = [cell.split(":")[0] for cell in cells.split() if cell.endswith(":.")]
+        lines.append(f"BOARD {number}: MOVE: {free[0]}")
+    return "\n".join(lines)
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    def start(**kwargs):
+        server = StandIn(reply=first_empty_cells, **kwargs).__enter__()
+        # The same settings main() reads from OPENAI_BASE_URL and OPENAI_API_KEY at import.
+        monkeypatch.setattr(tictactoe_llm_batch, "OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setattr(tictactoe_llm_batch, "OPENAI_API_KEY", "test-key")
+        servers.append(server)
+        return server
+
+    servers = []
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
+
+
+def _records(path):
+    with open(path, encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle]
+
+
+def test_concurrency_is_bounded_and_429s_are_retried(tmp_path, endpoint, capsys):
+    server = endpoint(delay=0.02, rate_limit=0.3)
+    output = str(tmp_path / "moves.jsonl")
+    args = ["--output", output, "--limit", str(LIMIT), "--batch-size", "4", "--concurrency", "3"]
+    assert main(args) == 0
+
+    assert 1 <= server.max_in_flight <= 3
+    assert server.rate_limited > 0
+    report = capsys.readouterr().out
+    assert "0 batches failed" in report
+    assert f"{server.rate_limited} rate limited" in report
+    keys = [record["board"] for record in _records(output)]
+    assert len(keys) == len(set(keys)) == LIMIT
+
+
+def test_resume_after_kill_asks_each_board_once(tmp_path, endpoint):
+    server = endpoint(delay=0.2)
+    output = str(tmp_path / "moves.jsonl")
+    args = ["--output", output, "--limit", str(LIMIT), "--batch-size", "4", "--concurrency", "2"]
+    env = dict(
+        os.environ,
+        OPENAI_BASE_URL=server.base_url,
+        OPENAI_API_KEY="test-key",
+        PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+    )
+    code = f"import sys; from tictactoe_llm_batch import main; sys.exit(main({args!r}))"
+    proc = subprocess.Popen([sys.executable, "-c", code], env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline and not (os.path.exists(output) and os.path.getsize(output)):
+        time.sleep(0.01)
+    proc.send_signal(signal.SIGKILL)
+    proc.wait()
+    first_run = len(_records(output))
+    assert 0 < first_run < LIMIT
+
+    # Let the killed run's requests, including any still being read, finish before counting the resumed run's.
+    time.sleep(server.delay)
+    while server.in_flight:
+        time.sleep(0.01)
+    server.requests = 0
+    assert main(args) == 0
+    keys = [record["board"] for record in _records(output)]
+    assert len(keys) == len(set(keys)) == LIMIT
+    # Only the boards missing from the checkpoint were asked again.
+    assert server.requests == -(-(LIMIT - first_run) // 4)
+
+
+def test_resume_after_a_torn_line(tmp_path, endpoint):
+    endpoint()
+    output = str(tmp_path / "moves.jsonl")
+    args = ["--output", output, "--limit", "8", "--batch-size", "4"]
+    assert main(args) == 0
+    lines = open(output, encoding="utf-8").read().splitlines(keepends=True)
+    # The last record was cut off mid-write.
+    with open(output, "w", encoding="utf-8") as handle:
+        handle.writelines(lines[:-1])
+        handle.write(lines[-1][:10])
+
+    assert main(args) == 0
+    keys = [record["board"] for record in _records(output)]
+    assert len(keys) == len(set(keys)) == 8
+    assert set(keys) == {board_key(board) for board in ai_positions()[:8]}
@@ -0,0 +1,59 @@
+"""OpenAIClient against a local stand-in: keep-alive reuse, the stale-connection retry and timeouts."""
+import http.client
+import socket
+
+import pytest
+
+from openai_standin import StandIn
+from tictactoe_llm import OpenAIClient
+
+PAYLOAD = {"model": "test", "messages": [{"role": "user", "content": "move"}]}
+
+
+def test_keep_alive_reuses_one_connection():
+    with StandIn() as server:
+        client = OpenAIClient("test-key", server.base_url)
+        for _ in range(10):
+            reply = client.chat_completion(PAYLOAD, timeout=5)
+            assert reply["choices"][0]["message"]["content"] == "MOVE: 4"
+        client.close()
+    assert server.requests == 10
+    assert server.connections == 1
+
+
+def test_stale_pooled_connection_is_retried_once():
+    # Every connection is closed behind the client's back after one answer.
+    with StandIn(close_after_response=True) as server:
+        client = OpenAIClient("test-key", server.base_url)
+        for _ in range(3):
+            client.chat_completion(PAYLOAD, timeout=5)
+        client.close()
+    assert server.requests == 3
+    assert server.connections == 3
+
+
+def test_failure_on_a_fresh_connection_is_not_retried():
+    with StandIn(drop=True) as server:
+        client = OpenAIClient("test-key", server.base_url)
+        with pytest.raises(http.client.RemoteDisconnected):
+            client.chat_completion(PAYLOAD, timeout=5)
+    assert server.connections == 1
+
+
+def test_retry_happens_at_most_once():
+    with StandIn() as server:
+        client = OpenAIClient("test-key", server.base_url)
+        client.chat_completion(PAYLOAD, timeout=5)
+        # The server now hangs up on every request: the pooled connection fails, then the retry's fresh one.
+        server.drop = True
+        with pytest.raises(http.client.RemoteDisconnected):
+            client.chat_completion(PAYLOAD, timeout=5)
+    assert server.connections == 2
+
+
+def test_timeout_raises_and_discards_the_connection():
+    with StandIn(delay=1.0) as server:
+        client = OpenAIClient("test-key", server.base_url)
+        with pytest.raises(socket.timeout):
+            client.chat_completion(PAYLOAD, timeout=0.1)
+        assert client._idle == []
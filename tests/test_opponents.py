@@ -0,0 +1,25 @@
+"""The m,n,k heuristic opponent's centre preference."""
+import numpy as np
+
+import tictactoe_opponents
+
+
+def _choices(size, k, agent=0, opponent=0, draws=200):
+    policy = tictactoe_opponents.get_mnk_opponent("heuristic", size, k)
+    rng = np.random.default_rng(0)
+    return {policy(agent, opponent, rng) for _ in range(draws)}
+
+
+def test_odd_board_takes_the_single_centre():
+    assert _choices(5, 4) == {12}
+
+
+def test_even_board_picks_any_of_the_four_centre_cells():
+    assert _choices(4, 3) == {5, 6, 9, 10}
+
+
+def test_ties_are_only_among_the_nearest_free_cells():
+    # Centre taken: the four orthogonal neighbours, never the diagonals.
+    assert _choices(5, 4, agent=1 << 12) == {7, 11, 13, 17}
+    # Three of the four taken on 6x6: the last centre cell is forced.
+    assert _choices(6, 5, agent=1 << 14 | 1 << 15, opponent=1 << 21) == {20}
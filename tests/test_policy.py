@@ -0,0 +1,59 @@
+"""Exported policies against the SB3 models they came from."""
+import numpy as np
+import pytest
+
+from tictactoe_env import TicTacToeEnv
+from tictactoe_policy import load_policy, main, reference_logits, verify
+
+
+def _tiny_model(algo_name: str, seed: int = 0):
+    if algo_name == "MaskablePPO":
+        from sb3_contrib import MaskablePPO as algo
+    else:
+        from stable_baselines3 import PPO as algo
+    return algo("MlpPolicy", TicTacToeEnv(), n_steps=16, batch_size=16, seed=seed, policy_kwargs={"net_arch": [16, 16]})
+
+
+def _formats():
+    formats = ["npz"]
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        formats.append("onnx")
+    return formats
+
+
+@pytest.mark.parametrize("fmt", _formats())
+@pytest.mark.parametrize("algo_name", ["PPO", "MaskablePPO"])
+def test_export_matches_model(tmp_path, algo_name, fmt):
+    model = _tiny_model(algo_name)
+    path = tmp_path / "model.zip"
+    model.save(path)
+    # No flag needed: the masking is read from the zip and recorded in the export.
+    assert main([str(path), "--format", fmt]) == 0
+
+    policy = load_policy(str(tmp_path / f"model.{fmt}"))
+    masked = algo_name == "MaskablePPO"
+    assert policy.masked == masked
+    ok, diff, mismatched = verify(model, policy, tolerance=1e-5)
+    assert ok, (diff, mismatched)
+    obs = np.random.default_rng(0).integers(0, 3, size=(64, 9)).astype(np.int8)
+    expected = reference_logits(model, obs)
+    actual = policy.logits(obs)
+    actual = actual - np.logaddexp.reduce(actual, axis=1, keepdims=True)
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+    assert (actual.argmax(axis=1) == expected.argmax(axis=1)).all()
+    # Greedy moves agree with the model acting as in training, masked or not.
+    for row in obs:
+        kwargs = {"action_masks": row == 0} if masked else {}
+        action, _ = model.predict(row, deterministic=True, **kwargs)
+        assert policy.act(row[None, :])[0] == action
+
+
+def test_output_without_extension_gets_one(tmp_path):
+    path = tmp_path / "model.zip"
+    _tiny_model("PPO").save(path)
+    assert main([str(path), "-o", str(tmp_path / "exported")]) == 0
+    assert (tmp_path / "exported.npz").exists()
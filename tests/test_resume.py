@@ -0,0 +1,33 @@
+"""A run resumed from a checkpoint ends with the same weights as one that never stopped."""
+import pytest
+import torch
+
+from tictactoe_checkpoint import list_checkpoints
+from tictactoe_policy import load_model
+from train_tictactoe_wandb import parse_args, train
+
+STEPS = 2048
+CHECKPOINT_FREQ = 1024
+
+
+@pytest.mark.parametrize("backend", ["dummy", "batched"])
+def test_resume_is_bit_identical(tmp_path, monkeypatch, backend):
+    # train() writes models/, runs/ and wandb/ under the working directory.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("WANDB_MODE", "offline")
+    args = parse_args(
+        f"--vec-env {backend} --n-envs 4 --n-steps 128 --batch-size 128 --seed 3 "
+        f"--total-timesteps {STEPS} --checkpoint-freq {CHECKPOINT_FREQ}".split()
+    )
+    summary = train(args)
+    uninterrupted = load_model(summary["model_path"]).policy.state_dict()
+
+    checkpoints = dict(list_checkpoints(str(tmp_path / "models" / summary["run_id"])))
+    assert CHECKPOINT_FREQ in checkpoints, sorted(checkpoints)
+    resumed_summary = train(parse_args(["--resume", checkpoints[CHECKPOINT_FREQ]]))
+    assert resumed_summary["run_id"] == summary["run_id"]
+    resumed = load_model(resumed_summary["model_path"]).policy.state_dict()
+
+    assert uninterrupted.keys() == resumed.keys()
+    for name, tensor in uninterrupted.items():
+        assert torch.equal(tensor, resumed[name]), name
@@ -0,0 +1,57 @@
+"""GameServer sessions: AI-first openings and failed AI moves."""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+
+import tictactoe_mnk
+import tictactoe_solver
+from tictactoe_game import EMPTY
+from tictactoe_server import GameServer
+
+
+def test_server_imports_without_tk():
+    # Blocking tkinter makes any import of it fail, as on a host without Tk.
+    code = "import sys; sys.modules['tkinter'] = None; import tictactoe_server"
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+
+
+def test_ai_first_opens_from_the_table_on_3x3_and_the_centre_elsewhere():
+    server = GameServer()
+    reply = server.new_game({"ai_first": True})
+    assert reply["board"].index("O") == tictactoe_solver.best_move([EMPTY] * 9)
+    for size in range(4, 9):
+        reply = server.new_game({"size": size, "ai_first": True})
+        geo = tictactoe_mnk.square(size, min(size, 5))
+        assert reply["board"].index("O") == geo.centre_order[0]
+        assert reply["board"].count("O") == 1
+
+
+def test_failed_ai_move_undoes_the_human_move():
+    async def scenario():
+        server = GameServer(search_workers=1, search_seconds=0.05)
+        try:
+            game = server.new_game({"size": 4, "k": 3})["game"]
+            first = await server.play({"game": game, "cell": 0})
+            assert first["ok"], first
+
+            # Kill the only search worker: the pool is broken for the next move.
+            pid = next(iter(server._pool._processes))
+            os.kill(pid, signal.SIGKILL)
+            before = server.sessions[game].board()
+            cell = before.index(".")
+            failed = await server.play({"game": game, "cell": cell})
+            assert not failed["ok"] and "BrokenProcessPool" in failed["error"]
+            assert server.sessions[game].board() == before
+            assert not server.sessions[game].busy
+            assert server.stats["moves"] == 1 and server.stats["ai_errors"] == 1
+
+            # The same move goes through on a fresh pool.
+            retried = await server.play({"game": game, "cell": cell})
+            assert retried["ok"], retried
+            assert retried["board"][cell] == "X" and retried["board"].count("O") == 2
+        finally:
+            server.close()
+
+    asyncio.run(scenario())
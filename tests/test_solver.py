@@ -0,0 +1,93 @@
+"""The solved-game table against the original recursive minimax, on every reachable position."""
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple
+
+import pytest
+
+import tictactoe_solver
+from tictactoe_board import WINNING_LINES
+from tictactoe_solver import AI, EMPTY, HUMAN
+
+Board = Tuple[str, ...]
+
+
+def _winner(board: Board) -> Optional[str]:
+    for a, b, c in WINNING_LINES:
+        if board[a] and board[a] == board[b] == board[c]:
+            return board[a]
+    return None
+
+
+@lru_cache(maxsize=None)
+def reference_minimax(board: Board, maximizing: bool) -> int:
+    # The pre-table search: 1 for an AI win, -1 for a human win, 0 for a draw.
+    # Memoized only so the whole suite runs in seconds; the recursion is unchanged.
+    mark = _winner(board)
+    if mark == AI:
+        return 1
+    if mark == HUMAN:
+        return -1
+    if all(cell != EMPTY for cell in board):
+        return 0
+    scores = []
+    for idx, cell in enumerate(board):
+        if cell == EMPTY:
+            child = board[:idx] + ((AI if maximizing else HUMAN),) + board[idx + 1 :]
+            scores.append(reference_minimax(child, not maximizing))
+    return max(scores) if maximizing else min(scores)
+
+
+def reference_best_move(board: Board, maximizing: bool) -> Optional[int]:
+    # Strict improvement only, so ties go to the lowest index.
+    if _winner(board) is not None:
+        return None
+    best_score: Optional[int] = None
+    move: Optional[int] = None
+    for idx, cell in enumerate(board):
+        if cell == EMPTY:
+            child = board[:idx] + ((AI if maximizing else HUMAN),) + board[idx + 1 :]
+            score = reference_minimax(child, not maximizing)
+            if best_score is None or (score > best_score if maximizing else score < best_score):
+                best_score, move = score, idx
+    return move
+
+
+def reachable(starts: Tuple[bool, ...] = (False, True)) -> List[Tuple[Board, bool]]:
+    """Every (board, AI to move) pair reachable by alternating play from the empty board."""
+    seen: Set[Tuple[Board, bool]] = set()
+    stack = [((EMPTY,) * 9, maximizing) for maximizing in starts]
+    while stack:
+        board, maximizing = stack.pop()
+        if (board, maximizing) in seen:
+            continue
+        seen.add((board, maximizing))
+        if _winner(board) is not None:
+            continue
+        for idx, cell in enumerate(board):
+            if cell == EMPTY:
+                child = board[:idx] + ((AI if maximizing else HUMAN),) + board[idx + 1 :]
+                stack.append((child, not maximizing))
+    return sorted(seen)
+
+
+POSITIONS = reachable()
+
+
+def test_every_classic_position_is_covered():
+    # The classic count of boards with X moving first.
+    assert len(reachable(starts=(False,))) == 5478
+
+
+@pytest.mark.parametrize("maximizing", [True, False])
+def test_table_matches_recursive_minimax(maximizing):
+    for board, to_move in POSITIONS:
+        if to_move != maximizing:
+            continue
+        expected_value = reference_minimax(board, maximizing)
+        expected_move = reference_best_move(board, maximizing)
+        assert tictactoe_solver.value(list(board), maximizing) == expected_value, board
+        assert tictactoe_solver.best_move(list(board), maximizing) == expected_move, board
+        human, ai = (
+            sum(1 << idx for idx, cell in enumerate(board) if cell == mark) for mark in (HUMAN, AI)
+        )
+        assert tictactoe_solver.lookup_masks(human, ai, maximizing) == (expected_value, expected_move), board
@@ -0,0 +1,23 @@
+"""Sweep options and the training flags passed through to every run."""
+import pytest
+
+from sweep_tictactoe import build_jobs, parse_sweep_args
+
+
+def test_training_flags_pass_through_unabbreviated():
+    args, train_argv = parse_sweep_args(["--seeds", "1", "--action-masking", "--n-steps", "64"])
+    assert args.seeds == "1" and args.action_masking == "" and args.n_steps == ""
+    assert train_argv == ["--action-masking", "--n-steps", "64"]
+
+
+def test_grid_axes_expand_into_training_flags():
+    args, train_argv = parse_sweep_args(["--seeds", "0", "--action-masking-values", "off,on", "--n-steps-values", "32"])
+    assert [job["argv"] for job in build_jobs(args, train_argv)] == [
+        ["--seed", "0", "--n-steps", "32"],
+        ["--seed", "0", "--n-steps", "32", "--action-masking"],
+    ]
+
+
+def test_flag_set_by_an_axis_is_rejected():
+    with pytest.raises(SystemExit):
+        parse_sweep_args(["--seed", "3"])
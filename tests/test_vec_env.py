@@ -0,0 +1,27 @@
+"""The --vec-env backends are interchangeable: the same --seed plays the same games on each."""
+import argparse
+
+import numpy as np
+import pytest
+
+from train_tictactoe_wandb import build_vec_env, parse_args
+
+
+def _rollout(backend: str, seed: int, steps: int = 200, n_envs: int = 8):
+    args = argparse.Namespace(
+        **{**vars(parse_args([])), "vec_env": backend, "n_envs": n_envs, "seed": seed, "stats_freq": 0}
+    )
+    vec_env = build_vec_env(args)
+    actions = np.random.default_rng(seed).integers(0, 9, size=(steps, n_envs))
+    frames = [vec_env.reset().copy()]
+    for step_actions in actions:
+        obs, rewards, dones, _ = vec_env.step(step_actions)
+        frames.extend((obs.copy(), rewards.copy(), dones.copy()))
+    vec_env.close()
+    return frames
+
+
+@pytest.mark.parametrize("seed", [0, 5])
+def test_dummy_and_batched_backends_match(seed):
+    dummy, batched = _rollout("dummy", seed), _rollout("batched", seed)
+    assert all(np.array_equal(a, b) for a, b in zip(dummy, batched))
@@ -1,35 +1,44 @@
-import json
+import time
+
+# Taken before the remaining imports so --import-profile can report what they cost.
+STARTUP_T0 = time.perf_counter()
+
 import os
-import re
-import threading
+import sys
 import tkinter as tk
-import urllib.error
-import urllib.request
-from typing import List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
 
+import tictactoe_mnk
+import tictactoe_solver
+from tictactoe_solver import AI, EMPTY, HUMAN, MARKS
 
-HUMAN = "X"
-AI = "O"
-EMPTY = ""
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "").strip() or "gpt-4o-mini"
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+from tictactoe_backends import BackendChain, chain_from_env
+from tictactoe_game import PROMPT_VERSION, check_winner, is_draw, parse_timeout, request_openai_move
 
-def _parse_timeout(val: str, default: float) -> float:
-    try:
-        v = float(val)
-        if v <= 0:
-            raise ValueError
-        return v
-    except Exception:
-        return default
+# The LLM client (http.client), move cache (sqlite3) and policy (NumPy) are imported
+# on first use, in the background after the window is shown (see tictactoe_backends).
+IMPORTS_DONE = time.perf_counter()
 
-OPENAI_TIMEOUT = _parse_timeout(os.getenv("OPENAI_TIMEOUT", ""), 30.0)
+# Ask the LLM for its reply to every possible human move while the human is thinking.
+AI_SPECULATE = os.getenv("AI_SPECULATE", "").strip().lower() in ("1", "true", "yes", "on")
+AI_SPECULATE_WORKERS = max(1, int(parse_timeout(os.getenv("AI_SPECULATE_WORKERS", ""), 3)))
+# The AI backend chain (AI_BACKENDS, AI_MOVE_BUDGET, AI_POLICY_PATH, OPENAI_CACHE_PATH,
+# AI_METRICS_PATH) is read from the environment when the app starts; see tictactoe_backends.
+# Extra time the window waits past the chain's deadline before playing the solver itself.
+AI_DEADLINE_GRACE = 0.5
 
 
 class TicTacToeApp:
-    def __init__(self) -> None:
+    def __init__(self, import_profile: bool = False, size: int = 3, k: int = 3) -> None:
+        self.import_profile = import_profile
+        # Board side and marks in a row needed to win; anything but 3x3 is played by tictactoe_mnk.
+        tictactoe_mnk.square(size, k)
+        self.size = size
+        self.k = k
+        self.timings: Dict[str, float] = {"imports": IMPORTS_DONE - STARTUP_T0}
         self.root = tk.Tk()
-        self.root.title("Tic Tac Toe")
+        self.root.title("Tic Tac Toe" if tictactoe_mnk.is_classic(size, k) else f"{size}x{size}, {k} in a row")
         self.root.resizable(False, False)
         self.colors = {
             "bg": "#0b1021",
@@ -47,12 +56,74 @@ class TicTacToeApp:
             "button_hover": "#2563eb",
         }
 
-        self.board: List[str] = [EMPTY for _ in range(9)]
+        self.board: List[str] = [EMPTY for _ in range(size * size)]
         self.buttons: List[tk.Button] = []
         self.status_var = tk.StringVar(value="Your turn (X)")
         self.game_active = True
 
+        # One worker runs the backend chain for the AI turn; each turn gets a token so
+        # results from a cancelled or timed-out turn are recognised and dropped.
+        self.ai_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai-move")
+        # Backends are loaded on the AI worker once the window is up (see _load_backends),
+        # so AI requests queued behind the load see them ready.
+        self.chain: BackendChain = chain_from_env(
+            os.environ, request_openai_move, PROMPT_VERSION, workers=1 + AI_SPECULATE_WORKERS, size=size, k=k
+        )
+        print(f"[AI] Backend chain: {' -> '.join(self.chain.names)} within {self.chain.deadline:g}s per move.")
+        self._backends: Optional[Future] = None
+        self._ai_token = 0
+        self._ai_future: Optional[Future] = None
+        self._ai_deadline: Optional[str] = None
+        self._first_click: Optional[float] = None
+
+        # Speculative replies keyed by the human move they answer; only worth it with an LLM.
+        self.speculate = AI_SPECULATE and "llm" in self.chain.names
+        self.spec_executor = (
+            ThreadPoolExecutor(max_workers=AI_SPECULATE_WORKERS, thread_name_prefix="ai-speculate")
+            if self.speculate
+            else None
+        )
+        self._speculative: Dict[int, Future] = {}
+        self.spec_hits = 0
+        self.spec_turns = 0
+        self.spec_wasted = 0
+        self.spec_var = tk.StringVar(value="")
+
         self._build_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.timings["window"] = time.perf_counter() - STARTUP_T0
+        self.root.after(0, self._on_first_paint)
+
+    def _on_first_paint(self) -> None:
+        self.root.update_idletasks()
+        self.timings["first_paint"] = time.perf_counter() - STARTUP_T0
+        if self.import_profile:
+            heavy = [name for name in ("numpy", "torch", "stable_baselines3", "onnxruntime") if name in sys.modules]
+            print(f"[startup] Modules loaded before first paint: {', '.join(heavy) or 'no heavy backends'}.")
+        self._backends = self.ai_executor.submit(self._load_backends)
+        self._backends.add_done_callback(lambda fut: self.root.after(0, lambda: self._on_backends_ready(fut)))
+
+    def _load_backends(self) -> Dict[str, float]:
+        """Runs on the AI worker: open every backend in the chain and warm the solver table."""
+        loaded = self.chain.load()
+        if "solver" not in loaded:
+            # The window's own last-resort fallback uses the table too.
+            started = time.perf_counter()
+            tictactoe_solver.solved_table()
+            loaded["solver_table"] = time.perf_counter() - started
+        return loaded
+
+    def _on_backends_ready(self, future: Future) -> None:
+        if future.cancelled():
+            return
+        try:
+            loaded = future.result()
+        except Exception as exc:
+            print(f"[AI] Loading AI backends failed; using fallback minimax. Reason: {exc}")
+            return
+        self.timings["backends"] = time.perf_counter() - STARTUP_T0
+        self.timings.update({f"load:{name}": seconds for name, seconds in loaded.items()})
+        self._start_speculation()
 
     def _build_ui(self) -> None:
         self.root.configure(bg=self.colors["bg"])
@@ -84,14 +155,16 @@ class TicTacToeApp:
         board_frame = tk.Frame(card, bg=self.colors["grid"], padx=10, pady=10)
         board_frame.grid(row=0, column=0)
 
-        for idx in range(9):
-            row, col = divmod(idx, 3)
+        # Shrink the cells on bigger boards so the window stays about the same size.
+        font_size = max(10, 22 * 3 // self.size)
+        for idx in range(self.size * self.size):
+            row, col = divmod(idx, self.size)
             btn = tk.Button(
                 board_frame,
                 text="",
-                width=4,
-                height=2,
-                font=("Segoe UI", 22, "bold"),
+                width=4 if self.size <= 4 else 3,
+                height=2 if self.size <= 4 else 1,
+                font=("Segoe UI", font_size, "bold"),
                 command=lambda i=idx: self.on_cell_click(i),
             )
             btn.grid(row=row, column=col, padx=6, pady=6)
@@ -109,6 +182,18 @@ class TicTacToeApp:
         )
         status_label.grid(row=2, column=0, sticky="w", pady=(12, 8))
 
+        if self.speculate:
+            spec_label = tk.Label(
+                container,
+                textvariable=self.spec_var,
+                font=("Segoe UI", 9),
+                fg=self.colors["muted"],
+                bg=self.colors["bg"],
+                padx=6,
+            )
+            spec_label.grid(row=4, column=0, sticky="w")
+            self._update_spec_label()
+
         reset_btn = tk.Button(
             container,
             text="New Game",
@@ -134,49 +219,141 @@ class TicTacToeApp:
         )
 
     def reset_board(self) -> None:
-        self.board = [EMPTY for _ in range(9)]
+        self._cancel_ai_move()
+        self._discard_speculation()
+        self.board = [EMPTY for _ in range(self.size * self.size)]
         for btn in self.buttons:
             btn.config(text="", state=tk.NORMAL)
             self._style_cell_button(btn)
         self.status_var.set("Your turn (X)")
         self.game_active = True
+        self._start_speculation()
 
     def on_cell_click(self, idx: int) -> None:
         if not self.game_active or self.board[idx] != EMPTY:
             return
 
+        speculative = self._speculative.pop(idx, None)
+        self._discard_speculation()
         self._place_mark(idx, HUMAN)
         if self._check_end_state():
+            if speculative is not None:
+                self._discard_future(speculative)
+                self._update_spec_label()
             return
 
         self.status_var.set("AI thinking...")
         self.game_active = False
-        threading.Thread(target=self._ai_move_thread, daemon=True).start()
-
-    def _ai_move_thread(self) -> None:
-        move = request_openai_move(
-            self.board,
-            model=OPENAI_MODEL,
-            api_key=OPENAI_API_KEY,
-            timeout=OPENAI_TIMEOUT,
+        if self._first_click is None:
+            self._first_click = time.perf_counter()
+        self._ai_token += 1
+        token = self._ai_token
+        if speculative is not None:
+            self.spec_turns += 1
+            self.spec_hits += speculative.done()
+            self._update_spec_label()
+            self._ai_future = speculative
+        else:
+            self._ai_future = self.ai_executor.submit(self._request_ai_move, list(self.board))
+        self._ai_future.add_done_callback(
+            lambda fut: self.root.after(0, lambda: self._on_ai_result(token, fut))
+        )
+        # The chain enforces its own deadline; this only guards against a stalled worker.
+        self._ai_deadline = self.root.after(
+            int((self.chain.deadline + AI_DEADLINE_GRACE) * 1000), lambda: self._on_ai_deadline(token)
+        )
+
+    def _request_ai_move(self, board: List[str]) -> Optional[int]:
+        move, served_by = self.chain.move(board)
+        if served_by is not None:
+            print(f"[AI] Move {move} from the {served_by} backend.")
+        return move
+
+    def _start_speculation(self) -> None:
+        if not self.speculate or not self.game_active or self._backends is None or not self._backends.done():
+            return
+        for idx, cell in enumerate(self.board):
+            if cell != EMPTY:
+                continue
+            board = list(self.board)
+            board[idx] = HUMAN
+            if check_winner(board, self.k) or is_draw(board, self.k):
+                continue
+            self._speculative[idx] = self.spec_executor.submit(self._request_ai_move, board)
+
+    def _discard_speculation(self) -> None:
+        for future in self._speculative.values():
+            self._discard_future(future)
+        self._speculative.clear()
+        self._update_spec_label()
+
+    def _discard_future(self, future: Future) -> None:
+        # Queued requests are dropped for free; anything already sent is wasted.
+        if not future.cancel():
+            self.spec_wasted += 1
+
+    def _update_spec_label(self) -> None:
+        if not self.speculate:
+            return
+        rate = self.spec_hits / self.spec_turns if self.spec_turns else 0.0
+        self.spec_var.set(
+            f"Speculation: {self.spec_hits}/{self.spec_turns} ready ({rate:.0%}), "
+            f"{self.spec_wasted} wasted requests"
         )
-        self.root.after(0, lambda: self._apply_ai_move(move))
+
+    def _on_ai_result(self, token: int, future: Future) -> None:
+        if future.cancelled():
+            return
+        if token != self._ai_token:
+            print("[AI] Discarding late response.")
+            return
+        self._clear_ai_move()
+        try:
+            move = future.result()
+        except Exception as exc:
+            print(f"[AI] Move request crashed, using fallback. Reason: {exc}")
+            move = None
+        self._apply_ai_move(move)
+
+    def _on_ai_deadline(self, token: int) -> None:
+        if token != self._ai_token:
+            return
+        print(f"[AI] No reply within {self.chain.deadline:g}s; a late response will be discarded.")
+        self._cancel_ai_move()
+        self._apply_ai_move(None)
+
+    def _cancel_ai_move(self) -> None:
+        self._ai_token += 1
+        if self._ai_future is not None:
+            self._ai_future.cancel()
+        self._clear_ai_move()
+
+    def _clear_ai_move(self) -> None:
+        if self._ai_deadline is not None:
+            self.root.after_cancel(self._ai_deadline)
+        self._ai_deadline = None
+        self._ai_future = None
 
     def _apply_ai_move(self, move: Optional[int]) -> None:
         if self._check_end_state():
             return
 
         chosen_move = move
-        if chosen_move is None or chosen_move not in range(9) or self.board[chosen_move] != EMPTY:
+        if chosen_move is None or chosen_move not in range(len(self.board)) or self.board[chosen_move] != EMPTY:
             print("[AI] Using fallback minimax.")
             chosen_move = self._best_move_fallback()
 
         if chosen_move is not None:
             self._place_mark(chosen_move, AI)
+            if "first_ai_move" not in self.timings and self._first_click is not None:
+                self.timings["first_ai_move"] = time.perf_counter() - self._first_click
+                if self.import_profile:
+                    self.print_startup_report()
 
         if not self._check_end_state():
             self.status_var.set("Your turn (X)")
             self.game_active = True
+            self._start_speculation()
 
     def _place_mark(self, idx: int, mark: str) -> None:
         self.board[idx] = mark
@@ -189,12 +366,12 @@ class TicTacToeApp:
         )
 
     def _check_end_state(self) -> bool:
-        winner = check_winner(self.board)
+        winner = check_winner(self.board, self.k)
         if winner:
             self.status_var.set("You win!" if winner == HUMAN else "Computer wins.")
             self._lock_board()
             return True
-        if is_draw(self.board):
+        if is_draw(self.board, self.k):
             self.status_var.set("Draw game.")
             self._lock_board()
             return True
@@ -206,17 +383,10 @@ class TicTacToeApp:
             btn.config(state=tk.DISABLED)
 
     def _best_move_fallback(self) -> Optional[int]:
-        best_score = float("-inf")
-        move: Optional[int] = None
-        for idx, cell in enumerate(self.board):
-            if cell == EMPTY:
-                self.board[idx] = AI
-                score = minimax(self.board, False)
-                self.board[idx] = EMPTY
-                if score > best_score:
-                    best_score = score
-                    move = idx
-        return move
+        if tictactoe_mnk.is_classic(self.size, self.k):
+            return tictactoe_solver.best_move(self.board, maximizing=True)
+        # Runs on the UI thread, so keep the search short.
+        return tictactoe_mnk.engine(self.size, self.k).best_move(self.board, AI, MARKS, AI_DEADLINE_GRACE)
 
     def _style_cell_button(self, btn: tk.Button) -> None:
         btn.config(
@@ -247,137 +417,53 @@ class TicTacToeApp:
     def run(self) -> None:
         self.root.mainloop()
 
-
-def check_winner(board: List[str]) -> Optional[str]:
-    winning_lines = [
-        (0, 1, 2),
-        (3, 4, 5),
-        (6, 7, 8),
-        (0, 3, 6),
-        (1, 4, 7),
-        (2, 5, 8),
-        (0, 4, 8),
-        (2, 4, 6),
-    ]
-    for a, b, c in winning_lines:
-        if board[a] and board[a] == board[b] == board[c]:
-            return board[a]
-    return None
-
-
-def is_draw(board: List[str]) -> bool:
-    return all(cell != EMPTY for cell in board) and check_winner(board) is None
-
-
-def minimax(board: List[str], maximizing: bool) -> int:
-    """
-    Unbeatable search: maximizing chooses AI moves, minimizing chooses human moves.
-    Returns 1 for an AI win, -1 for a human win, and 0 for a draw.
-    """
-    winner = check_winner(board)
-    if winner == AI:
-        return 1
-    if winner == HUMAN:
-        return -1
-    if is_draw(board):
-        return 0
-
-    if maximizing:
-        best_score = float("-inf")
-        for idx, cell in enumerate(board):
-            if cell == EMPTY:
-                board[idx] = AI
-                score = minimax(board, False)
-                board[idx] = EMPTY
-                best_score = max(best_score, score)
-        return best_score
-
-    best_score = float("inf")
-    for idx, cell in enumerate(board):
-        if cell == EMPTY:
-            board[idx] = HUMAN
-            score = minimax(board, True)
-            board[idx] = EMPTY
-            best_score = min(best_score, score)
-    return best_score
-
-
-def request_openai_move(
-    board: List[str], model: str, api_key: str, timeout: float
-) -> Optional[int]:
-    if not api_key:
-        print("[AI] OPENAI_API_KEY not set; using fallback minimax.")
-        return None
-
-    prompt = build_prompt(board)
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "You are an unbeatable tic tac toe player playing as O."},
-            {"role": "user", "content": prompt},
-        ],
-        "temperature": 0,
-    }
-    try:
-        print(f"[AI] Querying OpenAI model '{model}'...")
-        data = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(
-            "https://api.openai.com/v1/chat/completions",
-            data=data,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}",
-            },
-            method="POST",
-        )
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            result = json.loads(resp.read().decode("utf-8"))
-        text = (
-            result.get("choices", [{}])[0]
-            .get("message", {})
-            .get("content", "")
-        )
-        print("[AI] OpenAI response:")
-        print(text.strip())
-        return parse_move(text, board)
-    except urllib.error.HTTPError as exc:
-        body = exc.read().decode("utf-8", errors="ignore") if hasattr(exc, "read") else ""
-        print(f"[AI] OpenAI HTTP error ({exc.code}): {body or exc}")
-        return None
-    except (urllib.error.URLError, TimeoutError, json.JSONDecodeError, OSError) as exc:
-        print(f"[AI] OpenAI request failed, using fallback. Reason: {exc}")
-        return None
-
-
-def build_prompt(board: List[str]) -> str:
-    slots = []
-    for idx, cell in enumerate(board):
-        display = cell if cell else "."
-        slots.append(f"{idx}:{display}")
-    board_state = " ".join(slots)
-    return (
-        "You are playing tic tac toe as O. I am X. "
-        "Board is indexed 0-8 left-to-right, top-to-bottom. "
-        f"Current board: {board_state}. "
-        "Think briefly about the best EMPTY position, explain your reasoning in one or two sentences, "
-        "then output a final line exactly as: MOVE: <index> using digits 0-8."
-    )
-
-
-def parse_move(response_text: str, board: List[str]) -> Optional[int]:
-    move_line = re.search(r"MOVE\s*:\s*([0-8])", response_text, re.IGNORECASE)
-    if move_line:
-        idx = int(move_line.group(1))
-        if board[idx] == EMPTY:
-            return idx
-
-    candidates = re.findall(r"\b([0-8])\b", response_text)
-    for cand in candidates:
-        idx = int(cand)
-        if board[idx] == EMPTY:
-            return idx
-    return None
+    def print_startup_report(self) -> None:
+        t = self.timings
+        rows = [
+            ("imports", t.get("imports")),
+            ("window built", t.get("window")),
+            ("first paint", t.get("first_paint")),
+            ("backends ready", t.get("backends")),
+        ]
+        for label, seconds in rows:
+            value = "pending" if seconds is None else f"{seconds * 1000:8.1f} ms since start"
+            print(f"[startup] {label:<15} {value}")
+        for key in sorted(k for k in t if k.startswith("load:")):
+            print(f"[startup]   {key[5:]:<13} {t[key] * 1000:8.1f} ms")
+        if "first_ai_move" in t:
+            print(f"[startup] first AI move   {t['first_ai_move'] * 1000:8.1f} ms after the first click")
+        else:
+            print("[startup] first AI move   not played yet")
+
+    def close(self) -> None:
+        self._cancel_ai_move()
+        self._discard_speculation()
+        if self.import_profile and "first_ai_move" not in self.timings:
+            self.print_startup_report()
+        if self._backends is not None and not self._backends.done():
+            # Let a load still in flight finish so its client and cache can be closed below.
+            self._backends.result()
+        self.ai_executor.shutdown(wait=False, cancel_futures=True)
+        if self.spec_executor is not None:
+            self.spec_executor.shutdown(wait=False, cancel_futures=True)
+            print(f"[AI] {self.spec_var.get()}")
+        print(f"[AI] Backends: {self.chain.summary()}")
+        self.chain.close()
+        if self.chain.metrics_path:
+            print(f"[AI] Backend metrics written to {self.chain.metrics_path}")
+        self.root.destroy()
 
 
 if __name__ == "__main__":
-    TicTacToeApp().run()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Play TicTacToe against the AI.")
+    parser.add_argument(
+        "--import-profile",
+        action="store_true",
+        help="Report import time, time to first paint, backend load times and time to the first AI move.",
+    )
+    parser.add_argument("--size", type=int, default=3, help="Board side length, e.g. 4 for 4x4.")
+    parser.add_argument("--k", type=int, default=0, help="Marks in a row needed to win (default: the board size, at most 5).")
+    cli = parser.parse_args()
+    TicTacToeApp(import_profile=cli.import_profile, size=cli.size, k=cli.k or min(cli.size, 5)).run()
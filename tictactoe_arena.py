@@ -0,0 +1,277 @@
+"""
+Headless bot-vs-bot arena.
+
+Agents are named by spec strings so they can be rebuilt inside worker processes:
+``random``, ``heuristic`` (the training env's scripted opponent), ``solver``
+(the minimax fallback), ``llm`` (request_openai_move), ``ppo:<path>`` for a
+model saved by train(), e.g. ``ppo:models/abc123.zip`` (PPO or MaskablePPO, read
+from the zip), and ``policy:<path>`` for an export from tictactoe_policy.py (.npz
+or .onnx), which needs neither torch nor SB3.
+
+    python tictactoe_arena.py solver heuristic --games 1000000 --workers 8
+"""
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import tictactoe_solver
+from tictactoe_board import from_cells
+from tictactoe_game import EMPTY, OPENAI_API_KEY, OPENAI_MODEL, OPENAI_TIMEOUT, check_winner, is_draw, request_openai_move
+from tictactoe_opponents import heuristic_opponent, random_opponent
+from tictactoe_policy import board_obs
+
+MARKS = ("X", "O")
+
+# Per-move latency histogram: log-spaced buckets from 100 ns to 100 s.
+LATENCY_EDGES = np.logspace(-7, 2, 181)
+
+
+class Agent:
+    name = "agent"
+
+    def select(self, board: List[str], mark: str, rng: np.random.Generator) -> Optional[int]:
+        raise NotImplementedError
+
+
+def _masks(board: Sequence[str], mark: str) -> Tuple[int, int]:
+    """(other side's mask, own mask): the scripted opponents' (agent, opponent) order."""
+    other = MARKS[1] if mark == MARKS[0] else MARKS[0]
+    return from_cells(board, (other, mark))
+
+
+class RandomAgent(Agent):
+    name = "random"
+
+    def select(self, board, mark, rng):
+        return random_opponent(*_masks(board, mark), rng)
+
+
+class HeuristicAgent(Agent):
+    name = "heuristic"
+
+    def select(self, board, mark, rng):
+        return heuristic_opponent(*_masks(board, mark), rng)
+
+
+class SolverAgent(Agent):
+    name = "solver"
+
+    def select(self, board, mark, rng):
+        # The solver scores positions for O (maximizing); X is the minimizing side.
+        return tictactoe_solver.lookup(board, maximizing=mark == tictactoe_solver.AI)[1]
+
+
+class LLMAgent(Agent):
+    name = "llm"
+
+    def select(self, board, mark, rng):
+        # The prompt always casts the model as O, so present X's turns with colours swapped.
+        if mark != tictactoe_solver.AI:
+            board = [{"X": "O", "O": "X"}.get(cell, cell) for cell in board]
+        return request_openai_move(board, model=OPENAI_MODEL, api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT)
+
+
+class PPOAgent(Agent):
+    def __init__(self, path: str) -> None:
+        from tictactoe_policy import is_maskable, load_model
+
+        self.name = f"ppo:{os.path.basename(path)}"
+        # MaskablePPO models (--action-masking) act on empty cells only, as they did in training.
+        self.masked = is_maskable(path)
+        self.model = load_model(path, self.masked)
+
+    def select(self, board, mark, rng):
+        # Same encoding as TicTacToeEnv: own marks 1, opponent marks 2.
+        obs = board_obs(board, mark, EMPTY)
+        if self.masked:
+            action, _ = self.model.predict(obs, deterministic=True, action_masks=obs == 0)
+        else:
+            action, _ = self.model.predict(obs, deterministic=True)
+        return int(action)
+
+
+class ExportedPolicyAgent(Agent):
+    def __init__(self, path: str) -> None:
+        from tictactoe_policy import load_policy
+
+        self.name = f"policy:{os.path.basename(path)}"
+        self.policy = load_policy(path)
+
+    def select(self, board, mark, rng):
+        # Masked only if the export came from MaskablePPO, like PPOAgent; otherwise an illegal choice forfeits.
+        obs = board_obs(board, mark, EMPTY)
+        return int(self.policy.act(obs[None, :])[0])
+
+
+@lru_cache(maxsize=None)
+def make_agent(spec: str) -> Agent:
+    if spec.startswith("ppo:"):
+        return PPOAgent(spec[4:])
+    if spec.startswith("policy:"):
+        return ExportedPolicyAgent(spec[7:])
+    agents = {"random": RandomAgent, "heuristic": HeuristicAgent, "solver": SolverAgent, "llm": LLMAgent}
+    if spec not in agents:
+        raise ValueError(f"Unknown agent '{spec}'. Use one of {', '.join(agents)}, ppo:<path> or policy:<path>.")
+    return agents[spec]()
+
+
+def play_game(agents: Tuple[Agent, Agent], rng: np.random.Generator, latencies: List[np.ndarray]) -> Tuple[int, bool]:
+    """
+    Play one game with agents[0] as X. Returns (outcome, illegal) where outcome is
+    0/1 for the winning seat or -1 for a draw; an illegal move forfeits the game.
+    """
+    board = [EMPTY] * 9
+    seat = 0
+    while True:
+        start = time.perf_counter()
+        move = agents[seat].select(board, MARKS[seat], rng)
+        latencies[seat][np.searchsorted(LATENCY_EDGES, time.perf_counter() - start)] += 1
+        if move is None or not 0 <= move < 9 or board[move] != EMPTY:
+            return 1 - seat, True
+        board[move] = MARKS[seat]
+        if check_winner(board):
+            return seat, False
+        if is_draw(board):
+            return -1, False
+        seat = 1 - seat
+
+
+def play_chunk(spec_a: str, spec_b: str, a_first: bool, games: int, seed: int) -> Dict[str, np.ndarray]:
+    """Play ``games`` games from A's point of view; counts are [win, draw, loss, A illegal, B illegal]."""
+    a, b = make_agent(spec_a), make_agent(spec_b)
+    agents = (a, b) if a_first else (b, a)
+    a_seat = 0 if a_first else 1
+    rng = np.random.default_rng(seed)
+    latencies = [np.zeros(len(LATENCY_EDGES) + 1, dtype=np.int64) for _ in range(2)]
+    counts = np.zeros(5, dtype=np.int64)
+    for _ in range(games):
+        outcome, illegal = play_game(agents, rng, latencies)
+        if outcome == -1:
+            counts[1] += 1
+        elif outcome == a_seat:
+            counts[0] += 1
+            counts[4] += illegal
+        else:
+            counts[2] += 1
+            counts[3] += illegal
+    return {
+        "counts": counts,
+        "latency_a": latencies[a_seat],
+        "latency_b": latencies[1 - a_seat],
+    }
+
+
+def wilson_interval(successes: int, total: int, z: float = 1.96) -> Tuple[float, float]:
+    if total == 0:
+        return 0.0, 0.0
+    p = successes / total
+    denom = 1 + z * z / total
+    center = (p + z * z / (2 * total)) / denom
+    half = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def latency_percentiles(hist: np.ndarray, qs: Sequence[float] = (50, 90, 99)) -> Dict[str, float]:
+    total = int(hist.sum())
+    if total == 0:
+        return {f"p{q:g}": float("nan") for q in qs}
+    cumulative = np.cumsum(hist)
+    out = {}
+    for q in qs:
+        bucket = int(np.searchsorted(cumulative, math.ceil(total * q / 100)))
+        # Report the bucket's upper edge, a slight overestimate.
+        out[f"p{q:g}"] = float(LATENCY_EDGES[min(bucket, len(LATENCY_EDGES) - 1)])
+    return out
+
+
+def run_match(
+    spec_a: str, spec_b: str, games: int, workers: int, seed: int = 0, chunk_size: int = 20_000
+) -> Dict[str, object]:
+    """Play ``games`` games, half with each agent moving first, across a process pool."""
+    jobs = []
+    for a_first in (True, False):
+        remaining = games // 2 if a_first else games - games // 2
+        while remaining > 0:
+            size = min(chunk_size, remaining)
+            jobs.append((spec_a, spec_b, a_first, size, seed + len(jobs)))
+            remaining -= size
+
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(play_chunk, *zip(*jobs)))
+    else:
+        results = [play_chunk(*job) for job in jobs]
+    elapsed = time.perf_counter() - start
+
+    by_order = {True: np.zeros(5, dtype=np.int64), False: np.zeros(5, dtype=np.int64)}
+    latency_a = np.zeros(len(LATENCY_EDGES) + 1, dtype=np.int64)
+    latency_b = np.zeros_like(latency_a)
+    for job, result in zip(jobs, results):
+        by_order[job[2]] += result["counts"]
+        latency_a += result["latency_a"]
+        latency_b += result["latency_b"]
+    counts = by_order[True] + by_order[False]
+    total = int(counts[:3].sum())
+
+    summary: Dict[str, object] = {
+        "agent_a": spec_a,
+        "agent_b": spec_b,
+        "games": total,
+        "seconds": elapsed,
+        "games_per_second": total / elapsed if elapsed else float("inf"),
+        "a_first": _rates(by_order[True]),
+        "b_first": _rates(by_order[False]),
+        "overall": _rates(counts),
+        "latency_a": latency_percentiles(latency_a),
+        "latency_b": latency_percentiles(latency_b),
+    }
+    return summary
+
+
+def _rates(counts: np.ndarray) -> Dict[str, object]:
+    total = int(counts[:3].sum())
+    out: Dict[str, object] = {"games": total, "illegal_a": int(counts[3]), "illegal_b": int(counts[4])}
+    for name, value in zip(("win", "draw", "loss"), counts[:3]):
+        out[name] = value / total if total else 0.0
+        out[f"{name}_ci"] = wilson_interval(int(value), total)
+    return out
+
+
+def print_summary(summary: Dict[str, object]) -> None:
+    print(
+        f"{summary['agent_a']} vs {summary['agent_b']}: {summary['games']:,} games in "
+        f"{summary['seconds']:.2f}s ({summary['games_per_second']:,.0f} games/s)"
+    )
+    for label in ("a_first", "b_first", "overall"):
+        rates = summary[label]
+        cells = []
+        for name in ("win", "draw", "loss"):
+            lo, hi = rates[f"{name}_ci"]
+            cells.append(f"{name} {rates[name]:6.2%} [{lo:6.2%}, {hi:6.2%}]")
+        print(f"  {label:<8} " + "  ".join(cells) + f"  illegal {rates['illegal_a']}/{rates['illegal_b']}")
+    for label, spec in (("latency_a", summary["agent_a"]), ("latency_b", summary["agent_b"])):
+        pct = "  ".join(f"{k} {v * 1e6:,.1f}us" for k, v in summary[label].items())
+        print(f"  move latency {spec}: {pct}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Play TicTacToe agents against each other headlessly.")
+    parser.add_argument("agent_a", type=str, help="First agent spec (random, heuristic, solver, llm, ppo:<path>, policy:<path>).")
+    parser.add_argument("agent_b", type=str, help="Second agent spec.")
+    parser.add_argument("--games", type=int, default=100_000, help="Total games; half with each agent first.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes.")
+    parser.add_argument("--chunk-size", type=int, default=20_000, help="Games per worker task.")
+    parser.add_argument("--seed", type=int, default=0, help="Base random seed.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    cli = parse_args()
+    print_summary(run_match(cli.agent_a, cli.agent_b, cli.games, cli.workers, cli.seed, cli.chunk_size))
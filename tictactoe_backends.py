@@ -0,0 +1,474 @@
+"""
+Ordered chain of AI move backends for the game app.
+
+Each backend gets its own latency budget and the whole move is bounded by a
+deadline: a backend that returns no legal move, fails or overruns its budget is
+skipped and the next one is asked. Per-backend latency histograms and outcome
+counts are kept in ChainMetrics and can be written as JSON or Prometheus text.
+
+The chain is configured from the environment when the app starts, e.g.
+``AI_BACKENDS="cache:0.05,policy:0.1,llm:4,solver:0.5"`` (name:budget seconds).
+Heavy dependencies are imported in ``load()``, never at module import.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import tictactoe_mnk
+import tictactoe_solver
+from tictactoe_solver import AI, EMPTY, MARKS
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels); +Inf is implicit.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OUTCOMES = ("success", "miss", "timeout", "error")
+
+# request_openai_move's signature, passed in by the app to avoid a circular import.
+RequestFn = Callable[..., Optional[int]]
+
+
+def _env_seconds(environ: Mapping[str, str], name: str, default: float) -> float:
+    try:
+        value = float(environ.get(name, ""))
+        return value if value > 0 else default
+    except ValueError:
+        return default
+
+
+def _legal(board: Sequence[str], move: Optional[int]) -> bool:
+    return move is not None and 0 <= move < len(board) and board[move] == EMPTY
+
+
+class Backend:
+    name = "backend"
+
+    def __init__(self, budget: float) -> None:
+        self.budget = budget
+
+    def load(self) -> None:
+        """Open clients or files; called once on a worker thread before the first move."""
+
+    def move(self, board: List[str], timeout: float) -> Optional[int]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class CacheBackend(Backend):
+    """Answers from the SQLite cache of earlier LLM replies."""
+
+    name = "cache"
+
+    def __init__(self, budget: float, path: str, model: str, prompt_version: str) -> None:
+        super().__init__(budget)
+        self.path = path
+        self.model = model
+        self.prompt_version = prompt_version
+        self.cache: Any = None
+
+    def load(self) -> None:
+        from tictactoe_cache import DEFAULT_CACHE_PATH, MoveCache
+
+        self.cache = MoveCache(self.path or DEFAULT_CACHE_PATH)
+
+    def move(self, board, timeout):
+        return self.cache.get(board, self.model, self.prompt_version)
+
+    def close(self) -> None:
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(
+                f"[AI] Move cache: {stats['hits']} hits, {stats['misses']} misses, "
+                f"~{stats['saved_seconds']:.1f}s of API time saved."
+            )
+            self.cache.close()
+
+
+class PolicyBackend(Backend):
+    """A trained policy exported by tictactoe_policy.py (.npz or .onnx)."""
+
+    name = "policy"
+
+    def __init__(self, budget: float, path: str) -> None:
+        super().__init__(budget)
+        self.path = path
+        self.policy: Any = None
+
+    def load(self) -> None:
+        from tictactoe_policy import load_policy
+
+        self.policy = load_policy(self.path)
+
+    def move(self, board, timeout):
+        return self.policy.move(board, AI)
+
+
+class LLMBackend(Backend):
+    name = "llm"
+
+    def __init__(
+        self,
+        budget: float,
+        request_fn: RequestFn,
+        model: str,
+        api_key: str,
+        timeout: float,
+        base_url: str,
+        prompt_version: str,
+        cache_backend: Optional[CacheBackend] = None,
+    ) -> None:
+        super().__init__(budget)
+        self.request_fn = request_fn
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.base_url = base_url
+        self.prompt_version = prompt_version
+        self.cache_backend = cache_backend
+        self.client: Any = None
+
+    def load(self) -> None:
+        from tictactoe_llm import DEFAULT_BASE_URL, get_client
+
+        self.client = get_client(self.api_key, self.base_url or DEFAULT_BASE_URL)
+
+    def move(self, board, timeout):
+        started = time.perf_counter()
+        move = self.request_fn(
+            board,
+            model=self.model,
+            api_key=self.api_key,
+            timeout=min(self.timeout, timeout),
+            client=self.client,
+        )
+        # The cache backend looked this board up already; only store the fresh answer.
+        cache = self.cache_backend.cache if self.cache_backend is not None else None
+        if cache is not None and _legal(board, move):
+            cache.put(board, self.model, self.prompt_version, move, time.perf_counter() - started)
+        return move
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+
+
+class SolverBackend(Backend):
+    """Exact table lookup on 3x3; alpha-beta with iterative deepening on other boards."""
+
+    name = "solver"
+
+    def __init__(self, budget: float, size: int = 3, k: int = 3) -> None:
+        super().__init__(budget)
+        self.size = size
+        self.k = k
+
+    def load(self) -> None:
+        if tictactoe_mnk.is_classic(self.size, self.k):
+            tictactoe_solver.solved_table()
+        else:
+            tictactoe_mnk.engine(self.size, self.k)
+
+    def move(self, board, timeout):
+        if tictactoe_mnk.is_classic(self.size, self.k):
+            return tictactoe_solver.best_move(board, maximizing=True)
+        # Stop deepening a little before the chain gives up on this backend.
+        result = tictactoe_mnk.engine(self.size, self.k).search(
+            *tictactoe_mnk.square(self.size, self.k).from_cells(board, MARKS), turn=1, time_limit=timeout * 0.9
+        )
+        print(f"[AI] Searched to depth {result.depth} ({result.nodes} nodes, {result.seconds:.2f}s).")
+        return result.move
+
+
+class ChainMetrics:
+    """Thread-safe per-backend latency histograms and outcome counts."""
+
+    def __init__(self, names: Sequence[str]) -> None:
+        self._lock = threading.Lock()
+        self.names = list(names)
+        self.buckets = {name: [0] * (len(LATENCY_BUCKETS) + 1) for name in names}
+        self.latency_sum = {name: 0.0 for name in names}
+        self.outcomes = {name: {outcome: 0 for outcome in OUTCOMES} for name in names}
+        # Times the chain moved on from a backend to the next one.
+        self.fallbacks = {name: 0 for name in names}
+        self.served = {name: 0 for name in names}
+        self.moves = 0
+        self.unanswered = 0
+        self.deadline_exceeded = 0
+
+    def observe(self, name: str, seconds: float, outcome: str) -> None:
+        with self._lock:
+            idx = next((i for i, edge in enumerate(LATENCY_BUCKETS) if seconds <= edge), len(LATENCY_BUCKETS))
+            self.buckets[name][idx] += 1
+            self.latency_sum[name] += seconds
+            self.outcomes[name][outcome] += 1
+            if outcome != "success":
+                self.fallbacks[name] += 1
+
+    def finish(self, served_by: Optional[str], deadline_hit: bool) -> None:
+        with self._lock:
+            self.moves += 1
+            if served_by is None:
+                self.unanswered += 1
+            else:
+                self.served[served_by] += 1
+            self.deadline_exceeded += deadline_hit
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            backends = {}
+            for name in self.names:
+                calls = sum(self.outcomes[name].values())
+                backends[name] = {
+                    "calls": calls,
+                    "outcomes": dict(self.outcomes[name]),
+                    "success_rate": self.outcomes[name]["success"] / calls if calls else 0.0,
+                    "fallbacks": self.fallbacks[name],
+                    "served": self.served[name],
+                    "latency_sum_seconds": self.latency_sum[name],
+                    "latency_buckets": dict(zip([str(edge) for edge in LATENCY_BUCKETS] + ["+Inf"], self.buckets[name])),
+                }
+            return {
+                "moves": self.moves,
+                "unanswered": self.unanswered,
+                "deadline_exceeded": self.deadline_exceeded,
+                "backends": backends,
+            }
+
+    def to_prometheus(self) -> str:
+        snap = self.snapshot()
+        lines = [
+            "# HELP tictactoe_ai_backend_latency_seconds Time spent waiting on each AI backend.",
+            "# TYPE tictactoe_ai_backend_latency_seconds histogram",
+        ]
+        for name, data in snap["backends"].items():
+            cumulative = 0
+            for edge, count in data["latency_buckets"].items():
+                cumulative += count
+                lines.append(f'tictactoe_ai_backend_latency_seconds_bucket{{backend="{name}",le="{edge}"}} {cumulative}')
+            lines.append(f'tictactoe_ai_backend_latency_seconds_sum{{backend="{name}"}} {data["latency_sum_seconds"]:.6f}')
+            lines.append(f'tictactoe_ai_backend_latency_seconds_count{{backend="{name}"}} {data["calls"]}')
+        lines += [
+            "# HELP tictactoe_ai_backend_calls_total AI backend calls by outcome.",
+            "# TYPE tictactoe_ai_backend_calls_total counter",
+        ]
+        for name, data in snap["backends"].items():
+            for outcome, count in data["outcomes"].items():
+                lines.append(f'tictactoe_ai_backend_calls_total{{backend="{name}",outcome="{outcome}"}} {count}')
+        lines += [
+            "# HELP tictactoe_ai_backend_fallbacks_total Times the chain moved past a backend.",
+            "# TYPE tictactoe_ai_backend_fallbacks_total counter",
+        ]
+        for name, data in snap["backends"].items():
+            lines.append(f'tictactoe_ai_backend_fallbacks_total{{backend="{name}"}} {data["fallbacks"]}')
+        lines += [
+            "# HELP tictactoe_ai_moves_total AI moves by the backend that answered.",
+            "# TYPE tictactoe_ai_moves_total counter",
+        ]
+        for name, data in snap["backends"].items():
+            lines.append(f'tictactoe_ai_moves_total{{backend="{name}"}} {data["served"]}')
+        lines.append(f'tictactoe_ai_moves_total{{backend="none"}} {snap["unanswered"]}')
+        lines += [
+            "# HELP tictactoe_ai_deadline_exceeded_total Moves that ran out of the overall deadline.",
+            "# TYPE tictactoe_ai_deadline_exceeded_total counter",
+            f"tictactoe_ai_deadline_exceeded_total {snap['deadline_exceeded']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str) -> None:
+        """Write JSON for a .json path, Prometheus text exposition format otherwise."""
+        text = json.dumps(self.snapshot(), indent=2) + "\n" if path.endswith(".json") else self.to_prometheus()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        # Atomic so a scraper never reads a half-written file.
+        os.replace(tmp, path)
+
+
+class BackendChain:
+    def __init__(
+        self, backends: Sequence[Backend], deadline: float, metrics_path: str = "", workers: int = 2
+    ) -> None:
+        self.backends = list(backends)
+        self.deadline = deadline
+        self.metrics_path = metrics_path
+        self.metrics = ChainMetrics([backend.name for backend in self.backends])
+        # One pool per backend, so an abandoned slow call never delays the next backend.
+        # ``workers`` should cover every caller that can run the chain at once.
+        self._pools = {
+            backend.name: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"ai-{backend.name}")
+            for backend in self.backends
+        }
+
+    @property
+    def names(self) -> List[str]:
+        return [backend.name for backend in self.backends]
+
+    def load(self) -> Dict[str, float]:
+        """Load every backend; one that fails to load is dropped from the chain."""
+        loaded: Dict[str, float] = {}
+        for backend in list(self.backends):
+            started = time.perf_counter()
+            try:
+                backend.load()
+            except Exception as exc:
+                print(f"[AI] Backend '{backend.name}' unavailable, skipping it. Reason: {exc}")
+                self.backends.remove(backend)
+                continue
+            loaded[backend.name] = time.perf_counter() - started
+        return loaded
+
+    def move(self, board: List[str]) -> Tuple[Optional[int], Optional[str]]:
+        """(move, backend that produced it); (None, None) if nothing answered before the deadline."""
+        start = time.perf_counter()
+        deadline_hit = False
+        for backend in self.backends:
+            remaining = self.deadline - (time.perf_counter() - start)
+            if remaining <= 0:
+                deadline_hit = True
+                break
+            budget = min(backend.budget, remaining)
+            move, outcome, seconds = self._call(backend, list(board), budget)
+            self.metrics.observe(backend.name, seconds, outcome)
+            if outcome == "success":
+                self.metrics.finish(backend.name, False)
+                self._export()
+                return move, backend.name
+            print(f"[AI] Backend '{backend.name}' {outcome} after {seconds * 1000:.1f} ms; trying the next one.")
+        self.metrics.finish(None, deadline_hit)
+        self._export()
+        return None, None
+
+    def _call(self, backend: Backend, board: List[str], budget: float) -> Tuple[Optional[int], str, float]:
+        started = time.perf_counter()
+        future: Future = self._pools[backend.name].submit(backend.move, board, budget)
+        try:
+            move = future.result(timeout=budget)
+        except FutureTimeout:
+            future.cancel()
+            return None, "timeout", time.perf_counter() - started
+        except Exception as exc:
+            print(f"[AI] Backend '{backend.name}' failed: {exc}")
+            return None, "error", time.perf_counter() - started
+        seconds = time.perf_counter() - started
+        return (move, "success", seconds) if _legal(board, move) else (None, "miss", seconds)
+
+    def _export(self) -> None:
+        if not self.metrics_path:
+            return
+        try:
+            self.metrics.export(self.metrics_path)
+        except OSError as exc:
+            print(f"[AI] Could not write backend metrics to {self.metrics_path}: {exc}")
+
+    def summary(self) -> str:
+        snap = self.metrics.snapshot()
+        parts = []
+        for name, data in snap["backends"].items():
+            if data["calls"]:
+                parts.append(f"{name} {data['served']}/{data['calls']} ({data['success_rate']:.0%})")
+        return f"{snap['moves']} moves; answered/called per backend: {', '.join(parts) or 'none'}"
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        for backend in self.backends:
+            backend.close()
+        self._export()
+
+
+DEFAULT_BUDGETS = {"cache": 0.05, "policy": 0.1, "solver": 0.5}
+
+
+def parse_chain_spec(spec: str) -> List[Tuple[str, Optional[float]]]:
+    """Parse "cache:0.05,llm,solver" into [(name, budget or None)]."""
+    out: List[Tuple[str, Optional[float]]] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, budget = part.partition(":")
+        out.append((name.strip(), float(budget) if budget else None))
+    return out
+
+
+def chain_from_env(
+    environ: Mapping[str, str],
+    request_fn: RequestFn,
+    prompt_version: str,
+    workers: int = 2,
+    size: int = 3,
+    k: int = 3,
+) -> BackendChain:
+    """
+    Build the chain from the environment at call time. Without AI_BACKENDS the chain is
+    cache -> policy -> llm -> solver, keeping only what is configured. Boards other than
+    3x3 only have the solver, which then gets the whole deadline.
+    """
+    api_key = environ.get("OPENAI_API_KEY", "")
+    model = environ.get("OPENAI_MODEL", "").strip() or "gpt-4o-mini"
+    llm_timeout = _env_seconds(environ, "OPENAI_TIMEOUT", 30.0)
+    cache_path = environ.get("OPENAI_CACHE_PATH", "").strip()
+    policy_path = environ.get("AI_POLICY_PATH", "").strip()
+    deadline = _env_seconds(environ, "AI_MOVE_BUDGET", 5.0)
+
+    spec = environ.get("AI_BACKENDS", "").strip()
+    if not tictactoe_mnk.is_classic(size, k):
+        entries = [(name, budget) for name, budget in parse_chain_spec(spec) if name == "solver"]
+        entries = entries or [("solver", deadline)]
+    elif spec:
+        entries = parse_chain_spec(spec)
+    else:
+        entries = []
+        if api_key and cache_path != "off":
+            entries.append(("cache", None))
+        if policy_path:
+            entries.append(("policy", None))
+        if api_key:
+            entries.append(("llm", None))
+        entries.append(("solver", None))
+
+    backends: List[Backend] = []
+    cache_backend: Optional[CacheBackend] = None
+    for name, budget in entries:
+        if name == "cache":
+            if cache_path == "off":
+                continue
+            cache_backend = CacheBackend(budget or DEFAULT_BUDGETS["cache"], cache_path, model, prompt_version)
+            backends.append(cache_backend)
+        elif name == "policy":
+            if not policy_path:
+                raise ValueError("AI_BACKENDS lists 'policy' but AI_POLICY_PATH is not set.")
+            backends.append(PolicyBackend(budget or DEFAULT_BUDGETS["policy"], policy_path))
+        elif name == "llm":
+            if not api_key:
+                print("[AI] OPENAI_API_KEY not set; leaving the LLM out of the chain.")
+                continue
+            backends.append(
+                LLMBackend(
+                    budget or 0.0,
+                    request_fn,
+                    model,
+                    api_key,
+                    llm_timeout,
+                    environ.get("OPENAI_BASE_URL", "").strip(),
+                    prompt_version,
+                )
+            )
+        elif name == "solver":
+            backends.append(SolverBackend(budget or DEFAULT_BUDGETS["solver"], size, k))
+        else:
+            raise ValueError(f"Unknown AI backend '{name}'. Choose from: cache, policy, llm, solver.")
+    for idx, backend in enumerate(backends):
+        if isinstance(backend, LLMBackend):
+            backend.cache_backend = cache_backend
+            if not backend.budget:
+                # Leave room in the deadline for the backends after the LLM.
+                reserve = sum(later.budget for later in backends[idx + 1 :])
+                backend.budget = max(deadline - reserve, deadline / 2)
+    return BackendChain(backends, deadline, environ.get("AI_METRICS_PATH", "").strip(), workers)
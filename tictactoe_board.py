@@ -0,0 +1,127 @@
+"""
+Compact 3x3 board built on two 9-bit masks, one per player.
+
+Bit ``i`` of a mask is set when that player owns cell ``i`` (0-8, left-to-right,
+top-to-bottom). Player 0 moves first in the GUI (X) and is the agent in the env.
+"""
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+WINNING_LINES = (
+    (0, 1, 2),
+    (3, 4, 5),
+    (6, 7, 8),
+    (0, 3, 6),
+    (1, 4, 7),
+    (2, 5, 8),
+    (0, 4, 8),
+    (2, 4, 6),
+)
+
+FULL_MASK = 0x1FF
+CELL_MASKS = tuple(1 << idx for idx in range(9))
+WIN_MASKS = tuple(sum(CELL_MASKS[i] for i in line) for line in WINNING_LINES)
+
+# IS_WIN[mask] is True when the 9-bit mask contains a full line.
+IS_WIN = tuple(any(mask & win == win for win in WIN_MASKS) for mask in range(1 << 9))
+# MOVES[mask] lists the set cell indices of a 9-bit mask in ascending order.
+MOVES = tuple(tuple(idx for idx in range(9) if mask >> idx & 1) for mask in range(1 << 9))
+
+Masks = Tuple[int, int]
+
+
+def legal_mask(first: int, second: int) -> int:
+    return FULL_MASK & ~(first | second)
+
+
+def legal_moves(first: int, second: int) -> Tuple[int, ...]:
+    return MOVES[legal_mask(first, second)]
+
+
+def winner(first: int, second: int) -> Optional[int]:
+    """Player index (0 or 1) owning a full line, or None. Player 0 is checked first."""
+    if IS_WIN[first]:
+        return 0
+    if IS_WIN[second]:
+        return 1
+    return None
+
+
+def is_full(first: int, second: int) -> bool:
+    return first | second == FULL_MASK
+
+
+def position_hash(first: int, second: int) -> int:
+    """Stable 18-bit key: the first player's mask in the low bits, the second's above it."""
+    return first | second << 9
+
+
+class Bitboard:
+    __slots__ = ("masks",)
+
+    def __init__(self, first: int = 0, second: int = 0) -> None:
+        self.masks: List[int] = [first, second]
+
+    # apply/undo/is_empty shift instead of indexing CELL_MASKS so bigger boards
+    # (tictactoe_mnk) can share the class; the table-backed methods are 3x3 only.
+    def apply(self, idx: int, player: int) -> None:
+        self.masks[player] |= 1 << idx
+
+    def undo(self, idx: int, player: int) -> None:
+        self.masks[player] &= ~(1 << idx)
+
+    def clear(self) -> None:
+        self.masks[0] = 0
+        self.masks[1] = 0
+
+    def is_empty(self, idx: int) -> bool:
+        return not (self.masks[0] | self.masks[1]) >> idx & 1
+
+    def legal_moves(self) -> Tuple[int, ...]:
+        return legal_moves(self.masks[0], self.masks[1])
+
+    def winner(self) -> Optional[int]:
+        return winner(self.masks[0], self.masks[1])
+
+    def is_full(self) -> bool:
+        return is_full(self.masks[0], self.masks[1])
+
+    def key(self) -> int:
+        return position_hash(self.masks[0], self.masks[1])
+
+    def __repr__(self) -> str:
+        return f"Bitboard({self.masks[0]:#05x}, {self.masks[1]:#05x})"
+
+
+def _masks(cells: Iterable[Any], marks: Sequence[Any]) -> Masks:
+    first = second = 0
+    for idx, cell in enumerate(cells):
+        if cell == marks[0]:
+            first |= CELL_MASKS[idx]
+        elif cell == marks[1]:
+            second |= CELL_MASKS[idx]
+    return first, second
+
+
+def from_cells(board: Sequence[str], marks: Sequence[str] = ("X", "O")) -> Masks:
+    """Masks from the GUI's list of "X"/"O"/"" cells; ``marks`` gives player 0 and 1."""
+    return _masks(board, marks)
+
+
+def to_cells(
+    first: int, second: int, marks: Sequence[Any] = ("X", "O"), empty: Any = ""
+) -> List[Any]:
+    return [
+        marks[0] if first >> idx & 1 else marks[1] if second >> idx & 1 else empty
+        for idx in range(9)
+    ]
+
+
+def from_array(board: Iterable[int], marks: Sequence[int] = (1, 2)) -> Masks:
+    """Masks from the env's int8 observation; ``marks`` gives player 0 and 1."""
+    return _masks(board, marks)
+
+
+def to_array(first: int, second: int, marks: Sequence[int] = (1, 2)):
+    import numpy as np
+
+    return np.array(to_cells(first, second, marks, 0), dtype=np.int8)
@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+from tictactoe_board import from_cells, to_cells
+from tictactoe_symmetry import canonicalize, from_canonical_move, to_canonical_move
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "tictactoe", "llm_moves.sqlite")
+
+
+def board_key(board: Sequence[str]) -> str:
+    return "".join(cell or "." for cell in board)
+
+
+def canonical_board(board: Sequence[str]) -> Tuple[str, int]:
+    """Key of the board's canonical orientation and the symmetry that maps onto it."""
+    first, second, sym = canonicalize(*from_cells(board))
+    return board_key(to_cells(first, second)), sym
+
+
+class MoveCache:
+    """
+    SQLite-backed cache of parsed LLM moves keyed by (model, prompt version, board).
+    Boards are stored in canonical orientation, so rotated or reflected positions
+    share one entry and the move is mapped back to the caller's orientation.
+
+    Entries older than ``ttl`` seconds are ignored and the least recently used rows
+    are evicted once the table grows past ``max_entries``. The file can be shared
+    by several app sessions; hit/miss counts and saved request time are per instance.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_entries: int = 50_000,
+        ttl: float = 30 * 24 * 3600.0,
+    ) -> None:
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS moves ("
+            " key TEXT PRIMARY KEY,"
+            " move INTEGER NOT NULL,"
+            " latency REAL NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS moves_last_used ON moves (last_used)")
+
+    @staticmethod
+    def make_key(board: Sequence[str], model: str, prompt_version: str) -> Tuple[str, int]:
+        canonical, sym = canonical_board(board)
+        return f"{model}|{prompt_version}|{canonical}", sym
+
+    def get(self, board: Sequence[str], model: str, prompt_version: str) -> Optional[int]:
+        key, sym = self.make_key(board, model, prompt_version)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT move, latency FROM moves WHERE key = ? AND created >= ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE moves SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self.saved_seconds += row[1]
+        return from_canonical_move(int(row[0]), sym)
+
+    def put(
+        self, board: Sequence[str], model: str, prompt_version: str, move: int, latency: float = 0.0
+    ) -> None:
+        key, sym = self.make_key(board, model, prompt_version)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO moves (key, move, latency, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, to_canonical_move(int(move), sym), float(latency), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._db.execute("DELETE FROM moves WHERE created < ?", (now - self.ttl,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM moves").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM moves WHERE key IN (SELECT key FROM moves ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM moves").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
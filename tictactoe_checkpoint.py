@@ -0,0 +1,320 @@
+"""
+Checkpoints for long training runs (train_tictactoe_wandb.py --checkpoint-freq / --resume).
+
+A checkpoint is an ordinary SB3 model zip - policy, optimizer state, timestep
+counters and the pending observation, loadable with PPO.load for evaluation -
+with one extra entry, ``training_state.pkl``: the python/numpy/torch generator
+states, the state of every layer of the vec env stack, the self-play pool, the
+callbacks' schedules, the run's arguments and its W&B run id. Checkpoints are
+taken between PPO iterations, which is where learn() picks up again, so a
+resumed run continues bit for bit as if it had never stopped.
+
+The rollout loop only pays for copying that state. Serializing, compressing,
+fsyncing and pruning old checkpoints happen on a background thread, one
+checkpoint at a time.
+"""
+import copy
+import os
+import pickle
+import random
+import re
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import torch
+from stable_baselines3.common.base_class import BaseAlgorithm
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.save_util import recursive_getattr, save_to_zip_file
+from stable_baselines3.common.vec_env import DummyVecEnv, VecEnv, VecMonitor
+from stable_baselines3.common.vec_env.base_vec_env import VecEnvWrapper
+
+from tictactoe_selfplay import OpponentPool
+
+STATE_ENTRY = "training_state.pkl"
+STATE_VERSION = 1
+CHECKPOINT_PATTERN = re.compile(r"^checkpoint-(\d+)\.zip$")
+
+
+def checkpoint_name(timesteps: int) -> str:
+    return f"checkpoint-{timesteps:010d}.zip"
+
+
+def list_checkpoints(directory: str) -> List[Tuple[int, str]]:
+    """(timesteps, path) of every checkpoint in ``directory``, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in os.listdir(directory):
+        match = CHECKPOINT_PATTERN.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def find_checkpoint(path: str) -> str:
+    """``path`` itself if it is a file, else the newest checkpoint in that directory."""
+    if os.path.isfile(path):
+        return path
+    found = list_checkpoints(path)
+    if not found:
+        raise ValueError(f"No checkpoint found at '{path}'.")
+    return found[-1][1]
+
+
+def retained(timesteps: Sequence[int], keep: int, keep_every: int = 0) -> Set[int]:
+    """
+    Checkpoints to keep: the newest ``keep``, plus the first one written in every
+    ``keep_every`` timesteps (0 keeps no such milestones).
+    """
+    ordered = sorted(timesteps)
+    kept = set(ordered[-keep:]) if keep > 0 else set()
+    if keep_every > 0:
+        windows: Set[int] = set()
+        for steps in ordered:
+            if steps // keep_every not in windows:
+                windows.add(steps // keep_every)
+                kept.add(steps)
+    return kept
+
+
+def _is_stateful(obj: Any) -> bool:
+    # Looked up on the type: VecEnvWrapper forwards unknown attributes to the env it wraps.
+    return callable(getattr(type(obj), "get_state", None))
+
+
+def _env_layers(venv: VecEnv) -> List[VecEnv]:
+    layers = [venv]
+    while isinstance(layers[-1], VecEnvWrapper):
+        layers.append(layers[-1].venv)
+    return layers
+
+
+def env_state(venv: VecEnv) -> List[Tuple[str, Any]]:
+    """(class name, state) for every layer of the wrapper stack, outermost first."""
+    states: List[Tuple[str, Any]] = []
+    for layer in _env_layers(venv):
+        if isinstance(layer, VecMonitor):
+            state: Any = {
+                "episode_returns": layer.episode_returns.copy(),
+                "episode_lengths": layer.episode_lengths.copy(),
+                "episode_count": layer.episode_count,
+            }
+        elif isinstance(layer, DummyVecEnv):
+            state = layer.env_method("get_state")
+        elif _is_stateful(layer):
+            state = layer.get_state()
+        else:
+            state = None
+        states.append((type(layer).__name__, state))
+    return states
+
+
+def restore_env_state(venv: VecEnv, states: List[Tuple[str, Any]]) -> None:
+    layers = _env_layers(venv)
+    names = [type(layer).__name__ for layer in layers]
+    saved = [name for name, _ in states]
+    if names != saved:
+        raise ValueError(f"The checkpoint was taken with envs {' > '.join(saved)}, not {' > '.join(names)}.")
+    for layer, (_, state) in zip(layers, states):
+        if isinstance(layer, VecMonitor):
+            layer.episode_returns = state["episode_returns"].copy()
+            layer.episode_lengths = state["episode_lengths"].copy()
+            layer.episode_count = state["episode_count"]
+        elif isinstance(layer, DummyVecEnv):
+            for rank, game_state in enumerate(state):
+                layer.env_method("set_state", game_state, indices=[rank])
+        elif state is not None:
+            layer.set_state(state)
+
+
+def rng_state() -> Dict[str, Any]:
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+    }
+
+
+def set_rng_state(state: Dict[str, Any]) -> None:
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if state["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def model_snapshot(model: BaseAlgorithm) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Copies of what BaseAlgorithm.save writes (data, state dicts, torch variables), safe to write later."""
+    exclude = set(model._excluded_save_params())
+    state_dicts, torch_variables = model._get_torch_save_params()
+    exclude.update(name.split(".")[0] for name in state_dicts + torch_variables)
+    data = copy.deepcopy({key: value for key, value in model.__dict__.items() if key not in exclude})
+    params = copy.deepcopy(model.get_parameters())
+    variables = {name: copy.deepcopy(recursive_getattr(model, name)) for name in torch_variables}
+    return data, params, variables
+
+
+def load_training_state(path: str) -> Dict[str, Any]:
+    with zipfile.ZipFile(path) as archive:
+        if STATE_ENTRY not in archive.namelist():
+            raise ValueError(f"'{path}' is a model, not a training checkpoint (no {STATE_ENTRY}).")
+        state = pickle.loads(archive.read(STATE_ENTRY))
+    if state.get("version") != STATE_VERSION:
+        raise ValueError(f"'{path}' has checkpoint version {state.get('version')}, expected {STATE_VERSION}.")
+    return state
+
+
+def restore_training_state(
+    model: BaseAlgorithm,
+    state: Dict[str, Any],
+    callbacks: Sequence[BaseCallback],
+    pool: Optional[OpponentPool] = None,
+) -> None:
+    """Puts a model loaded from the checkpoint (with force_reset=False) back where the run stopped."""
+    if pool is not None and state["pool"] is not None:
+        pool.set_state(state["pool"])
+    restore_env_state(model.get_env(), state["env"])
+    for callback in callbacks:
+        name = type(callback).__name__
+        if _is_stateful(callback) and name in state["callbacks"]:
+            callback.set_state(state["callbacks"][name])
+    set_rng_state(state["rng"])
+
+
+class CheckpointWriter:
+    """Writes checkpoints on one background thread and prunes the ones retained() drops."""
+
+    def __init__(self, directory: str, keep: int, keep_every: int = 0) -> None:
+        self.directory = directory
+        self.keep = keep
+        self.keep_every = keep_every
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self.pending: Optional[Future] = None
+        self.last_write_seconds = 0.0
+
+    def submit(
+        self,
+        timesteps: int,
+        data: Dict[str, Any],
+        params: Dict[str, Any],
+        variables: Dict[str, Any],
+        state: bytes,
+    ) -> float:
+        """Queues one checkpoint after the previous has finished; returns the seconds spent waiting for it."""
+        waited = self.wait()
+        path = os.path.join(self.directory, checkpoint_name(timesteps))
+        self.pending = self.executor.submit(self._write, path, data, params, variables, state)
+        return waited
+
+    def wait(self) -> float:
+        if self.pending is None:
+            return 0.0
+        start = time.perf_counter()
+        try:
+            self.last_write_seconds = self.pending.result()
+        except OSError as exc:
+            # A full or failing disk costs this checkpoint, not the run.
+            print(f"[checkpoint] Writing a checkpoint failed: {exc}")
+        self.pending = None
+        return time.perf_counter() - start
+
+    def close(self) -> None:
+        self.wait()
+        self.executor.shutdown()
+
+    def _write(
+        self, path: str, data: Dict[str, Any], params: Dict[str, Any], variables: Dict[str, Any], state: bytes
+    ) -> float:
+        start = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as handle:
+            save_to_zip_file(handle, data=data, params=params, pytorch_variables=variables)
+        with zipfile.ZipFile(tmp_path, "a") as archive:
+            archive.writestr(STATE_ENTRY, state)
+        with open(tmp_path, "rb") as handle:
+            os.fsync(handle.fileno())
+        # Readers only ever see complete checkpoints.
+        os.replace(tmp_path, path)
+        found = list_checkpoints(self.directory)
+        kept = retained([steps for steps, _ in found], self.keep, self.keep_every)
+        for steps, old_path in found:
+            if steps not in kept:
+                os.remove(old_path)
+        return time.perf_counter() - start
+
+
+class AsyncCheckpointCallback(BaseCallback):
+    """
+    Checkpoints the run every ``save_freq`` timesteps into ``directory``.
+
+    :param callbacks: the run's callbacks; those with get_state/set_state are saved and restored.
+    :param pool: the self-play pool, saved together with the envs that reference its snapshots.
+    :param extra: saved as-is, e.g. the run id and arguments needed to resume.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        save_freq: int,
+        keep: int = 3,
+        keep_every: int = 0,
+        callbacks: Sequence[BaseCallback] = (),
+        pool: Optional[OpponentPool] = None,
+        extra: Optional[Dict[str, Any]] = None,
+        verbose: int = 0,
+    ) -> None:
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.writer = CheckpointWriter(directory, keep, keep_every)
+        self.callbacks = callbacks
+        self.pool = pool
+        self.extra = extra or {}
+        self._next_save = save_freq
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_rollout_start(self) -> None:
+        # The policy has just been updated and no step of the next rollout taken.
+        if self.model.num_timesteps >= self._next_save:
+            self._next_save = self.model.num_timesteps + self.save_freq
+            self.save()
+
+    def _on_training_end(self) -> None:
+        self.writer.close()
+
+    def get_state(self) -> Dict[str, Any]:
+        return {"next_save": self._next_save}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self._next_save = state["next_save"]
+
+    def save(self) -> None:
+        start = time.perf_counter()
+        data, params, variables = model_snapshot(self.model)
+        state = {
+            "version": STATE_VERSION,
+            "timesteps": self.model.num_timesteps,
+            "rng": rng_state(),
+            "env": env_state(self.model.get_env()),
+            "pool": self.pool.get_state() if self.pool is not None else None,
+            "callbacks": {type(cb).__name__: cb.get_state() for cb in self.callbacks if _is_stateful(cb)},
+            **self.extra,
+        }
+        # Pickled now: snapshot win counts and the like keep changing while the writer runs.
+        payload = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        captured = time.perf_counter() - start
+        waited = self.writer.submit(self.model.num_timesteps, data, params, variables, payload)
+        self.logger.record("checkpoint/capture_s", captured)
+        self.logger.record("checkpoint/wait_s", waited)
+        self.logger.record("checkpoint/write_s", self.writer.last_write_seconds)
+        if self.verbose:
+            print(
+                f"[checkpoint] {self.model.num_timesteps} steps: captured in {captured * 1000:.1f}ms, "
+                f"writing {checkpoint_name(self.model.num_timesteps)} in the background"
+            )
@@ -0,0 +1,364 @@
+"""
+Offline trajectory datasets for imitation learning and offline RL.
+
+``python tictactoe_dataset.py solver heuristic --transitions 100000000`` plays
+scripted players against each other (half the games with each side first) in
+worker processes and writes every move as one row of a columnar dataset:
+
+    datasets/<name>/meta.json                 schema, players and per-shard row counts
+    datasets/<name>/shard-00000/<column>.npy  one .npy per column, opened with mmap
+
+Games are simulated thousands at a time with the bitboard lookup tables, so one
+worker produces a few million rows per second. Shards are written to a temporary
+directory and renamed when complete; rerunning into an existing dataset appends
+new shards. TrajectoryDataset streams batches from the memory-mapped columns
+without loading the dataset into RAM.
+
+Each row is one move from the mover's point of view (the env encoding: 1 own
+marks, 2 the other side's), with ``value`` the solver's value of the position
+before the move and ``action_value`` the value after it, both for the mover.
+
+Rows are laid out for per-player trajectories: each player's last move in a game
+has ``done`` set and ``reward`` the game's result for that player (1 win, -1 loss,
+0 draw); every other row has reward 0. So every game has two ``done`` rows, the
+loser's included, and a new game starts where ``ply`` is 0.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import tictactoe_solver
+from tictactoe_board import FULL_MASK, IS_WIN
+from tictactoe_opponents import NO_MOVE, forced_table
+
+PLAYERS = ("random", "heuristic", "solver")
+
+# Column name -> (dtype, per-row shape).
+COLUMNS: Dict[str, Tuple[str, Tuple[int, ...]]] = {
+    "obs": ("int8", (9,)),
+    "action": ("int8", ()),
+    # Set on each player's last move of the game, with the result as its reward.
+    "reward": ("float32", ()),
+    "done": ("bool", ()),
+    # Bit i set when cell i is empty; TrajectoryDataset unpacks it to a (9,) bool mask.
+    "legal": ("uint16", ()),
+    "value": ("int8", ()),
+    "action_value": ("int8", ()),
+    # Final result of the game for the mover: 1 win, 0 draw, -1 loss.
+    "outcome": ("int8", ()),
+    "ply": ("int8", ()),
+    # Index into meta["players"] of the player who made the move.
+    "player": ("int8", ()),
+}
+
+WIN_ARRAY = np.array(IS_WIN, dtype=bool)
+CORNER_BONUS = np.array([1.0 if idx in (0, 2, 6, 8) else 0.0 for idx in range(9)])
+
+
+@lru_cache(maxsize=None)
+def solver_tables() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (value, optimal-move mask) for the side to move, indexed by ``other | mover << 9``
+    as in tictactoe_opponents.perfect_table.
+    """
+    values = np.zeros(1 << 18, dtype=np.int8)
+    optimal = np.zeros(1 << 18, dtype=np.int16)
+    for other in range(FULL_MASK + 1):
+        for mover in range(FULL_MASK + 1):
+            if other & mover:
+                continue
+            values[other | mover << 9] = tictactoe_solver.lookup_masks(other, mover, True)[0]
+            optimal[other | mover << 9] = sum(1 << move for move in tictactoe_solver.optimal_moves(other, mover, True))
+    return values, optimal
+
+
+def _choose(keys: np.ndarray, allowed: np.ndarray) -> np.ndarray:
+    """Per row, the allowed cell (bitmask) with the largest key."""
+    bits = (allowed[:, None] >> np.arange(9)) & 1
+    return np.where(bits == 1, keys, -1.0).argmax(axis=1)
+
+
+def select_moves(player: str, mover: np.ndarray, other: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Vectorised moves for rows where ``mover`` is to play; same rules as the env's opponents."""
+    empty = FULL_MASK & ~(mover | other)
+    keys = rng.random((mover.size, 9))
+    if player == "random":
+        return _choose(keys, empty)
+    if player == "heuristic":
+        moves = forced_table()[other | mover << 9].astype(np.int64)
+        # random_fallback: a random free corner, else a random free cell.
+        fallback = _choose(keys + CORNER_BONUS, empty)
+        return np.where(moves == NO_MOVE, fallback, moves)
+    if player == "solver":
+        # A random optimal move rather than always the lowest index, for more varied games.
+        return _choose(keys, solver_tables()[1][other | mover << 9].astype(np.int64))
+    raise ValueError(f"Unknown player '{player}'. Choose from: {', '.join(PLAYERS)}.")
+
+
+def play_games(
+    players: Tuple[str, str], games: int, rng: np.random.Generator, a_first: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Play ``games`` games at once, players[0] moving first where ``a_first`` is set.
+    Returns the columns with each game's rows contiguous and in move order.
+    """
+    values = solver_tables()[0]
+    masks = [np.zeros(games, dtype=np.int64), np.zeros(games, dtype=np.int64)]
+    active = np.ones(games, dtype=bool)
+    winner = np.full(games, -1, dtype=np.int8)
+    fields = ("mover", "other", "action", "value", "action_value", "valid", "player")
+    plies: Dict[str, List[np.ndarray]] = {name: [] for name in fields}
+
+    for ply in range(9):
+        side = ply % 2
+        mover, other = masks[side], masks[1 - side]
+        # Seat 0 is whoever moves first in that game.
+        player_idx = np.where(a_first == (side == 0), 0, 1).astype(np.int8)
+        action = np.zeros(games, dtype=np.int64)
+        for idx, name in enumerate(players):
+            rows = np.flatnonzero(active & (player_idx == idx))
+            if rows.size:
+                action[rows] = select_moves(name, mover[rows], other[rows], rng)
+        after = np.where(active, mover | (1 << action), mover)
+        won = active & WIN_ARRAY[after]
+        full = (after | other) == FULL_MASK
+        done = active & (won | full)
+
+        plies["mover"].append(mover.copy())
+        plies["other"].append(other.copy())
+        plies["action"].append(action)
+        plies["value"].append(values[other | mover << 9])
+        plies["action_value"].append(-values[after | other << 9])
+        plies["valid"].append(active.copy())
+        plies["player"].append(player_idx)
+
+        winner[won] = side
+        masks[side] = after
+        active = active & ~done
+
+    # (games, 9) per field, then keep played plies: row-major order groups each game's moves.
+    stacked = {name: np.stack(arrays, axis=1) for name, arrays in plies.items()}
+    valid = stacked["valid"]
+    mover = stacked["mover"][valid]
+    other = stacked["other"][valid]
+    ply = np.broadcast_to(np.arange(9, dtype=np.int8), valid.shape)[valid]
+    game_winner = np.broadcast_to(winner[:, None], valid.shape)[valid]
+    side = ply % 2
+    outcome = np.where(game_winner == -1, 0, np.where(game_winner == side, 1, -1)).astype(np.int8)
+    # The last two moves of a game are each player's last: the final move and the reply before it.
+    length = np.broadcast_to(valid.sum(axis=1)[:, None], valid.shape)[valid]
+    done = ply >= length - 2
+    return {
+        "obs": (((mover[:, None] >> np.arange(9)) & 1) + 2 * ((other[:, None] >> np.arange(9)) & 1)).astype(np.int8),
+        "action": stacked["action"][valid].astype(np.int8),
+        "reward": np.where(done, outcome, 0).astype(np.float32),
+        "done": done,
+        "legal": (FULL_MASK & ~(mover | other)).astype(np.uint16),
+        "value": stacked["value"][valid],
+        "action_value": stacked["action_value"][valid].astype(np.int8),
+        "outcome": outcome,
+        "ply": ply.copy(),
+        "player": stacked["player"][valid],
+    }
+
+
+def write_shard(
+    root: str, index: int, players: Tuple[str, str], rows: int, seed: int, chunk_games: int = 100_000
+) -> Tuple[int, int, int]:
+    """Fill shard ``index`` with whole games up to ``rows`` rows; returns (index, rows, games)."""
+    rng = np.random.default_rng(seed)
+    chunks: List[Dict[str, np.ndarray]] = []
+    written = games = 0
+    while rows - written >= 9:
+        # Games last at most 9 moves, so a batch of remaining // 9 games never overshoots the shard.
+        batch = max(1, min(chunk_games, (rows - written) // 9))
+        a_first = np.arange(games, games + batch) % 2 == 0
+        chunk = play_games(players, batch, rng, a_first)
+        chunks.append(chunk)
+        written += chunk["action"].size
+        games += batch
+
+    tmp = os.path.join(root, f"shard-{index:05d}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, (dtype, shape) in COLUMNS.items():
+        path = os.path.join(tmp, f"{name}.npy")
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(written, *shape))
+        start = 0
+        for chunk in chunks:
+            out[start : start + len(chunk[name])] = chunk[name]
+            start += len(chunk[name])
+        out.flush()
+        del out
+    os.replace(tmp, os.path.join(root, f"shard-{index:05d}"))
+    return index, written, games
+
+
+def _read_meta(root: str) -> Optional[Dict]:
+    path = os.path.join(root, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _write_meta(root: str, meta: Dict) -> None:
+    tmp = os.path.join(root, "meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as handle:
+        json.dump(meta, handle, indent=2)
+        handle.write("\n")
+    os.replace(tmp, os.path.join(root, "meta.json"))
+
+
+def generate(
+    root: str,
+    players: Tuple[str, str],
+    transitions: int,
+    shard_rows: int = 4_000_000,
+    workers: int = 1,
+    seed: int = 0,
+) -> Dict:
+    """Append about ``transitions`` rows of ``players[0]`` vs ``players[1]`` games to the dataset at ``root``."""
+    for name in players:
+        if name not in PLAYERS:
+            raise ValueError(f"Unknown player '{name}'. Choose from: {', '.join(PLAYERS)}.")
+    os.makedirs(root, exist_ok=True)
+    meta = _read_meta(root) or {
+        "columns": {name: {"dtype": dtype, "shape": list(shape)} for name, (dtype, shape) in COLUMNS.items()},
+        "players": list(players),
+        "shards": [],
+    }
+    if list(meta["players"]) != list(players):
+        raise ValueError(f"{root} holds {meta['players'][0]} vs {meta['players'][1]} games; use another directory.")
+    first = max((shard["index"] for shard in meta["shards"]), default=-1) + 1
+    count = max(1, -(-transitions // shard_rows))
+    jobs = [
+        (root, first + idx, players, min(shard_rows, transitions - idx * shard_rows), seed + first + idx)
+        for idx in range(count)
+    ]
+
+    started = time.perf_counter()
+    done = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        futures = [pool.submit(write_shard, *job) for job in jobs]
+        for future in as_completed(futures):
+            index, rows, games = future.result()
+            meta["shards"].append({"index": index, "rows": rows, "games": games})
+            meta["shards"].sort(key=lambda shard: shard["index"])
+            # Recorded per shard, so an interrupted run keeps every finished shard.
+            _write_meta(root, meta)
+            done += rows
+            rate = done / (time.perf_counter() - started)
+            print(
+                f"[dataset] shard {index:05d}: {rows:,} rows, {games:,} games "
+                f"({done:,}/{transitions:,}, {rate:,.0f} rows/s)"
+            )
+    return meta
+
+
+class TrajectoryDataset:
+    """Read-only view of a dataset directory; columns are memory-mapped, never loaded whole."""
+
+    def __init__(self, root: str) -> None:
+        meta = _read_meta(root)
+        if meta is None:
+            raise FileNotFoundError(f"No dataset at {root} (missing meta.json).")
+        self.root = root
+        self.meta = meta
+        self.shards = meta["shards"]
+        self.columns = list(meta["columns"])
+
+    def __len__(self) -> int:
+        return sum(shard["rows"] for shard in self.shards)
+
+    @property
+    def games(self) -> int:
+        return sum(shard["games"] for shard in self.shards)
+
+    def shard(self, position: int) -> Dict[str, np.ndarray]:
+        """Memory-mapped columns of the shard at ``position`` in the shard list."""
+        directory = os.path.join(self.root, f"shard-{self.shards[position]['index']:05d}")
+        return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in self.columns}
+
+    def iter_batches(
+        self,
+        batch_size: int = 4096,
+        columns: Optional[Sequence[str]] = None,
+        shuffle: bool = False,
+        seed: Optional[int] = None,
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Yield dicts of in-memory arrays, ``batch_size`` rows each (the last may be short).
+        With ``shuffle``, shards and batch-sized blocks within them are visited in random
+        order and rows are shuffled inside each block, so reads stay sequential.
+        ``legal`` is returned unpacked as a (rows, 9) bool mask.
+        """
+        names = list(columns or self.columns)
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self.shards)) if shuffle else np.arange(len(self.shards))
+        for position in order:
+            shard = self.shard(int(position))
+            rows = self.shards[int(position)]["rows"]
+            starts = np.arange(0, rows, batch_size)
+            if shuffle:
+                rng.shuffle(starts)
+            for start in starts:
+                stop = min(start + batch_size, rows)
+                batch = {name: np.asarray(shard[name][start:stop]) for name in names}
+                if shuffle:
+                    perm = rng.permutation(stop - start)
+                    batch = {name: values[perm] for name, values in batch.items()}
+                if "legal" in batch:
+                    batch["legal"] = ((batch["legal"][:, None] >> np.arange(9)) & 1).astype(bool)
+                yield batch
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate an offline TicTacToe trajectory dataset.")
+    parser.add_argument("player_a", type=str, choices=PLAYERS, help="First player (moves first in half the games).")
+    parser.add_argument("player_b", type=str, choices=PLAYERS, help="Second player.")
+    parser.add_argument("--transitions", type=int, default=10_000_000, help="Rows (moves) to add.")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="",
+        help="Dataset directory (default: datasets/<a>-vs-<b>); an existing dataset is appended to.",
+    )
+    parser.add_argument("--shard-rows", type=int, default=4_000_000, help="Rows per shard file set.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes.")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed; each shard adds its index.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    root = args.output or os.path.join("datasets", f"{args.player_a}-vs-{args.player_b}")
+    started = time.perf_counter()
+    try:
+        generate(root, (args.player_a, args.player_b), args.transitions, args.shard_rows, args.workers, args.seed)
+    except ValueError as exc:
+        raise SystemExit(str(exc)) from None
+    elapsed = time.perf_counter() - started
+    dataset = TrajectoryDataset(root)
+    size = sum(
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, files in os.walk(root)
+        for name in files
+    )
+    print(
+        f"[dataset] {root}: {len(dataset):,} rows, {dataset.games:,} games in {len(dataset.shards)} shards, "
+        f"{size / 1e9:.2f} GB ({elapsed:.1f}s this run)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,13 @@
-from typing import Optional
+from typing import Any, Dict, Optional
 
 import gymnasium as gym
 import numpy as np
 from gymnasium import spaces
 
-WINNING_LINES = (
-    (0, 1, 2),
-    (3, 4, 5),
-    (6, 7, 8),
-    (0, 3, 6),
-    (1, 4, 7),
-    (2, 5, 8),
-    (0, 4, 8),
-    (2, 4, 6),
-)
+import tictactoe_mnk
+from tictactoe_board import IS_WIN, Bitboard
+from tictactoe_opponents import get_mnk_opponent, get_opponent
+from tictactoe_selfplay import SELF_PLAY, OpponentPool
 
 
 class TicTacToeEnv(gym.Env):
@@ -25,31 +19,57 @@ class TicTacToeEnv(gym.Env):
         draw_reward: float = 0.0,
         step_penalty: float = -0.01,
         opponent_first_prob: float = 0.5,
+        opponent: str = "heuristic",
+        opponent_pool: Optional[OpponentPool] = None,
+        size: int = 3,
+        k: int = 3,
     ) -> None:
         super().__init__()
+        # Other sizes use generated win lines (tictactoe_mnk) instead of the 3x3 lookup tables.
+        self.size = size
+        self.k = k
+        self.geometry = tictactoe_mnk.square(size, k)
+        self.classic = tictactoe_mnk.is_classic(size, k)
         self.invalid_penalty = invalid_penalty
         self.draw_reward = draw_reward
         self.step_penalty = step_penalty
         self.opponent_first_prob = opponent_first_prob
+        if opponent != SELF_PLAY:
+            self.opponent_fn = get_opponent(opponent) if self.classic else get_mnk_opponent(opponent, size, k)
+        self.opponent = opponent
+        # Self-play draws a frozen policy per episode; share one pool across envs.
+        self.opponent_pool = opponent_pool
+        if opponent == SELF_PLAY and opponent_pool is None:
+            self.opponent_pool = OpponentPool()
+        self.pool_opponent = None
         self.agent_mark = 1
         self.opponent_mark = 2
 
-        self.action_space = spaces.Discrete(9)
-        self.observation_space = spaces.Box(low=0, high=2, shape=(9,), dtype=np.int8)
+        cells = size * size
+        self.action_space = spaces.Discrete(cells)
+        self.observation_space = spaces.Box(low=0, high=2, shape=(cells,), dtype=np.int8)
 
-        self.board = np.zeros(9, dtype=np.int8)
+        self.board = np.zeros(cells, dtype=np.int8)
+        # Mirrors self.board: mask 0 holds the agent's cells, mask 1 the opponent's.
+        self.bits = Bitboard()
+        # is_win[mask]: the 3x3 table, or the generated lines of a bigger board.
+        self.is_win = IS_WIN if self.classic else _WinLookup(self.geometry)
 
     def reset(self, *, seed: Optional[int] = None, options=None):
         super().reset(seed=seed)
         self.board.fill(0)
+        self.bits.clear()
         info = {}
+        if self.opponent == SELF_PLAY:
+            self.pool_opponent = self.opponent_pool.sample(1)[0]
 
         if self.np_random.random() < self.opponent_first_prob:
             opp_move = self._opponent_move()
             if opp_move is not None:
-                self.board[opp_move] = self.opponent_mark
+                self._place(opp_move, self.opponent_mark)
                 info["opponent_started"] = True
 
+        info["action_mask"] = self.action_masks()
         return self._get_obs(), info
 
     def step(self, action: int):
@@ -57,76 +77,94 @@ class TicTacToeEnv(gym.Env):
         terminated = False
         truncated = False
 
-        if self.board[action] != 0:
+        if not self.bits.is_empty(action):
             return self._get_obs(), self.invalid_penalty, True, truncated, {
-                "invalid_action": True
+                "invalid_action": True,
+                "action_mask": self.action_masks(),
             }
 
-        self.board[action] = self.agent_mark
-        winner = self._check_winner()
-        if winner == self.agent_mark:
-            return self._get_obs(), 1.0, True, truncated, {"result": "win"}
+        self._place(action, self.agent_mark)
+        if self.is_win[self.bits.masks[0]]:
+            return self._finish(1.0, "win")
         if self._is_draw():
-            return self._get_obs(), self.draw_reward, True, truncated, {"result": "draw"}
+            return self._finish(self.draw_reward, "draw")
 
         opp_move = self._opponent_move()
         if opp_move is not None:
-            self.board[opp_move] = self.opponent_mark
+            self._place(opp_move, self.opponent_mark)
 
-        winner = self._check_winner()
-        if winner == self.opponent_mark:
-            return self._get_obs(), -1.0, True, truncated, {"result": "loss"}
+        if self.is_win[self.bits.masks[1]]:
+            return self._finish(-1.0, "loss")
         if self._is_draw():
-            return self._get_obs(), self.draw_reward, True, truncated, {"result": "draw"}
+            return self._finish(self.draw_reward, "draw")
 
+        info["action_mask"] = self.action_masks()
         return self._get_obs(), self.step_penalty, terminated, truncated, info
 
+    def action_masks(self) -> np.ndarray:
+        """Legal moves for the agent: True on empty cells (the interface MaskablePPO expects)."""
+        return self.board == 0
+
     def render(self):
         symbols = {0: ".", self.agent_mark: "X", self.opponent_mark: "O"}
         rows = []
-        for r in range(3):
-            start = r * 3
-            rows.append(" ".join(symbols[val] for val in self.board[start : start + 3]))
+        for r in range(self.size):
+            start = r * self.size
+            rows.append(" ".join(symbols[val] for val in self.board[start : start + self.size]))
         print("\n".join(rows))
 
     def close(self):
         return None
 
+    def get_state(self) -> Dict[str, Any]:
+        """Everything a checkpoint needs to continue this game exactly (tictactoe_checkpoint)."""
+        return {
+            "board": self.board.copy(),
+            "masks": list(self.bits.masks),
+            "np_random": self.np_random.bit_generator.state,
+            "pool_opponent": self.pool_opponent,
+        }
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self.board[:] = state["board"]
+        self.bits.masks[:] = state["masks"]
+        self.np_random.bit_generator.state = state["np_random"]
+        self.pool_opponent = state["pool_opponent"]
+
+    def _finish(self, reward: float, result: str):
+        if self.pool_opponent is not None:
+            self.pool_opponent.record(result)
+        return self._get_obs(), reward, True, False, {"result": result, "action_mask": self.action_masks()}
+
     def _get_obs(self) -> np.ndarray:
         return self.board.astype(np.int8)
 
-    def _check_winner(self) -> int:
-        for a, b, c in WINNING_LINES:
-            line = (self.board[a], self.board[b], self.board[c])
-            if line[0] != 0 and line[0] == line[1] == line[2]:
-                return int(line[0])
-        return 0
+    def _place(self, idx: int, mark: int) -> None:
+        self.board[idx] = mark
+        self.bits.apply(idx, 0 if mark == self.agent_mark else 1)
 
     def _is_draw(self) -> bool:
-        return bool(np.all(self.board != 0))
+        return self.bits.masks[0] | self.bits.masks[1] == self.geometry.full_mask
 
     def _opponent_move(self) -> Optional[int]:
-        empties = np.where(self.board == 0)[0].tolist()
-        if not empties:
-            return None
-
-        for candidate in empties:
-            self.board[candidate] = self.opponent_mark
-            if self._check_winner() == self.opponent_mark:
-                self.board[candidate] = 0
-                return candidate
-            self.board[candidate] = 0
-
-        for candidate in empties:
-            self.board[candidate] = self.agent_mark
-            if self._check_winner() == self.agent_mark:
-                self.board[candidate] = 0
-                return candidate
-            self.board[candidate] = 0
-
-        if 4 in empties:
-            return 4
-        corners = [c for c in (0, 2, 6, 8) if c in empties]
-        if corners:
-            return int(self.np_random.choice(corners))
-        return int(self.np_random.choice(empties))
+        if self.opponent == SELF_PLAY and self.pool_opponent is not None:
+            if self._is_draw():
+                return None
+            return int(self.opponent_pool.act(self.board[None, :], [self.pool_opponent])[0])
+        agent, opponent = self.bits.masks
+        if self.opponent == SELF_PLAY:
+            fallback = get_opponent("heuristic") if self.classic else get_mnk_opponent("heuristic", self.size, self.k)
+            return fallback(agent, opponent, self.np_random)
+        return self.opponent_fn(agent, opponent, self.np_random)
+
+
+class _WinLookup:
+    """``IS_WIN``-style indexing (``lookup[mask]``) for boards too big for a table."""
+
+    __slots__ = ("has_win",)
+
+    def __init__(self, geometry: tictactoe_mnk.Geometry) -> None:
+        self.has_win = geometry.has_win
+
+    def __getitem__(self, mask: int) -> bool:
+        return self.has_win(mask)
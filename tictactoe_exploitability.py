@@ -0,0 +1,206 @@
+"""
+Exact evaluation of a trained policy against the solved game.
+
+Every position reachable in TicTacToeEnv where the agent is to move (agent first
+or opponent first) is scored in one batched forward pass and compared with the
+solver's minimax value, from the agent's point of view (+1 win, 0 draw, -1 loss).
+
+    python tictactoe_exploitability.py models/<run>.zip
+"""
+import argparse
+import sys
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+import tictactoe_solver
+from tictactoe_board import CELL_MASKS, MOVES, legal_mask, to_array, winner
+from tictactoe_policy import is_maskable, load_model
+
+# Child value assigned to occupied cells; below every real value so illegal moves always regret.
+ILLEGAL = -2
+
+
+def _collect(
+    agent: int,
+    opponent: int,
+    agent_to_move: bool,
+    seen: Set[Tuple[int, int, bool]],
+    out: List[Tuple[int, int]],
+) -> None:
+    key = (agent, opponent, agent_to_move)
+    if key in seen or winner(agent, opponent) is not None:
+        return
+    seen.add(key)
+    empty = legal_mask(agent, opponent)
+    if not empty:
+        return
+    if agent_to_move:
+        out.append((agent, opponent))
+    for idx in MOVES[empty]:
+        if agent_to_move:
+            _collect(agent | CELL_MASKS[idx], opponent, False, seen, out)
+        else:
+            _collect(agent, opponent | CELL_MASKS[idx], True, seen, out)
+
+
+@lru_cache(maxsize=None)
+def agent_positions() -> Dict[str, np.ndarray]:
+    """
+    Observations, values and per-move child values for every agent-to-move position.
+    The solver's maximizing side (AI) plays the agent's role.
+    """
+    seen: Set[Tuple[int, int, bool]] = set()
+    positions: List[Tuple[int, int]] = []
+    _collect(0, 0, True, seen, positions)
+    _collect(0, 0, False, seen, positions)
+    positions = sorted(set(positions))
+
+    obs = np.stack([to_array(agent, opponent) for agent, opponent in positions])
+    values = np.empty(len(positions), dtype=np.int8)
+    children = np.full((len(positions), 9), ILLEGAL, dtype=np.int8)
+    for row, (agent, opponent) in enumerate(positions):
+        values[row] = tictactoe_solver.lookup_masks(opponent, agent, True)[0]
+        for idx in MOVES[legal_mask(agent, opponent)]:
+            children[row, idx] = tictactoe_solver.lookup_masks(opponent, agent | CELL_MASKS[idx], False)[0]
+    return {"obs": obs, "values": values, "children": children}
+
+
+def evaluate_policy(model: Any, masked: bool = False) -> Dict[str, Any]:
+    """
+    Greedy and stochastic regret of ``model`` (an SB3 PPO) over all agent-to-move positions.
+    ``masked`` applies the legal-move mask, as a MaskablePPO policy acts during training.
+    """
+    start = time.perf_counter()
+    data = agent_positions()
+    obs, values, children = data["obs"], data["values"], data["children"]
+
+    import torch
+
+    with torch.no_grad():
+        obs_tensor, _ = model.policy.obs_to_tensor(obs)
+        if masked:
+            distribution = model.policy.get_distribution(obs_tensor, action_masks=obs == 0)
+        else:
+            distribution = model.policy.get_distribution(obs_tensor)
+        probs = distribution.distribution.probs.cpu().numpy()
+
+    rows = np.arange(len(obs))
+    greedy = probs.argmax(axis=1)
+    chosen = children[rows, greedy]
+    illegal = chosen == ILLEGAL
+    # An illegal move ends the episode with a penalty; score it as a loss.
+    regret = values.astype(np.int64) - np.where(illegal, -1, chosen)
+    losing = ~illegal & (chosen == -1) & (values >= 0)
+    move_regret = values[:, None].astype(np.float64) - np.where(children == ILLEGAL, -1, children)
+    expected_regret = (probs * move_regret).sum(axis=1)
+
+    return {
+        "positions": int(len(obs)),
+        "illegal_moves": int(illegal.sum()),
+        "losing_moves": int(losing.sum()),
+        "suboptimal_moves": int((regret > 0).sum()),
+        "mean_regret": float(regret.mean()),
+        "max_regret": int(regret.max()),
+        "expected_regret": float(expected_regret.mean()),
+        "illegal_prob": float((probs * (children == ILLEGAL)).sum(axis=1).mean()),
+        "regret": regret,
+        "greedy": greedy,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class ExploitabilityCallback(BaseCallback):
+    """Runs evaluate_policy every ``eval_freq`` timesteps and logs the summary under ``exploit/``."""
+
+    def __init__(self, eval_freq: int, masked: bool = False, verbose: int = 0) -> None:
+        super().__init__(verbose)
+        self.eval_freq = eval_freq
+        self.masked = masked
+        self._next_eval = eval_freq
+        self._last_eval = -1
+        # One row per evaluation: the sample-efficiency curve of the run.
+        self.history: List[Dict[str, float]] = []
+
+    def _on_step(self) -> bool:
+        if self.num_timesteps >= self._next_eval:
+            self._next_eval += self.eval_freq
+            self.log_evaluation()
+        return True
+
+    def _on_training_end(self) -> None:
+        if self._last_eval != self.num_timesteps:
+            self.log_evaluation()
+
+    def get_state(self) -> Dict[str, Any]:
+        return {"next_eval": self._next_eval, "last_eval": self._last_eval, "history": list(self.history)}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self._next_eval = state["next_eval"]
+        self._last_eval = state["last_eval"]
+        self.history = list(state["history"])
+
+    def log_evaluation(self) -> None:
+        self._last_eval = self.num_timesteps
+        result = evaluate_policy(self.model, self.masked)
+        episodes = list(self.model.ep_info_buffer)
+        point: Dict[str, float] = {
+            "timesteps": self.num_timesteps,
+            "ep_rew_mean": float(np.mean([ep["r"] for ep in episodes])) if episodes else float("nan"),
+        }
+        for key in (
+            "illegal_moves",
+            "losing_moves",
+            "suboptimal_moves",
+            "mean_regret",
+            "expected_regret",
+            "illegal_prob",
+        ):
+            self.logger.record(f"exploit/{key}", result[key])
+            point[key] = result[key]
+        self.history.append(point)
+        if self.verbose:
+            print(
+                f"[exploit] {self.num_timesteps} steps: {result['losing_moves']} losing, "
+                f"{result['illegal_moves']} illegal of {result['positions']} positions"
+            )
+
+
+def print_report(result: Dict[str, Any], worst: int) -> None:
+    print(f"Positions evaluated: {result['positions']} in {result['seconds'] * 1000:.1f} ms")
+    print(f"  illegal moves:    {result['illegal_moves']}")
+    print(f"  losing moves:     {result['losing_moves']}")
+    print(f"  suboptimal moves: {result['suboptimal_moves']}")
+    print(f"  mean regret:      {result['mean_regret']:.4f} (max {result['max_regret']})")
+    print(f"  expected regret:  {result['expected_regret']:.4f} (sampling from the policy)")
+    print(f"  P(illegal):       {result['illegal_prob']:.4f}")
+    if worst:
+        obs = agent_positions()["obs"]
+        order = np.argsort(-result["regret"], kind="stable")[:worst]
+        for row in order:
+            if result["regret"][row] <= 0:
+                break
+            board = "".join(".XO"[v] for v in obs[row])
+            print(f"  regret {result['regret'][row]}: board {board} played {result['greedy'][row]}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Score a trained PPO policy against perfect play.")
+    parser.add_argument("model", type=str, help="Path to a model saved by train(), e.g. models/<run>.zip.")
+    parser.add_argument("--worst", type=int, default=10, help="Show this many highest-regret positions.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    cli = parse_args(argv)
+    # MaskablePPO models (--action-masking) are read as such from the zip and scored masked.
+    masked = is_maskable(cli.model)
+    print_report(evaluate_policy(load_model(cli.model, masked), masked), cli.worst)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
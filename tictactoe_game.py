@@ -0,0 +1,192 @@
+"""
+Game rules and the LLM move request, without the Tk window.
+
+The app (tictactoe.py), the game server, the arena and the batch tools share the
+OpenAI settings read from the environment, the prompt text and its version, reply
+parsing and request_openai_move from here, so none of them needs tkinter. The
+HTTP client (tictactoe_llm) is imported on the first request, not at import.
+"""
+import hashlib
+import math
+import os
+import re
+import time
+from typing import TYPE_CHECKING, List, Optional
+
+import tictactoe_board
+import tictactoe_mnk
+import tictactoe_solver
+from tictactoe_solver import EMPTY, MARKS
+
+if TYPE_CHECKING:
+    from tictactoe_cache import MoveCache
+    from tictactoe_llm import OpenAIClient
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "").strip() or "gpt-4o-mini"
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+
+
+def parse_timeout(val: str, default: float) -> float:
+    try:
+        v = float(val)
+        if v <= 0:
+            raise ValueError
+        return v
+    except Exception:
+        return default
+
+
+OPENAI_TIMEOUT = parse_timeout(os.getenv("OPENAI_TIMEOUT", ""), 30.0)
+# Empty means tictactoe_llm.DEFAULT_BASE_URL.
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "").strip()
+
+
+def _open_llm_client(api_key: str) -> "OpenAIClient":
+    from tictactoe_llm import DEFAULT_BASE_URL, get_client
+
+    return get_client(api_key, OPENAI_BASE_URL or DEFAULT_BASE_URL)
+
+
+def check_winner(board: List[str], k: int = 3) -> Optional[str]:
+    """Mark with ``k`` in a row on a square board of any size, or None."""
+    if len(board) == 9 and k == 3:
+        player = tictactoe_board.winner(*tictactoe_board.from_cells(board, MARKS))
+    else:
+        geo = tictactoe_mnk.square(math.isqrt(len(board)), k)
+        player = geo.winner(*geo.from_cells(board, MARKS))
+    return None if player is None else MARKS[player]
+
+
+def is_draw(board: List[str], k: int = 3) -> bool:
+    return all(cell != EMPTY for cell in board) and check_winner(board, k) is None
+
+
+def minimax(board: List[str], maximizing: bool) -> int:
+    """
+    Unbeatable search: maximizing chooses AI moves, minimizing chooses human moves.
+    Returns 1 for an AI win, -1 for a human win, and 0 for a draw.
+    Answered from the precomputed solved-game table in tictactoe_solver.
+    """
+    return tictactoe_solver.value(board, maximizing)
+
+
+def request_openai_move(
+    board: List[str],
+    model: str,
+    api_key: str,
+    timeout: float,
+    client: Optional["OpenAIClient"] = None,
+    cache: Optional["MoveCache"] = None,
+) -> Optional[int]:
+    if not api_key:
+        print("[AI] OPENAI_API_KEY not set; using fallback minimax.")
+        return None
+
+    import http.client
+    import json
+
+    from tictactoe_llm import OpenAIHTTPError
+
+    if cache is not None:
+        cached = cache.get(board, model, PROMPT_VERSION)
+        if cached is not None and board[cached] == EMPTY:
+            print(f"[AI] Cached move for this position: {cached}")
+            return cached
+
+    prompt = build_prompt(board)
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "You are an unbeatable tic tac toe player playing as O."},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0,
+    }
+    client = client or _open_llm_client(api_key)
+    try:
+        print(f"[AI] Querying OpenAI model '{model}'...")
+        started = time.perf_counter()
+        result = client.chat_completion(payload, timeout=timeout)
+        latency = time.perf_counter() - started
+        text = (
+            result.get("choices", [{}])[0]
+            .get("message", {})
+            .get("content", "")
+        )
+        print("[AI] OpenAI response:")
+        print(text.strip())
+        move = parse_move(text, board)
+        if cache is not None and move is not None:
+            cache.put(board, model, PROMPT_VERSION, move, latency)
+        return move
+    except OpenAIHTTPError as exc:
+        print(f"[AI] OpenAI HTTP error ({exc.code}): {exc.body or exc}")
+        return None
+    except (http.client.HTTPException, TimeoutError, json.JSONDecodeError, OSError) as exc:
+        print(f"[AI] OpenAI request failed, using fallback. Reason: {exc}")
+        return None
+
+
+def build_prompt(board: List[str]) -> str:
+    slots = []
+    for idx, cell in enumerate(board):
+        display = cell if cell else "."
+        slots.append(f"{idx}:{display}")
+    board_state = " ".join(slots)
+    return (
+        "You are playing tic tac toe as O. I am X. "
+        "Board is indexed 0-8 left-to-right, top-to-bottom. "
+        f"Current board: {board_state}. "
+        "Think briefly about the best EMPTY position, explain your reasoning in one or two sentences, "
+        "then output a final line exactly as: MOVE: <index> using digits 0-8."
+    )
+
+
+def build_batch_prompt(boards: List[List[str]]) -> str:
+    """One prompt for several positions; the reply is parsed with parse_moves."""
+    lines = []
+    for number, board in enumerate(boards, start=1):
+        lines.append(f"BOARD {number}: " + " ".join(f"{idx}:{cell or '.'}" for idx, cell in enumerate(board)))
+    return (
+        "You are playing tic tac toe as O against X in each of the positions below. "
+        "Boards are indexed 0-8 left-to-right, top-to-bottom, and it is O's turn in every one.\n"
+        + "\n".join(lines)
+        + "\nFor each board pick the best EMPTY position. Reply with exactly one line per board, "
+        "in order, formatted as: BOARD <number>: MOVE: <index> using digits 0-8."
+    )
+
+
+# Cache entries are tied to the prompt text, so editing build_prompt invalidates them.
+PROMPT_VERSION = hashlib.sha1(build_prompt([EMPTY] * 9).encode("utf-8")).hexdigest()[:12]
+
+
+def parse_move(response_text: str, board: List[str]) -> Optional[int]:
+    move_line = re.search(r"MOVE\s*:\s*([0-8])", response_text, re.IGNORECASE)
+    if move_line:
+        idx = int(move_line.group(1))
+        if board[idx] == EMPTY:
+            return idx
+
+    candidates = re.findall(r"\b([0-8])\b", response_text)
+    for cand in candidates:
+        idx = int(cand)
+        if board[idx] == EMPTY:
+            return idx
+    return None
+
+
+def parse_moves(response_text: str, boards: List[List[str]]) -> List[Optional[int]]:
+    """
+    Moves from an indexed multi-board reply ("BOARD 2: MOVE: 5"), one per board in order.
+    Boards missing from the reply, or answered with an occupied cell, get None.
+    A single board falls back to parse_move's free-text rules.
+    """
+    if len(boards) == 1 and not re.search(r"BOARD\s*#?\s*\d+", response_text, re.IGNORECASE):
+        return [parse_move(response_text, boards[0])]
+    moves: List[Optional[int]] = [None] * len(boards)
+    pattern = r"BOARD\s*#?\s*(\d+)\s*[:.)-]?\s*(?:MOVE\s*[:=]?\s*)?([0-8])\b"
+    for number, cell in re.findall(pattern, response_text, re.IGNORECASE):
+        slot = int(number) - 1
+        if 0 <= slot < len(boards) and moves[slot] is None and boards[slot][int(cell)] == EMPTY:
+            moves[slot] = int(cell)
+    return moves
@@ -0,0 +1,114 @@
+import http.client
+import json
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+# Errors that mean a pooled keep-alive connection went stale between requests.
+_STALE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+class OpenAIHTTPError(Exception):
+    def __init__(self, code: int, body: str) -> None:
+        super().__init__(f"HTTP {code}")
+        self.code = code
+        self.body = body
+
+
+class OpenAIClient:
+    """
+    Minimal JSON-over-HTTP client for the chat completions API that keeps up to
+    ``max_connections`` idle keep-alive connections, so repeated moves skip TCP/TLS setup.
+    ``base_url`` may point at a plain-http stand-in server for local testing.
+    """
+
+    def __init__(self, api_key: str, base_url: str = DEFAULT_BASE_URL, max_connections: int = 4) -> None:
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported base URL: {base_url!r}")
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._prefix = parts.path.rstrip("/")
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def chat_completion(self, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        return self.post_json("/chat/completions", payload, timeout)
+
+    def post_json(self, path: str, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        body = json.dumps(payload).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+            "Connection": "keep-alive",
+        }
+        conn, reused = self._acquire(timeout)
+        try:
+            try:
+                status, data, will_close = self._send(conn, path, body, headers)
+            except _STALE_ERRORS:
+                if not reused:
+                    raise
+                conn.close()
+                conn = self._new_connection(timeout)
+                status, data, will_close = self._send(conn, path, body, headers)
+        except BaseException:
+            conn.close()
+            raise
+
+        if will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        if status >= 400:
+            raise OpenAIHTTPError(status, data.decode("utf-8", errors="ignore"))
+        return json.loads(data.decode("utf-8"))
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _send(
+        self, conn: http.client.HTTPConnection, path: str, body: bytes, headers: Dict[str, str]
+    ) -> Tuple[int, bytes, bool]:
+        conn.request("POST", self._prefix + path, body=body, headers=headers)
+        resp = conn.getresponse()
+        data = resp.read()
+        return resp.status, data, resp.will_close
+
+    def _acquire(self, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            return self._new_connection(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self.max_connections:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _new_connection(self, timeout: float) -> http.client.HTTPConnection:
+        if self._https:
+            return http.client.HTTPSConnection(self._host, self._port, timeout=timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=timeout)
+
+
+@lru_cache(maxsize=None)
+def get_client(api_key: str, base_url: str = DEFAULT_BASE_URL) -> OpenAIClient:
+    """Process-wide shared client per key and endpoint."""
+    return OpenAIClient(api_key, base_url)
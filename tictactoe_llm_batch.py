@@ -0,0 +1,280 @@
+"""
+Batched LLM evaluation over every position the AI (O) can face.
+
+Boards are packed ``--batch-size`` to a prompt (build_batch_prompt / parse_moves),
+sent by a bounded pool of ``--concurrency`` requests in flight, and retried with
+exponential backoff on 429s, 5xx and timeouts; a 429 pauses every request, not
+just the one that hit it. Each answered board is appended to a JSONL checkpoint as
+soon as its batch completes, so an interrupted run resumes where it stopped and
+the file doubles as a (board, move) dataset. Moves are scored against the solver.
+
+    python tictactoe_llm_batch.py --batch-size 16 --concurrency 4 --output runs/llm-moves.jsonl
+
+Point OPENAI_BASE_URL at a local stand-in server (tests/openai_standin.py) to test
+without the real API.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import tictactoe_solver
+from tictactoe_board import CELL_MASKS, MOVES, from_cells, legal_mask, to_cells, winner
+from tictactoe_cache import board_key, canonical_board
+from tictactoe_game import (
+    EMPTY,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_MODEL,
+    OPENAI_TIMEOUT,
+    build_batch_prompt,
+    parse_moves,
+)
+from tictactoe_llm import DEFAULT_BASE_URL, OpenAIClient, OpenAIHTTPError
+from tictactoe_solver import MARKS
+
+# Worth retrying: rate limits, overloaded or failing upstreams.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def ai_positions(canonical: bool = True) -> List[List[str]]:
+    """Non-terminal boards with O to move (X moved first), optionally one per symmetry class."""
+    boards: List[List[str]] = []
+    seen: Set[Tuple[int, int]] = set()
+    keys: Set[str] = set()
+    stack = [(0, 0)]
+    while stack:
+        human, ai = stack.pop()
+        if (human, ai) in seen or winner(human, ai) is not None or not legal_mask(human, ai):
+            continue
+        seen.add((human, ai))
+        x_to_move = bin(human).count("1") == bin(ai).count("1")
+        for idx in MOVES[legal_mask(human, ai)]:
+            stack.append((human | CELL_MASKS[idx], ai) if x_to_move else (human, ai | CELL_MASKS[idx]))
+        if x_to_move:
+            continue
+        board = to_cells(human, ai, empty=EMPTY)
+        key = canonical_board(board)[0] if canonical else board_key(board)
+        if key not in keys:
+            keys.add(key)
+            boards.append(board)
+    return sorted(boards, key=lambda board: (sum(cell != EMPTY for cell in board), board_key(board)))
+
+
+def load_checkpoint(path: str) -> Dict[str, Dict[str, Any]]:
+    """Records already written, by board key; a torn last line from a crash is ignored."""
+    done: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done[record["board"]] = record
+    return done
+
+
+def trim_torn_line(path: str) -> None:
+    """Cut a partial last line left by a crash, so appended records start on a line of their own."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as handle:
+        data = handle.read()
+        if data and not data.endswith(b"\n"):
+            handle.truncate(data.rfind(b"\n") + 1)
+
+
+def classify(board: Sequence[str], move: Optional[int]) -> str:
+    """optimal / suboptimal (gives up a win) / losing (turns a draw or win into a loss) / illegal."""
+    if move is None or board[move] != EMPTY:
+        return "illegal"
+    human, ai = from_cells(board, MARKS)
+    best = tictactoe_solver.lookup_masks(human, ai, True)[0]
+    if move in tictactoe_solver.optimal_moves(human, ai, True):
+        return "optimal"
+    after = tictactoe_solver.lookup_masks(human, ai | CELL_MASKS[move], False)[0]
+    return "losing" if after < 0 <= best else "suboptimal"
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        client: OpenAIClient,
+        model: str,
+        concurrency: int,
+        timeout: float,
+        max_retries: int,
+        checkpoint: str,
+    ) -> None:
+        self.client = client
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.checkpoint = checkpoint
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm-batch")
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # Monotonic time before which no request is sent, pushed forward by every 429.
+        self.resume_at = 0.0
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failed_batches": 0}
+
+    async def run(self, batches: List[List[List[str]]]) -> int:
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint)), exist_ok=True)
+        trim_torn_line(self.checkpoint)
+        with open(self.checkpoint, "a", encoding="utf-8") as handle:
+            tasks = [self._run_batch(number, batch) for number, batch in enumerate(batches)]
+            written = 0
+            for task in asyncio.as_completed(tasks):
+                records = await task
+                # Only the event loop writes, so lines never interleave.
+                for record in records:
+                    handle.write(json.dumps(record) + "\n")
+                handle.flush()
+                written += len(records)
+                if records:
+                    print(
+                        f"[batch] {written} boards answered "
+                        f"({self.stats['requests']} requests, {self.stats['retries']} retries)"
+                    )
+        self.executor.shutdown(wait=False)
+        return written
+
+    async def _run_batch(self, number: int, boards: List[List[str]]) -> List[Dict[str, Any]]:
+        async with self.semaphore:
+            payload = {
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": "You are an unbeatable tic tac toe player playing as O."},
+                    {"role": "user", "content": build_batch_prompt(boards)},
+                ],
+                "temperature": 0,
+            }
+            loop = asyncio.get_running_loop()
+            for attempt in range(self.max_retries + 1):
+                pause = self.resume_at - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                self.stats["requests"] += 1
+                started = time.perf_counter()
+                try:
+                    result = await loop.run_in_executor(
+                        self.executor, self.client.chat_completion, payload, self.timeout
+                    )
+                except OpenAIHTTPError as exc:
+                    if exc.code not in RETRY_STATUSES:
+                        print(f"[batch] Batch {number} failed with HTTP {exc.code}: {exc.body[:200]}")
+                        break
+                    reason = f"HTTP {exc.code}"
+                    if exc.code == 429:
+                        self.stats["rate_limited"] += 1
+                except (http.client.HTTPException, TimeoutError, json.JSONDecodeError, OSError) as exc:
+                    reason = str(exc) or type(exc).__name__
+                else:
+                    latency = time.perf_counter() - started
+                    text = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+                    moves = parse_moves(text, boards)
+                    return [
+                        {
+                            "board": board_key(board),
+                            "move": move,
+                            "verdict": classify(board, move),
+                            "batch_size": len(boards),
+                            "latency": round(latency, 4),
+                            "model": self.model,
+                        }
+                        for board, move in zip(boards, moves)
+                    ]
+                if attempt == self.max_retries:
+                    break
+                # Full jitter, so requests that were throttled together do not retry together.
+                delay = random.uniform(0, min(30.0, 2.0**attempt))
+                if reason == "HTTP 429":
+                    self.resume_at = max(self.resume_at, time.monotonic() + delay)
+                self.stats["retries"] += 1
+                print(f"[batch] Batch {number}: {reason}; retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            self.stats["failed_batches"] += 1
+            return []
+
+
+def summarize(records: Sequence[Dict[str, Any]]) -> Dict[str, float]:
+    counts = {verdict: 0 for verdict in ("optimal", "suboptimal", "losing", "illegal")}
+    for record in records:
+        counts[record["verdict"]] += 1
+    total = max(len(records), 1)
+    return {"boards": len(records), **counts, "optimal_rate": counts["optimal"] / total}
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Score the LLM on every AI-to-move position with batched requests.")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=os.path.join("runs", "llm-moves.jsonl"),
+        help="JSONL checkpoint, one answered board per line; rerunning resumes from it.",
+    )
+    parser.add_argument("--batch-size", type=int, default=16, help="Boards per request.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once.")
+    parser.add_argument("--max-retries", type=int, default=6, help="Retries per batch on 429s, 5xx and timeouts.")
+    parser.add_argument("--timeout", type=float, default=OPENAI_TIMEOUT, help="Seconds per request.")
+    parser.add_argument("--model", type=str, default=OPENAI_MODEL, help="Chat completions model.")
+    parser.add_argument("--limit", type=int, default=0, help="Only the first N positions (0 = all).")
+    parser.add_argument(
+        "--all-orientations",
+        action="store_true",
+        help="Ask about every position instead of one per rotation/reflection class.",
+    )
+    parser.add_argument("--fresh", action="store_true", help="Discard an existing checkpoint instead of resuming it.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if not OPENAI_API_KEY:
+        raise SystemExit("OPENAI_API_KEY is not set.")
+    if args.fresh and os.path.exists(args.output):
+        os.remove(args.output)
+
+    boards = ai_positions(canonical=not args.all_orientations)
+    if args.limit:
+        boards = boards[: args.limit]
+    done = load_checkpoint(args.output)
+    todo = [board for board in boards if board_key(board) not in done]
+    print(f"[batch] {len(boards)} positions, {len(boards) - len(todo)} already in {args.output}, {len(todo)} to ask.")
+
+    if todo:
+        batches = [todo[start : start + args.batch_size] for start in range(0, len(todo), args.batch_size)]
+        client = OpenAIClient(OPENAI_API_KEY, OPENAI_BASE_URL or DEFAULT_BASE_URL, max_connections=args.concurrency)
+        runner = BatchRunner(client, args.model, args.concurrency, args.timeout, args.max_retries, args.output)
+        started = time.perf_counter()
+        try:
+            asyncio.run(runner.run(batches))
+        finally:
+            client.close()
+        elapsed = time.perf_counter() - started
+        print(
+            f"[batch] {len(batches)} batches in {elapsed:.1f}s: {runner.stats['requests']} requests, "
+            f"{runner.stats['retries']} retries ({runner.stats['rate_limited']} rate limited), "
+            f"{runner.stats['failed_batches']} batches failed."
+        )
+
+    wanted = {board_key(board) for board in boards}
+    records = [record for key, record in load_checkpoint(args.output).items() if key in wanted]
+    summary = summarize(records)
+    print(
+        f"[batch] {summary['boards']} of {len(boards)} positions scored: {summary['optimal']} optimal "
+        f"({summary['optimal_rate']:.1%}), {summary['suboptimal']} suboptimal, "
+        f"{summary['losing']} losing, {summary['illegal']} illegal or unparsed."
+    )
+    return 0 if summary["boards"] == len(boards) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
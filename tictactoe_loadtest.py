@@ -0,0 +1,192 @@
+"""
+Load test for tictactoe_server.py: many concurrent sessions playing random games.
+
+Each session opens a game, plays random legal moves until it ends and starts the
+next one, for ``--duration`` seconds. Sessions share ``--connections`` TCP
+connections, with replies matched to requests by id. The report gives moves/s
+and the p50/p90/p99 round-trip latency of move requests, plus the server's own
+counters.
+
+    python tictactoe_server.py &
+    python tictactoe_loadtest.py --sessions 10000 --connections 100 --duration 30
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_PORT = 8765
+
+
+class Connection:
+    """One TCP connection carrying requests from many sessions at once."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.pending: Dict[int, "asyncio.Future[Dict[str, Any]]"] = {}
+        self.ids = itertools.count()
+        # Requests made in the same loop iteration go out in one write, as the server does with replies.
+        self.outgoing: List[bytes] = []
+        self.reader_task = asyncio.get_running_loop().create_task(self._read())
+
+    @classmethod
+    async def open(cls, host: str, port: int) -> "Connection":
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 16)
+        return cls(reader, writer)
+
+    async def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        line = json.dumps({"id": request_id, **payload}, separators=(",", ":")).encode() + b"\n"
+        if not self.outgoing:
+            asyncio.get_running_loop().call_soon(self._flush)
+        self.outgoing.append(line)
+        await self.writer.drain()
+        return await future
+
+    def _flush(self) -> None:
+        if not self.writer.is_closing():
+            self.writer.write(b"".join(self.outgoing))
+        self.outgoing.clear()
+
+    async def _read(self) -> None:
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                future = self.pending.pop(reply.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        except ConnectionError:
+            pass
+        error = ConnectionError("The server closed the connection.")
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def close(self) -> None:
+        self.writer.close()
+        self.reader_task.cancel()
+
+
+async def play_session(
+    conn: Connection,
+    rng: random.Random,
+    deadline: float,
+    args: argparse.Namespace,
+    latencies: List[float],
+    counts: Counter,
+) -> None:
+    new_game = {"op": "new", "ai": args.ai, "size": args.size}
+    if args.k:
+        new_game["k"] = args.k
+    while time.monotonic() < deadline:
+        reply = await conn.request(new_game)
+        if not reply["ok"]:
+            counts["errors"] += 1
+            await asyncio.sleep(0.1)
+            continue
+        game, board, over = reply["game"], reply["board"], False
+        while not over and time.monotonic() < deadline:
+            if args.think:
+                await asyncio.sleep(rng.uniform(0, 2 * args.think))
+            cell = rng.choice([idx for idx, mark in enumerate(board) if mark == "."])
+            started = time.perf_counter()
+            reply = await conn.request({"op": "move", "game": game, "cell": cell})
+            latencies.append(time.perf_counter() - started)
+            if not reply["ok"]:
+                counts["errors"] += 1
+                break
+            board, over = reply["board"], reply["over"]
+            counts[f"source_{reply['source'] or 'none'}"] += 1
+        if over:
+            counts["games"] += 1
+            counts[f"winner_{reply['winner'] or 'draw'}"] += 1
+        await conn.request({"op": "close", "game": game})
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    connections = [await Connection.open(args.host, args.port) for _ in range(args.connections)]
+    latencies: List[float] = []
+    counts: Counter = Counter()
+    started = time.monotonic()
+    deadline = started + args.duration
+    sessions = [
+        play_session(connections[idx % len(connections)], random.Random(args.seed + idx), deadline, args, latencies, counts)
+        for idx in range(args.sessions)
+    ]
+    await asyncio.gather(*sessions)
+    elapsed = time.monotonic() - started
+    server = await connections[0].request({"op": "stats"})
+    for conn in connections:
+        await conn.close()
+
+    latency_ms = np.array(latencies) * 1000.0 if latencies else np.zeros(1)
+    p50, p90, p99 = np.percentile(latency_ms, [50, 90, 99])
+    return {
+        "sessions": args.sessions,
+        "connections": args.connections,
+        "seconds": round(elapsed, 2),
+        "moves": len(latencies),
+        "moves_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(p50), 3),
+        "p90_ms": round(float(p90), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(latency_ms.max()), 3),
+        **dict(sorted(counts.items())),
+        "server": server,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load-test tictactoe_server.py with many concurrent random players.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Server address.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Server port.")
+    parser.add_argument("--sessions", type=int, default=10_000, help="Concurrent games being played.")
+    parser.add_argument("--connections", type=int, default=100, help="TCP connections the sessions share.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to play for.")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean seconds a player waits before each move.")
+    parser.add_argument("--ai", type=str, default="solver", help="AI the games are played against (solver or llm).")
+    parser.add_argument("--size", type=int, default=3, help="Board side length.")
+    parser.add_argument("--k", type=int, default=0, help="Marks in a row to win (default: the server's).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the players' moves.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    try:
+        report = asyncio.run(run(args))
+    except OSError as exc:
+        raise SystemExit(f"Cannot reach the server at {args.host}:{args.port}: {exc}") from None
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0 if not report.get("errors") else 1
+    print(
+        f"[load] {report['sessions']} sessions over {report['connections']} connections for {report['seconds']}s: "
+        f"{report['moves']} moves ({report['moves_per_s']:,.0f}/s), {report.get('games', 0)} games finished"
+    )
+    print(
+        f"[load] Move latency p50 {report['p50_ms']:.2f}ms, p90 {report['p90_ms']:.2f}ms, "
+        f"p99 {report['p99_ms']:.2f}ms, max {report['max_ms']:.2f}ms; {report.get('errors', 0)} errors"
+    )
+    sources = {key[len("source_") :]: value for key, value in report.items() if key.startswith("source_")}
+    print(f"[load] AI moves by source: {sources}")
+    print(f"[load] Server: {json.dumps(report['server'])}")
+    return 0 if not report.get("errors") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
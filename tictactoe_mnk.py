@@ -0,0 +1,377 @@
+"""
+Engine for m,n,k games: ``rows`` x ``cols`` boards won by ``k`` marks in a row.
+
+Positions are two bitmasks as in tictactoe_board (bit ``row * cols + col`` set when
+the player owns that cell), with the win lines generated for the board size.
+Search is negamax with alpha-beta pruning and move ordering (immediate wins and
+forced blocks, the transposition-table move, the history heuristic, then distance
+from the centre), a Zobrist-hashed transposition table of fixed size, and iterative
+deepening that returns the deepest completed result when the time limit runs out.
+
+Classic 3x3 tic-tac-toe keeps using the exact solved-game table in tictactoe_solver.
+"""
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+# Scores of decided positions; wins found closer to the root score higher.
+WIN_SCORE = 1_000_000
+# Anything beyond this is a forced win or loss rather than a heuristic estimate.
+DECIDED = WIN_SCORE - 10_000
+
+# Transposition-table bound types.
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class Geometry:
+    """Cells, win lines and centre-first move order of one board shape."""
+
+    def __init__(self, rows: int, cols: int, k: int) -> None:
+        if rows < 1 or cols < 1 or not 1 < k <= max(rows, cols):
+            raise ValueError(f"Need k between 2 and the longest side, got {rows}x{cols} with k={k}.")
+        self.rows = rows
+        self.cols = cols
+        self.k = k
+        self.cells = rows * cols
+        self.full_mask = (1 << self.cells) - 1
+        self.cell_masks = tuple(1 << idx for idx in range(self.cells))
+        self.win_masks = tuple(self._lines())
+        # Lines through each cell: only these can be completed by a move there.
+        self.lines_through = tuple(
+            tuple(line for line in self.win_masks if line >> idx & 1) for idx in range(self.cells)
+        )
+        centre_row, centre_col = (rows - 1) / 2, (cols - 1) / 2
+        # Manhattan distance of each cell from the board's centre point.
+        self.centre_distance = tuple(
+            abs(idx // cols - centre_row) + abs(idx % cols - centre_col) for idx in range(self.cells)
+        )
+        self.centre_order = tuple(sorted(range(self.cells), key=lambda idx: (self.centre_distance[idx], idx)))
+
+    def _lines(self) -> List[int]:
+        lines = []
+        for row in range(self.rows):
+            for col in range(self.cols):
+                for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_row, end_col = row + d_row * (self.k - 1), col + d_col * (self.k - 1)
+                    if 0 <= end_row < self.rows and 0 <= end_col < self.cols:
+                        lines.append(
+                            sum(1 << (row + d_row * i) * self.cols + col + d_col * i for i in range(self.k))
+                        )
+        return lines
+
+    def has_win(self, mask: int) -> bool:
+        return any(mask & line == line for line in self.win_masks)
+
+    def wins_at(self, mask: int, idx: int) -> bool:
+        """True when ``mask`` (already holding ``idx``) completes a line through ``idx``."""
+        return any(mask & line == line for line in self.lines_through[idx])
+
+    def winner(self, first: int, second: int) -> Optional[int]:
+        """Player index (0 or 1) owning a full line, or None. Player 0 is checked first."""
+        if self.has_win(first):
+            return 0
+        if self.has_win(second):
+            return 1
+        return None
+
+    def legal_moves(self, first: int, second: int) -> Tuple[int, ...]:
+        empty = self.full_mask & ~(first | second)
+        return tuple(idx for idx in range(self.cells) if empty >> idx & 1)
+
+    def is_full(self, first: int, second: int) -> bool:
+        return first | second == self.full_mask
+
+    def from_cells(self, board: Sequence[Any], marks: Sequence[Any] = ("X", "O")) -> Tuple[int, int]:
+        first = second = 0
+        for idx, cell in enumerate(board):
+            if cell == marks[0]:
+                first |= 1 << idx
+            elif cell == marks[1]:
+                second |= 1 << idx
+        return first, second
+
+    def __repr__(self) -> str:
+        return f"Geometry({self.rows}, {self.cols}, k={self.k})"
+
+
+@lru_cache(maxsize=None)
+def geometry(rows: int, cols: int, k: int) -> Geometry:
+    return Geometry(rows, cols, k)
+
+
+def square(size: int, k: int) -> Geometry:
+    return geometry(size, size, k)
+
+
+def is_classic(size: int, k: int) -> bool:
+    """3x3, three in a row: the shape the bitboard tables and solver table are built for."""
+    return size == 3 and k == 3
+
+
+class TranspositionTable:
+    """
+    Fixed-size table of two-slot buckets indexed by the low bits of the Zobrist key.
+    The first slot keeps the deepest entry of the current search (older searches'
+    entries are always replaceable); the second is overwritten by anything that does
+    not displace the first, so memory stays bounded however long the search runs.
+    """
+
+    def __init__(self, max_entries: int = 1 << 17) -> None:
+        buckets = 1
+        while buckets * 2 < max_entries:
+            buckets *= 2
+        self.mask = buckets - 1
+        self.slots: List[Optional[Tuple[int, int, int, int, int, int]]] = [None] * (2 * buckets)
+        self.generation = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self) -> None:
+        self.generation += 1
+
+    def probe(self, key: int) -> Optional[Tuple[int, int, int, int, int, int]]:
+        """(key, depth, flag, value, move, generation) for ``key``, or None."""
+        idx = (key & self.mask) << 1
+        for entry in (self.slots[idx], self.slots[idx + 1]):
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry
+        return None
+
+    def store(self, key: int, depth: int, flag: int, value: int, move: int) -> None:
+        idx = (key & self.mask) << 1
+        entry = (key, depth, flag, value, move, self.generation)
+        current = self.slots[idx]
+        if current is None or current[0] == key or current[5] != self.generation or depth >= current[1]:
+            self.slots[idx] = entry
+        else:
+            self.slots[idx + 1] = entry
+        self.stores += 1
+
+    def clear(self) -> None:
+        self.slots = [None] * len(self.slots)
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self.slots)
+
+
+class SearchResult(NamedTuple):
+    move: Optional[int]
+    # From the side to move's point of view: > DECIDED a forced win, < -DECIDED a forced loss.
+    value: int
+    depth: int
+    nodes: int
+    seconds: float
+    # Solved to the end of the game, not cut off by depth or time.
+    exact: bool
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def _popcount(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+class Engine:
+    """Alpha-beta searcher for one geometry; keeps its table and history between moves."""
+
+    def __init__(self, geo: Geometry, tt_entries: int = 1 << 17, seed: int = 0x5EED) -> None:
+        self.geo = geo
+        self.tt = TranspositionTable(tt_entries)
+        rng = random.Random(seed)
+        self.zobrist = tuple(tuple(rng.getrandbits(64) for _ in range(geo.cells)) for _ in range(2))
+        self.side_key = rng.getrandbits(64)
+        self.history = [0] * geo.cells
+        # Open-line weights: a line holding n of one player's marks and none of the other's.
+        self.weights = tuple(0 if n == 0 else 4 ** n for n in range(geo.k + 1))
+        self._lock = threading.Lock()
+        self._deadline = 0.0
+        self._nodes = 0
+
+    def key(self, first: int, second: int, turn: int) -> int:
+        key = self.side_key if turn else 0
+        for player, mask in ((0, first), (1, second)):
+            for idx in range(self.geo.cells):
+                if mask >> idx & 1:
+                    key ^= self.zobrist[player][idx]
+        return key
+
+    def evaluate(self, me: int, opp: int) -> int:
+        """Static score for the side to move: open lines weighted by how full they are."""
+        score = 0
+        weights = self.weights
+        for line in self.geo.win_masks:
+            mine = me & line
+            theirs = opp & line
+            if mine and not theirs:
+                score += weights[_popcount(mine)]
+            elif theirs and not mine:
+                score -= weights[_popcount(theirs)]
+        return score
+
+    def search(
+        self,
+        first: int,
+        second: int,
+        turn: int,
+        time_limit: float = 1.0,
+        max_depth: Optional[int] = None,
+    ) -> SearchResult:
+        """Best move for player ``turn`` (0 owns ``first``) by iterative deepening within ``time_limit`` seconds."""
+        with self._lock:
+            return self._search(first, second, turn, time_limit, max_depth)
+
+    def best_move(
+        self, board: Sequence[Any], mark: Any, marks: Sequence[Any] = ("X", "O"), time_limit: float = 1.0
+    ) -> Optional[int]:
+        first, second = self.geo.from_cells(board, marks)
+        return self.search(first, second, marks.index(mark), time_limit).move
+
+    def _search(
+        self, first: int, second: int, turn: int, time_limit: float, max_depth: Optional[int]
+    ) -> SearchResult:
+        started = time.perf_counter()
+        self._deadline = started + time_limit
+        self._nodes = 0
+        self.tt.new_search()
+        self.history = [value // 8 for value in self.history]
+        geo = self.geo
+        me, opp = (first, second) if turn == 0 else (second, first)
+        empties = _popcount(geo.full_mask & ~(me | opp))
+        if empties == 0 or geo.has_win(me) or geo.has_win(opp):
+            return SearchResult(None, 0, 0, 0, 0.0, True)
+        limit = empties if max_depth is None else min(max_depth, empties)
+        key = self.key(first, second, turn)
+
+        best: Optional[Tuple[int, int]] = None
+        depth_done = 0
+        for depth in range(1, limit + 1):
+            try:
+                result = self._root(me, opp, turn, key, depth, best[0] if best else None)
+            except _OutOfTime:
+                break
+            best = result
+            depth_done = depth
+            if abs(result[1]) > DECIDED:
+                break
+        if best is None:
+            # Not even depth 1 finished: take the first move in the usual ordering.
+            move = self._ordered_moves(me, opp, None)[0]
+            best = (move, 0)
+        exact = depth_done == empties or abs(best[1]) > DECIDED
+        return SearchResult(best[0], best[1], depth_done, self._nodes, time.perf_counter() - started, exact)
+
+    def _root(self, me: int, opp: int, turn: int, key: int, depth: int, first: Optional[int]) -> Tuple[int, int]:
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        best_move, best_value = -1, -WIN_SCORE - 1
+        moves = self._ordered_moves(me, opp, first)
+        for move in moves:
+            bit = 1 << move
+            if self.geo.wins_at(me | bit, move):
+                value = WIN_SCORE - 1
+            else:
+                child = key ^ self.zobrist[turn][move] ^ self.side_key
+                value = -self._negamax(opp, me | bit, 1 - turn, child, depth - 1, -beta, -alpha, 1)
+            if value > best_value:
+                best_move, best_value = move, value
+            alpha = max(alpha, value)
+        return best_move, best_value
+
+    def _ordered_moves(self, me: int, opp: int, tt_move: Optional[int]) -> List[int]:
+        geo = self.geo
+        empty = geo.full_mask & ~(me | opp)
+        history = self.history
+        moves = [idx for idx in geo.centre_order if empty >> idx & 1]
+        # Stable sort keeps centre-first order among equal history scores.
+        moves.sort(key=lambda idx: -history[idx])
+        if tt_move is not None and empty >> tt_move & 1:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        return moves
+
+    def _negamax(self, me: int, opp: int, turn: int, key: int, depth: int, alpha: int, beta: int, ply: int) -> int:
+        """Value for the side to move (owning ``me``); the opponent's last move did not win."""
+        self._nodes += 1
+        if not self._nodes & 1023 and time.perf_counter() > self._deadline:
+            raise _OutOfTime
+        geo = self.geo
+        empty = geo.full_mask & ~(me | opp)
+        if not empty:
+            return 0
+
+        # Immediate win, or the opponent's threats to block.
+        threats = []
+        for idx in geo.centre_order:
+            if empty >> idx & 1:
+                bit = 1 << idx
+                if geo.wins_at(me | bit, idx):
+                    return WIN_SCORE - ply
+                if geo.wins_at(opp | bit, idx):
+                    threats.append(idx)
+        if len(threats) > 1:
+            # Two open threats cannot both be blocked.
+            return -(WIN_SCORE - ply - 1)
+
+        original_alpha = alpha
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                value = _from_tt(entry[3], ply)
+                if entry[2] == EXACT:
+                    return value
+                if entry[2] == LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        if depth <= 0:
+            return self.evaluate(me, opp)
+
+        moves = threats if threats else self._ordered_moves(me, opp, tt_move)
+        best_value, best_move = -WIN_SCORE - 1, moves[0]
+        for move in moves:
+            child = key ^ self.zobrist[turn][move] ^ self.side_key
+            value = -self._negamax(opp, me | 1 << move, 1 - turn, child, depth - 1, -beta, -alpha, ply + 1)
+            if value > best_value:
+                best_value, best_move = value, move
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                self.history[move] += depth * depth
+                break
+
+        flag = UPPER if best_value <= original_alpha else LOWER if best_value >= beta else EXACT
+        self.tt.store(key, depth, flag, _to_tt(best_value, ply), best_move)
+        return best_value
+
+
+def _to_tt(value: int, ply: int) -> int:
+    # Decided scores are stored relative to the node so they stay valid at any ply.
+    if value > DECIDED:
+        return value + ply
+    if value < -DECIDED:
+        return value - ply
+    return value
+
+
+def _from_tt(value: int, ply: int) -> int:
+    if value > DECIDED:
+        return value - ply
+    if value < -DECIDED:
+        return value + ply
+    return value
+
+
+@lru_cache(maxsize=None)
+def engine(size: int, k: int) -> Engine:
+    """Shared engine per board shape, so its table carries over between moves."""
+    return Engine(square(size, k))
@@ -0,0 +1,156 @@
+"""
+Scripted opponents for the training env, working on bitboard masks.
+
+Each policy takes (agent mask, opponent mask, generator) and returns the cell the
+opponent plays, or None on a full board. The opponent is player 1 / the solver's AI.
+"""
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import tictactoe_mnk
+import tictactoe_solver
+from tictactoe_board import CELL_MASKS, FULL_MASK, IS_WIN, MOVES, legal_mask
+
+CORNER_MASK = CELL_MASKS[0] | CELL_MASKS[2] | CELL_MASKS[6] | CELL_MASKS[8]
+NO_MOVE = -1
+
+OpponentPolicy = Callable[[int, int, np.random.Generator], Optional[int]]
+
+
+def _forced_move(agent: int, opponent: int) -> int:
+    """The heuristic's deterministic choice: win, else block, else center; NO_MOVE if none applies."""
+    empties = MOVES[legal_mask(agent, opponent)]
+    for candidate in empties:
+        if IS_WIN[opponent | CELL_MASKS[candidate]]:
+            return candidate
+    for candidate in empties:
+        if IS_WIN[agent | CELL_MASKS[candidate]]:
+            return candidate
+    if 4 in empties:
+        return 4
+    return NO_MOVE
+
+
+def _positions():
+    """Every (agent, opponent) mask pair with disjoint cells: all 3^9 board encodings."""
+    for agent in range(FULL_MASK + 1):
+        rest = FULL_MASK & ~agent
+        opponent = rest
+        while True:
+            yield agent, opponent
+            if opponent == 0:
+                break
+            opponent = (opponent - 1) & rest
+
+
+@lru_cache(maxsize=None)
+def forced_table() -> np.ndarray:
+    """_forced_move for every board, indexed by position_hash(agent, opponent)."""
+    table = np.full(1 << 18, NO_MOVE, dtype=np.int8)
+    for agent, opponent in _positions():
+        table[agent | opponent << 9] = _forced_move(agent, opponent)
+    return table
+
+
+@lru_cache(maxsize=None)
+def perfect_table() -> np.ndarray:
+    """Solver best move with the opponent to move, indexed by position_hash(agent, opponent)."""
+    table = np.full(1 << 18, NO_MOVE, dtype=np.int8)
+    for agent, opponent in _positions():
+        move = tictactoe_solver.lookup_masks(agent, opponent, True)[1]
+        if move is not None:
+            table[agent | opponent << 9] = move
+    return table
+
+
+def random_fallback(empty: int, rng: np.random.Generator) -> int:
+    """Random corner if any is free, else random empty cell."""
+    corners = MOVES[empty & CORNER_MASK]
+    if corners:
+        return int(rng.choice(list(corners)))
+    return int(rng.choice(list(MOVES[empty])))
+
+
+def random_opponent(agent: int, opponent: int, rng: np.random.Generator) -> Optional[int]:
+    empties = MOVES[legal_mask(agent, opponent)]
+    if not empties:
+        return None
+    return int(rng.choice(list(empties)))
+
+
+def heuristic_opponent(agent: int, opponent: int, rng: np.random.Generator) -> Optional[int]:
+    empty = legal_mask(agent, opponent)
+    if not empty:
+        return None
+    move = int(forced_table()[agent | opponent << 9])
+    if move != NO_MOVE:
+        return move
+    return random_fallback(empty, rng)
+
+
+def perfect_opponent(agent: int, opponent: int, rng: np.random.Generator) -> Optional[int]:
+    if not legal_mask(agent, opponent):
+        return None
+    return tictactoe_solver.lookup_masks(agent, opponent, True)[1]
+
+
+OPPONENTS: Dict[str, OpponentPolicy] = {
+    "random": random_opponent,
+    "heuristic": heuristic_opponent,
+    "perfect": perfect_opponent,
+}
+
+
+def get_opponent(name: str) -> OpponentPolicy:
+    try:
+        return OPPONENTS[name]
+    except KeyError:
+        raise ValueError(f"Unknown opponent '{name}'. Choose from: {', '.join(OPPONENTS)}.") from None
+
+
+def opponent_names() -> List[str]:
+    return list(OPPONENTS)
+
+
+# Search time per move of the "perfect" opponent on boards other than 3x3.
+MNK_SEARCH_SECONDS = 0.05
+
+
+@lru_cache(maxsize=None)
+def get_mnk_opponent(name: str, size: int, k: int) -> OpponentPolicy:
+    """The same opponents for a size x size board with k in a row, built on tictactoe_mnk."""
+    if name not in OPPONENTS:
+        raise ValueError(f"Unknown opponent '{name}'. Choose from: {', '.join(OPPONENTS)}.")
+    geo = tictactoe_mnk.square(size, k)
+
+    def empties(agent: int, opponent: int) -> List[int]:
+        empty = geo.full_mask & ~(agent | opponent)
+        return [idx for idx in geo.centre_order if empty >> idx & 1]
+
+    def random_policy(agent: int, opponent: int, rng: np.random.Generator) -> Optional[int]:
+        moves = empties(agent, opponent)
+        return int(rng.choice(moves)) if moves else None
+
+    def heuristic_policy(agent: int, opponent: int, rng: np.random.Generator) -> Optional[int]:
+        # Win, else block, else the most central free cell (ties broken at random).
+        moves = empties(agent, opponent)
+        if not moves:
+            return None
+        for candidate in moves:
+            if geo.wins_at(opponent | 1 << candidate, candidate):
+                return candidate
+        for candidate in moves:
+            if geo.wins_at(agent | 1 << candidate, candidate):
+                return candidate
+        # moves is in centre order, so the most central cells lead the list.
+        nearest = geo.centre_distance[moves[0]]
+        return int(rng.choice([idx for idx in moves if geo.centre_distance[idx] == nearest]))
+
+    def perfect_policy(agent: int, opponent: int, rng: np.random.Generator) -> Optional[int]:
+        if not empties(agent, opponent):
+            return None
+        return tictactoe_mnk.engine(size, k).search(agent, opponent, 1, time_limit=MNK_SEARCH_SECONDS).move
+
+    return {"random": random_policy, "heuristic": heuristic_policy, "perfect": perfect_policy}[name]
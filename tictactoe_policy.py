@@ -0,0 +1,265 @@
+"""
+Lightweight inference for trained PPO policies.
+
+``python tictactoe_policy.py models/<run>.zip`` exports the actor of a saved
+model to ``models/<run>.npz`` (pure NumPy weights) or, with ``--format onnx``,
+to ``models/<run>.onnx``, then checks the export against the original policy on
+every position the agent can face. Loading an export needs only NumPy (or
+onnxruntime for .onnx), not torch or stable-baselines3.
+
+An export records whether its source was a MaskablePPO model (trained with
+``--action-masking``). Such policies only pick empty cells, as in training;
+the others act on the raw argmax, like the SB3 model they came from.
+
+Observations use the env encoding: 0 empty, 1 the side to move, 2 the other side.
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ACTIVATIONS = {
+    "Tanh": np.tanh,
+    "ReLU": lambda x: np.maximum(x, 0.0),
+}
+
+
+def board_obs(board: Sequence[str], mark: str, empty: str = "") -> np.ndarray:
+    """(9,) observation of a cell board from ``mark``'s point of view."""
+    return np.array([0 if cell == empty else 1 if cell == mark else 2 for cell in board], dtype=np.int8)
+
+
+def _masked_argmax(logits: np.ndarray, obs: np.ndarray, masked: bool) -> np.ndarray:
+    if masked:
+        logits = np.where(obs == 0, logits, -np.inf)
+    return logits.argmax(axis=1)
+
+
+class NumpyPolicy:
+    """The policy MLP as (weight, bias) pairs; one matrix product per layer for the whole batch."""
+
+    def __init__(
+        self, layers: List[Tuple[np.ndarray, np.ndarray]], activations: List[str], masked: bool = True
+    ) -> None:
+        if len(activations) != len(layers) - 1:
+            raise ValueError("Expected one activation between each pair of layers.")
+        self.layers = [(w.astype(np.float32), b.astype(np.float32)) for w, b in layers]
+        self.activations = activations
+        self.masked = masked
+        self._funcs = [ACTIVATIONS[name] for name in activations]
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyPolicy":
+        with np.load(path, allow_pickle=False) as data:
+            count = int(data["num_layers"])
+            layers = [(data[f"w{idx}"], data[f"b{idx}"]) for idx in range(count)]
+            activations = [str(name) for name in data["activations"]]
+            # Exports written before the flag was recorded were always used masked.
+            masked = bool(data["masked"]) if "masked" in data.files else True
+        return cls(layers, activations, masked)
+
+    def save(self, path: str) -> None:
+        arrays = {
+            "num_layers": np.array(len(self.layers)),
+            "activations": np.array(self.activations),
+            "masked": np.array(self.masked),
+        }
+        for idx, (w, b) in enumerate(self.layers):
+            arrays[f"w{idx}"] = w
+            arrays[f"b{idx}"] = b
+        np.savez(path, **arrays)
+
+    def logits(self, obs: np.ndarray) -> np.ndarray:
+        """(N, 9) action logits for (N, 9) observations."""
+        x = np.asarray(obs, dtype=np.float32).reshape(-1, 9)
+        for idx, (w, b) in enumerate(self.layers):
+            x = x @ w.T + b
+            if idx < len(self._funcs):
+                x = self._funcs[idx](x)
+        return x
+
+    def act(self, obs: np.ndarray, masked: Optional[bool] = None) -> np.ndarray:
+        """Greedy action per row; ``masked`` (default: as the source model) restricts it to empty cells."""
+        obs = np.asarray(obs).reshape(-1, 9)
+        return _masked_argmax(self.logits(obs), obs, self.masked if masked is None else masked)
+
+    def move(self, board: Sequence[str], mark: str) -> Optional[int]:
+        obs = board_obs(board, mark)
+        if not (obs == 0).any():
+            return None
+        return int(self.act(obs[None, :])[0])
+
+
+class OnnxPolicy(NumpyPolicy):
+    """Same interface, backed by an onnxruntime session."""
+
+    def __init__(self, path: str) -> None:
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.masked = self.session.get_modelmeta().custom_metadata_map.get("masked", "true") == "true"
+
+    def logits(self, obs: np.ndarray) -> np.ndarray:
+        x = np.asarray(obs, dtype=np.float32).reshape(-1, 9)
+        return self.session.run(None, {self.input_name: x})[0]
+
+
+def load_policy(path: str) -> NumpyPolicy:
+    """Load an exported policy; the backend is picked from the file extension."""
+    if path.endswith(".onnx"):
+        return OnnxPolicy(path)
+    return NumpyPolicy.load(path)
+
+
+MASKABLE_MODULE = "sb3_contrib.common.maskable"
+
+
+def is_maskable(path: str) -> bool:
+    """Whether a saved SB3 zip holds a MaskablePPO policy (trained with --action-masking)."""
+    import json
+    import zipfile
+
+    with zipfile.ZipFile(path) as archive:
+        data = json.loads(archive.read("data"))
+    return str(data.get("policy_class", {}).get("__module__", "")).startswith(MASKABLE_MODULE)
+
+
+def is_maskable_model(model: Any) -> bool:
+    """Whether a loaded SB3 model is a MaskablePPO."""
+    return type(model.policy).__module__.startswith(MASKABLE_MODULE)
+
+
+def load_model(path: str, masked: bool = False) -> Any:
+    if masked:
+        from sb3_contrib import MaskablePPO as algo
+    else:
+        from stable_baselines3 import PPO as algo
+    return algo.load(path, device="cpu")
+
+
+def extract_policy(model: Any) -> NumpyPolicy:
+    """NumpyPolicy with the weights of an SB3 MlpPolicy's actor (policy_net + action_net)."""
+    import torch
+
+    layers: List[Tuple[np.ndarray, np.ndarray]] = []
+    activations: List[str] = []
+    modules = list(model.policy.mlp_extractor.policy_net) + [model.policy.action_net]
+    for module in modules:
+        if isinstance(module, torch.nn.Linear):
+            layers.append((module.weight.detach().cpu().numpy(), module.bias.detach().cpu().numpy()))
+        elif type(module).__name__ in ACTIVATIONS:
+            activations.append(type(module).__name__)
+        else:
+            raise ValueError(f"Cannot export layer {module!r}; supported: Linear, {', '.join(ACTIVATIONS)}.")
+    return NumpyPolicy(layers, activations, is_maskable_model(model))
+
+
+def export_onnx(model: Any, path: str) -> None:
+    import onnx
+    import torch
+
+    actor = torch.nn.Sequential(model.policy.mlp_extractor.policy_net, model.policy.action_net).cpu().eval()
+    torch.onnx.export(
+        actor,
+        (torch.zeros(1, 9),),
+        path,
+        input_names=["obs"],
+        output_names=["logits"],
+        dynamic_axes={"obs": {0: "batch"}, "logits": {0: "batch"}},
+        dynamo=False,
+    )
+    exported = onnx.load(path)
+    onnx.helper.set_model_props(exported, {"masked": "true" if is_maskable_model(model) else "false"})
+    onnx.save(exported, path)
+
+
+def reference_logits(model: Any, obs: np.ndarray) -> np.ndarray:
+    import torch
+
+    with torch.no_grad():
+        obs_tensor, _ = model.policy.obs_to_tensor(obs)
+        return model.policy.get_distribution(obs_tensor).distribution.logits.cpu().numpy()
+
+
+def verify(model: Any, policy: NumpyPolicy, tolerance: float = 1e-4) -> Tuple[bool, float, int]:
+    """
+    Compare an export with the original on every agent-to-move position:
+    (ok, max difference in log-probabilities, positions whose greedy move differs).
+    Greedy moves are compared under the export's recorded masking.
+    """
+    from tictactoe_exploitability import agent_positions
+
+    obs = agent_positions()["obs"]
+    expected = reference_logits(model, obs)
+    actual = policy.logits(obs)
+    # SB3 normalises logits to log-probabilities; compare after the same shift.
+    actual = actual - np.logaddexp.reduce(actual, axis=1, keepdims=True)
+    diff = float(np.abs(expected - actual).max())
+    greedy = _masked_argmax(expected, obs, policy.masked)
+    mismatched = int((greedy != policy.act(obs)).sum())
+    return diff <= tolerance and mismatched == 0, diff, mismatched
+
+
+def measure_latency(policy: NumpyPolicy, batch: int = 4096, repeat: int = 200) -> Tuple[float, float]:
+    """(microseconds per single-board move, boards/s in batches of ``batch``)."""
+    from tictactoe_exploitability import agent_positions
+
+    obs = agent_positions()["obs"]
+    single = obs[:1]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        policy.act(single)
+    per_move = (time.perf_counter() - start) / repeat * 1e6
+    boards = np.resize(obs, (batch, 9))
+    start = time.perf_counter()
+    for _ in range(max(1, repeat // 20)):
+        policy.act(boards)
+    rate = batch * max(1, repeat // 20) / (time.perf_counter() - start)
+    return per_move, rate
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export a trained PPO policy for lightweight inference.")
+    parser.add_argument("model", type=str, help="Path to a model saved by train(), e.g. models/<run>.zip.")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="",
+        help="Output path (default: the model path with .npz or .onnx).",
+    )
+    parser.add_argument("--format", type=str, choices=("npz", "onnx"), default="npz", help="Export format.")
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="Largest allowed log-probability difference.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    model = load_model(args.model, is_maskable(args.model))
+    output = args.output or f"{os.path.splitext(args.model)[0]}.{args.format}"
+    if not output.endswith(f".{args.format}"):
+        # np.savez would add .npz itself, and load_policy picks the backend by extension.
+        output = f"{output}.{args.format}"
+    if args.format == "onnx":
+        export_onnx(model, output)
+    else:
+        extract_policy(model).save(output)
+    policy = load_policy(output)
+    masking = "masked" if policy.masked else "unmasked"
+    print(f"Exported {args.model} -> {output} ({os.path.getsize(output):,} bytes, {masking})")
+
+    ok, diff, mismatched = verify(model, policy, args.tolerance)
+    print(f"Verification: max log-prob difference {diff:.2e}, {mismatched} greedy mismatches -> {'ok' if ok else 'FAILED'}")
+    per_move, rate = measure_latency(policy)
+    print(f"Inference: {per_move:.1f} us per move, {rate:,.0f} boards/s batched")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Opt-in timing for training runs (train_tictactoe_wandb.py --profile).
+
+Per PPO iteration the callback logs, under ``profile/``:
+rollout collection vs. optimization, and inside the rollout the time spent in
+the raw env, in VecMonitor bookkeeping and in the policy (inference plus rollout
+buffer writes). Logger dumps (TensorBoard/W&B) are timed separately. Nothing
+here is installed unless --profile is given.
+"""
+import cProfile
+import os
+import pstats
+import time
+from typing import Any, Callable, Optional, Tuple
+
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import VecEnvObs, VecEnvStepReturn, VecEnvWrapper
+
+
+class VecStepTimer(VecEnvWrapper):
+    """Accumulates wall time spent in step_async/step_wait of the wrapped env."""
+
+    def __init__(self, venv: VecEnv) -> None:
+        super().__init__(venv)
+        self.seconds = 0.0
+        self.steps = 0
+
+    def reset(self) -> VecEnvObs:
+        return self.venv.reset()
+
+    def step_async(self, actions) -> None:
+        start = time.perf_counter()
+        self.venv.step_async(actions)
+        self.seconds += time.perf_counter() - start
+
+    def step_wait(self) -> VecEnvStepReturn:
+        start = time.perf_counter()
+        result = self.venv.step_wait()
+        self.seconds += time.perf_counter() - start
+        self.steps += 1
+        return result
+
+    def take(self) -> Tuple[float, int]:
+        """Seconds and steps since the last call."""
+        seconds, steps = self.seconds, self.steps
+        self.seconds, self.steps = 0.0, 0
+        return seconds, steps
+
+
+def parse_window(spec: str) -> Optional[Tuple[int, int]]:
+    """Parse an iteration window like "3:5" (inclusive, 1-based) or "4"; empty means none."""
+    if not spec:
+        return None
+    first, _, last = spec.partition(":")
+    start = int(first)
+    stop = int(last) if last else start
+    if not 1 <= start <= stop:
+        raise ValueError(f"Profile window must be START[:STOP] with 1 <= START <= STOP, got '{spec}'.")
+    return start, stop
+
+
+class ProfilingCallback(BaseCallback):
+    """
+    :param env_timer: VecStepTimer directly around the backend env.
+    :param monitor_timer: VecStepTimer around the VecMonitor, so monitor time is the difference.
+    :param window: iterations (inclusive, 1-based) to record with cProfile.
+    :param dump_dir: where the cProfile dump is written; open it with pstats or snakeviz.
+    """
+
+    def __init__(
+        self,
+        env_timer: VecStepTimer,
+        monitor_timer: VecStepTimer,
+        window: Optional[Tuple[int, int]] = None,
+        dump_dir: str = "runs",
+        verbose: int = 0,
+    ) -> None:
+        super().__init__(verbose)
+        self.env_timer = env_timer
+        self.monitor_timer = monitor_timer
+        self.window = window
+        self.dump_dir = dump_dir
+        self.iteration = 0
+        self.dump_seconds = 0.0
+        self._rollout_start = 0.0
+        self._rollout_end: Optional[float] = None
+        self._profiler: Optional[cProfile.Profile] = None
+
+    def _on_training_start(self) -> None:
+        # Time every logger dump (TensorBoard writes, synced to W&B) without touching SB3 itself.
+        dump: Callable[..., Any] = self.model.logger.dump
+
+        def timed_dump(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return dump(*args, **kwargs)
+            finally:
+                self.dump_seconds += time.perf_counter() - start
+
+        self.model.logger.dump = timed_dump
+
+    def _on_rollout_start(self) -> None:
+        now = time.perf_counter()
+        if self._rollout_end is not None:
+            # Everything between rollouts: gradient updates plus the logger dump before them.
+            self.logger.record("profile/train_s", now - self._rollout_end - self.dump_seconds)
+            self.logger.record("profile/log_dump_s", self.dump_seconds)
+            self.dump_seconds = 0.0
+        self.iteration += 1
+        if self.window is not None:
+            if self.iteration == self.window[0]:
+                self._profiler = cProfile.Profile()
+                self._profiler.enable()
+            elif self.iteration == self.window[1] + 1:
+                self._dump_profile()
+        self.env_timer.take()
+        self.monitor_timer.take()
+        self._rollout_start = time.perf_counter()
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_rollout_end(self) -> None:
+        self._rollout_end = time.perf_counter()
+        rollout = self._rollout_end - self._rollout_start
+        env_seconds, steps = self.env_timer.take()
+        wrapped_seconds, _ = self.monitor_timer.take()
+        self.logger.record("profile/iteration", self.iteration)
+        self.logger.record("profile/rollout_s", rollout)
+        self.logger.record("profile/env_step_s", env_seconds)
+        self.logger.record("profile/monitor_s", max(wrapped_seconds - env_seconds, 0.0))
+        self.logger.record("profile/policy_s", max(rollout - wrapped_seconds, 0.0))
+        if env_seconds > 0:
+            self.logger.record("profile/env_steps_per_s", steps * self.training_env.num_envs / env_seconds)
+
+    def _on_training_end(self) -> None:
+        if self._rollout_end is not None:
+            self.logger.record("profile/train_s", time.perf_counter() - self._rollout_end - self.dump_seconds)
+            self.logger.dump(self.num_timesteps)
+        self._dump_profile()
+
+    def _dump_profile(self) -> None:
+        if self._profiler is None:
+            return
+        self._profiler.disable()
+        assert self.window is not None
+        os.makedirs(self.dump_dir, exist_ok=True)
+        stop = min(self.window[1], self.iteration)
+        path = os.path.join(self.dump_dir, f"profile-iter{self.window[0]}-{stop}.prof")
+        self._profiler.dump_stats(path)
+        self._profiler = None
+        print(f"[profile] cProfile stats for iterations {self.window[0]}-{stop} written to {path}")
+        if self.verbose:
+            pstats.Stats(path).sort_stats("cumulative").print_stats(15)
@@ -0,0 +1,168 @@
+"""
+Self-play opponents: frozen snapshots of the learning policy kept in a pool.
+
+The envs take ``opponent="self"`` plus an OpponentPool. Each episode draws one
+snapshot from the pool, and BatchedTicTacToeVecEnv answers every row that faces
+the same snapshot with a single forward pass. SelfPlayCallback adds the current
+policy to the pool every ``snapshot_freq`` timesteps.
+"""
+import copy
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+SELF_PLAY = "self"
+POOL_STRATEGIES = ("latest", "uniform", "winrate")
+
+
+def opponent_view(boards: np.ndarray) -> np.ndarray:
+    """Swap marks 1 and 2 so a snapshot sees the board as it was trained: own marks 1."""
+    return np.where(boards == 0, 0, 3 - boards).astype(np.int8)
+
+
+class PolicySnapshot:
+    """A frozen CPU copy of an SB3 policy together with its results against the learner."""
+
+    def __init__(self, policy: Any, label: str) -> None:
+        self.policy = copy.deepcopy(policy).to("cpu")
+        self.policy.optimizer = None
+        self.policy.set_training_mode(False)
+        self.label = label
+        self.games = 0
+        # Games the snapshot won, i.e. the learner lost.
+        self.wins = 0
+
+    def act(self, boards: np.ndarray, rng: np.random.Generator, deterministic: bool = False) -> np.ndarray:
+        """Moves for a (N, 9) batch of boards in the env's encoding, restricted to empty cells."""
+        import torch
+
+        with torch.no_grad():
+            obs_tensor, _ = self.policy.obs_to_tensor(opponent_view(boards))
+            logits = self.policy.get_distribution(obs_tensor).distribution.logits.numpy()
+        logits = np.where(boards == 0, logits, -np.inf)
+        if not deterministic:
+            # Gumbel-max: one categorical sample per row without a Python loop.
+            logits = logits + rng.gumbel(size=logits.shape)
+        return logits.argmax(axis=1).astype(np.int64)
+
+    def record(self, result: str) -> None:
+        """``result`` is the learner's outcome: win, draw or loss."""
+        self.games += 1
+        self.wins += result == "loss"
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games else 0.0
+
+
+class OpponentPool:
+    """
+    The most recent ``max_size`` snapshots of the learning policy.
+
+    Strategies for drawing an episode's opponent: ``latest`` always plays the newest
+    snapshot, ``uniform`` picks any snapshot, and ``winrate`` favours snapshots that
+    beat the learner more often (weight (wins + 1) / (games + 2)).
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10,
+        strategy: str = "latest",
+        deterministic: bool = False,
+        seed: Optional[int] = None,
+    ) -> None:
+        if strategy not in POOL_STRATEGIES:
+            raise ValueError(f"Unknown pool strategy '{strategy}'. Choose from: {', '.join(POOL_STRATEGIES)}.")
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got {max_size}.")
+        self.max_size = max_size
+        self.strategy = strategy
+        self.deterministic = deterministic
+        self.rng = np.random.default_rng(seed)
+        self.snapshots: List[PolicySnapshot] = []
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    def add(self, policy: Any, label: str) -> PolicySnapshot:
+        snapshot = PolicySnapshot(policy, label)
+        self.snapshots.append(snapshot)
+        # Episodes already facing an evicted snapshot keep their reference until they end.
+        del self.snapshots[: -self.max_size]
+        return snapshot
+
+    def sample(self, n: int) -> List[Optional[PolicySnapshot]]:
+        """Opponents for ``n`` new episodes; None while the pool is empty."""
+        if not self.snapshots:
+            return [None] * n
+        if self.strategy == "latest":
+            return [self.snapshots[-1]] * n
+        if self.strategy == "uniform":
+            weights = None
+        else:
+            weights = np.array([(s.wins + 1) / (s.games + 2) for s in self.snapshots])
+            weights /= weights.sum()
+        picks = self.rng.choice(len(self.snapshots), size=n, p=weights)
+        return [self.snapshots[pick] for pick in picks]
+
+    def act(self, boards: np.ndarray, opponents: Sequence[PolicySnapshot]) -> np.ndarray:
+        """Moves for each board from its assigned snapshot: one forward pass per distinct snapshot."""
+        moves = np.empty(len(boards), dtype=np.int64)
+        groups: Dict[int, List[int]] = {}
+        for pos, snapshot in enumerate(opponents):
+            groups.setdefault(id(snapshot), []).append(pos)
+        for positions in groups.values():
+            snapshot = opponents[positions[0]]
+            moves[positions] = snapshot.act(boards[positions], self.rng, self.deterministic)
+        return moves
+
+    def get_state(self) -> Dict[str, Any]:
+        # The snapshots themselves: envs hold references to them, and a checkpoint pickles both together.
+        return {"snapshots": list(self.snapshots), "rng": self.rng.bit_generator.state}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self.snapshots = list(state["snapshots"])
+        self.rng.bit_generator.state = state["rng"]
+
+    def stats(self) -> Dict[str, float]:
+        games = sum(s.games for s in self.snapshots)
+        wins = sum(s.wins for s in self.snapshots)
+        return {
+            "pool_size": len(self.snapshots),
+            "games": games,
+            "opponent_win_rate": wins / games if games else 0.0,
+            "latest_win_rate": self.snapshots[-1].win_rate if self.snapshots else 0.0,
+        }
+
+
+class SelfPlayCallback(BaseCallback):
+    """Seeds the pool with the initial policy and adds a snapshot every ``snapshot_freq`` timesteps."""
+
+    def __init__(self, pool: OpponentPool, snapshot_freq: int, verbose: int = 0) -> None:
+        super().__init__(verbose)
+        self.pool = pool
+        self.snapshot_freq = snapshot_freq
+        self._next_snapshot = snapshot_freq
+
+    def _on_training_start(self) -> None:
+        if not self.pool.snapshots:
+            self.pool.add(self.model.policy, label=str(self.num_timesteps))
+
+    def _on_step(self) -> bool:
+        if self.num_timesteps >= self._next_snapshot:
+            self._next_snapshot += self.snapshot_freq
+            self.pool.add(self.model.policy, label=str(self.num_timesteps))
+            if self.verbose:
+                print(f"[selfplay] snapshot at {self.num_timesteps} steps, pool size {len(self.pool)}")
+        return True
+
+    def get_state(self) -> Dict[str, Any]:
+        return {"next_snapshot": self._next_snapshot}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self._next_snapshot = state["next_snapshot"]
+
+    def _on_rollout_end(self) -> None:
+        for key, value in self.pool.stats().items():
+            self.logger.record(f"selfplay/{key}", value)
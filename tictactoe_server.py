@@ -0,0 +1,619 @@
+"""
+Game server: many concurrent games against the AI over line-delimited JSON on TCP.
+
+Every request is one JSON object per line with an ``op`` and an optional ``id``
+that is echoed back, so a connection can carry many games with requests in
+flight at once:
+
+    {"id": 1, "op": "new"}                        -> {"id": 1, "ok": true, "game": 7, "board": ".........", ...}
+    {"id": 2, "op": "move", "game": 7, "cell": 4} -> {"id": 2, "ok": true, "ai_move": 0, "board": "O...X....", ...}
+    {"id": 3, "op": "close", "game": 7}
+    {"id": 4, "op": "stats"}
+
+``new`` takes optional ``ai`` ("solver" or "llm"), ``size``/``k`` and ``ai_first``.
+A game is two bitmasks and a few small fields (Session). On 3x3 the solver
+answers from its precomputed table inside the event loop; bigger boards are
+searched by tictactoe_mnk in a process pool. LLM moves are gathered for
+``--batch-window`` seconds into one batched prompt, deduplicated by canonical
+position across sessions, and fall back to the solver when the request fails.
+LLM and search answers are kept in one LRU cache shared by all sessions, and LLM
+answers also in the SQLite MoveCache when ``--cache-path`` (default
+OPENAI_CACHE_PATH) is set.
+
+    python tictactoe_server.py --port 8765
+    python tictactoe_loadtest.py --port 8765 --sessions 10000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Coroutine, Dict, Hashable, List, Optional, Set, Tuple
+
+import tictactoe_mnk
+import tictactoe_solver
+from tictactoe_board import IS_WIN, to_cells
+from tictactoe_cache import MoveCache
+from tictactoe_game import (
+    EMPTY,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_MODEL,
+    OPENAI_TIMEOUT,
+    PROMPT_VERSION,
+    build_batch_prompt,
+    parse_moves,
+)
+from tictactoe_symmetry import canonicalize, from_canonical_move
+
+AI_KINDS = ("solver", "llm")
+DEFAULT_PORT = 8765
+
+
+class Session:
+    """One game: the human's (X) and the AI's (O) cells as bitmasks."""
+
+    __slots__ = ("human", "ai", "size", "k", "ai_kind", "busy", "last_used")
+
+    def __init__(self, size: int, k: int, ai_kind: str) -> None:
+        self.human = 0
+        self.ai = 0
+        self.size = size
+        self.k = k
+        self.ai_kind = ai_kind
+        self.busy = False
+        self.last_used = time.monotonic()
+
+    @property
+    def classic(self) -> bool:
+        return self.size == 3 and self.k == 3
+
+    def board(self) -> str:
+        cells = self.size * self.size
+        return "".join(
+            "X" if self.human >> idx & 1 else "O" if self.ai >> idx & 1 else "." for idx in range(cells)
+        )
+
+    def winner(self) -> Optional[str]:
+        if self.classic:
+            return "X" if IS_WIN[self.human] else "O" if IS_WIN[self.ai] else None
+        player = tictactoe_mnk.square(self.size, self.k).winner(self.human, self.ai)
+        return None if player is None else "XO"[player]
+
+    def is_full(self) -> bool:
+        return self.human | self.ai == (1 << self.size * self.size) - 1
+
+
+class MoveMemo:
+    """Shared LRU of AI moves by position, for every session and AI kind."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, int]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[int]:
+        move = self.entries.get(key)
+        if move is not None:
+            self.entries.move_to_end(key)
+        return move
+
+    def put(self, key: Hashable, move: int) -> None:
+        self.entries[key] = move
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+def _search(size: int, k: int, human: int, ai: int, seconds: float) -> Optional[int]:
+    """Runs in a pool process, which keeps its own engine and transposition table between calls."""
+    return tictactoe_mnk.engine(size, k).search(human, ai, 1, time_limit=seconds).move
+
+
+class LLMBatcher:
+    """
+    Collects O-to-move 3x3 positions from all sessions and asks for them in batched
+    prompts. Positions are keyed by canonical orientation, so sessions waiting on the
+    same position (up to symmetry) share one slot of one request.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        batch_size: int,
+        window: float,
+        concurrency: int,
+        timeout: float,
+        store: Optional[MoveCache],
+        stats: Dict[str, int],
+    ) -> None:
+        from tictactoe_llm import DEFAULT_BASE_URL, OpenAIClient
+
+        self.client = OpenAIClient(api_key, OPENAI_BASE_URL or DEFAULT_BASE_URL, max_connections=concurrency)
+        self.model = model
+        self.batch_size = batch_size
+        self.window = window
+        self.timeout = timeout
+        self.store = store
+        self.stats = stats
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm")
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # Canonical key -> future of the canonical move (None when the LLM gave no legal move).
+        self.pending: Dict[int, "asyncio.Future[Optional[int]]"] = {}
+        self.queue: List[Tuple[int, List[str]]] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        # The event loop only keeps weak references to tasks.
+        self.tasks: Set["asyncio.Task[None]"] = set()
+
+    async def move(self, human: int, ai: int) -> Optional[int]:
+        first, second, sym = canonicalize(human, ai)
+        key = first | second << 9
+        future = self.pending.get(key)
+        if future is not None:
+            self.stats["llm_deduplicated"] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.pending[key] = future
+            self._spawn(self._lookup(key, to_cells(first, second, empty=EMPTY)))
+        move = await asyncio.shield(future)
+        return None if move is None else from_canonical_move(move, sym)
+
+    async def _lookup(self, key: int, board: List[str]) -> None:
+        if self.store is not None:
+            loop = asyncio.get_running_loop()
+            move = await loop.run_in_executor(self.executor, self.store.get, board, self.model, PROMPT_VERSION)
+            if move is not None:
+                self.stats["llm_store_hits"] += 1
+                self._resolve(key, move)
+                return
+        self.queue.append((key, board))
+        if len(self.queue) >= self.batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+    def _flush(self) -> None:
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        while self.queue:
+            batch, self.queue = self.queue[: self.batch_size], self.queue[self.batch_size :]
+            self._spawn(self._send(batch))
+
+    def _spawn(self, coro: Coroutine[Any, Any, None]) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _send(self, batch: List[Tuple[int, List[str]]]) -> None:
+        import http.client
+
+        from tictactoe_llm import OpenAIHTTPError
+
+        boards = [board for _, board in batch]
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": "You are an unbeatable tic tac toe player playing as O."},
+                {"role": "user", "content": build_batch_prompt(boards)},
+            ],
+            "temperature": 0,
+        }
+        moves: List[Optional[int]] = [None] * len(batch)
+        loop = asyncio.get_running_loop()
+        latency = 0.0
+        try:
+            async with self.semaphore:
+                self.stats["llm_requests"] += 1
+                self.stats["llm_boards"] += len(batch)
+                started = time.perf_counter()
+                result = await loop.run_in_executor(self.executor, self.client.chat_completion, payload, self.timeout)
+                latency = (time.perf_counter() - started) / len(batch)
+            text = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+            moves = parse_moves(text, boards)
+        except OpenAIHTTPError as exc:
+            self.stats["llm_errors"] += 1
+            print(f"[server] LLM batch of {len(batch)} failed with HTTP {exc.code}; using the solver.")
+        except (http.client.HTTPException, TimeoutError, json.JSONDecodeError, OSError) as exc:
+            self.stats["llm_errors"] += 1
+            print(f"[server] LLM batch of {len(batch)} failed ({exc or type(exc).__name__}); using the solver.")
+        finally:
+            # Every waiting session gets an answer, None meaning "use the solver".
+            for (key, board), move in zip(batch, moves):
+                if move is not None and self.store is not None:
+                    loop.run_in_executor(
+                        self.executor, self.store.put, board, self.model, PROMPT_VERSION, move, latency
+                    )
+                self._resolve(key, move)
+
+    def _resolve(self, key: int, move: Optional[int]) -> None:
+        future = self.pending.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(move)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
+        self.client.close()
+
+
+class GameServer:
+    def __init__(
+        self,
+        ai: str = "solver",
+        model: str = OPENAI_MODEL,
+        api_key: str = OPENAI_API_KEY,
+        batch_size: int = 16,
+        batch_window: float = 0.02,
+        llm_concurrency: int = 4,
+        llm_timeout: float = OPENAI_TIMEOUT,
+        search_seconds: float = 0.2,
+        search_workers: int = 0,
+        max_sessions: int = 100_000,
+        idle_timeout: float = 600.0,
+        cache_entries: int = 100_000,
+        cache_path: str = "",
+    ) -> None:
+        if ai not in AI_KINDS:
+            raise ValueError(f"Unknown AI '{ai}'. Choose from: {', '.join(AI_KINDS)}.")
+        self.ai = ai
+        self.model = model
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.llm_concurrency = llm_concurrency
+        self.llm_timeout = llm_timeout
+        self.search_seconds = search_seconds
+        self.search_workers = search_workers or os.cpu_count() or 1
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.cache_path = cache_path
+        self.sessions: Dict[int, Session] = {}
+        self.memo = MoveMemo(cache_entries)
+        self.stats: Dict[str, int] = {
+            key: 0
+            for key in (
+                "connections",
+                "games",
+                "moves",
+                "cache_hits",
+                "solver_moves",
+                "search_moves",
+                "search_deduplicated",
+                "llm_moves",
+                "llm_fallbacks",
+                "llm_requests",
+                "llm_boards",
+                "llm_deduplicated",
+                "llm_store_hits",
+                "llm_errors",
+                "ai_errors",
+                "expired",
+            )
+        }
+        self.started = time.monotonic()
+        self._ids = itertools.count(1)
+        self._searches: Dict[Tuple[int, int, int, int], "asyncio.Future[Optional[int]]"] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._batcher: Optional[LLMBatcher] = None
+        self._store: Optional[MoveCache] = None
+
+    # Pools and clients are created on first use, so a solver-only server starts instantly.
+    def _search_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(self.search_workers, mp_context=mp.get_context(method))
+        return self._pool
+
+    def _llm(self) -> LLMBatcher:
+        if self._batcher is None:
+            if self.cache_path:
+                self._store = MoveCache(self.cache_path)
+            self._batcher = LLMBatcher(
+                self.api_key,
+                self.model,
+                self.batch_size,
+                self.batch_window,
+                self.llm_concurrency,
+                self.llm_timeout,
+                self._store,
+                self.stats,
+            )
+        return self._batcher
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port, limit=1 << 16, backlog=4096)
+        sweeper = asyncio.get_running_loop().create_task(self._expire_idle())
+        tictactoe_solver.solved_table()
+        print(f"[server] Listening on {host}:{port} (AI: {self.ai}).")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+            self.close()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats["connections"] += 1
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        # Replies finished in the same loop iteration go out in one write (one send syscall).
+        outgoing: List[bytes] = []
+
+        def flush() -> None:
+            if not writer.is_closing():
+                writer.write(b"".join(outgoing))
+            outgoing.clear()
+
+        async def respond(request: Any) -> None:
+            reply = await self.dispatch(request)
+            if isinstance(request, dict) and "id" in request:
+                reply["id"] = request["id"]
+            if not outgoing:
+                loop.call_soon(flush)
+            outgoing.append(json.dumps(reply, separators=(",", ":")).encode() + b"\n")
+            await writer.drain()
+
+        try:
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        request = json.loads(line)
+                    except json.JSONDecodeError:
+                        request = None
+                    # Requests run concurrently; the echoed id matches replies to them.
+                    task = loop.create_task(respond(request))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+                pass
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            # Shutting down: asyncio's stream callback would log a cancelled handler as an error.
+            for task in tasks:
+                task.cancel()
+        finally:
+            self.stats["connections"] -= 1
+            writer.close()
+
+    async def dispatch(self, request: Any) -> Dict[str, Any]:
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "Requests must be JSON objects, one per line."}
+        op = request.get("op")
+        try:
+            if op == "new":
+                return self.new_game(request)
+            if op == "move":
+                return await self.play(request)
+            if op == "close":
+                return self.close_game(request)
+            if op == "stats":
+                return {"ok": True, **self.snapshot()}
+        except (KeyError, TypeError, ValueError) as exc:
+            return {"ok": False, "error": str(exc)}
+        return {"ok": False, "error": f"Unknown op {op!r}; expected new, move, close or stats."}
+
+    def new_game(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if len(self.sessions) >= self.max_sessions:
+            return {"ok": False, "error": f"Server is full ({self.max_sessions} games)."}
+        size = int(request.get("size", 3))
+        k = int(request.get("k") or min(size, 5))
+        if not 3 <= size <= 8 or not 3 <= k <= size:
+            raise ValueError("size must be 3-8 and k between 3 and size.")
+        ai_kind = request.get("ai", self.ai)
+        if ai_kind not in AI_KINDS:
+            raise ValueError(f"Unknown AI '{ai_kind}'. Choose from: {', '.join(AI_KINDS)}.")
+        if ai_kind == "llm" and not (size == 3 and k == 3):
+            raise ValueError("The LLM only plays 3x3.")
+        game = next(self._ids)
+        session = Session(size, k, ai_kind)
+        self.sessions[game] = session
+        self.stats["games"] += 1
+        reply = {"ok": True, "game": game, "board": session.board(), "over": False, "winner": None}
+        if request.get("ai_first"):
+            # Nothing to await on an empty board: the solver answers from its table, the rest from the centre.
+            if session.classic:
+                session.ai = 1 << tictactoe_solver.best_move([EMPTY] * 9)
+            else:
+                session.ai = 1 << tictactoe_mnk.square(size, k).centre_order[0]
+            reply["board"] = session.board()
+        return reply
+
+    def close_game(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if self.sessions.pop(request["game"], None) is None:
+            return {"ok": False, "error": f"Unknown game {request['game']!r}."}
+        return {"ok": True}
+
+    async def play(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        session = self.sessions.get(request["game"])
+        if session is None:
+            return {"ok": False, "error": f"Unknown game {request['game']!r}."}
+        cell = int(request["cell"])
+        if session.busy:
+            return {"ok": False, "error": "The AI is still thinking about this game."}
+        if session.winner() is not None or session.is_full():
+            return {"ok": False, "error": "The game is over."}
+        if not 0 <= cell < session.size * session.size or (session.human | session.ai) >> cell & 1:
+            return {"ok": False, "error": f"Cell {cell} is not empty."}
+
+        session.last_used = time.monotonic()
+        session.human |= 1 << cell
+        self.stats["moves"] += 1
+        ai_move = source = None
+        if session.winner() is None and not session.is_full():
+            session.busy = True
+            try:
+                ai_move, source = await self.ai_move(session)
+            except (Exception, asyncio.CancelledError) as exc:
+                # Take the human move back so the game is as it was before this request.
+                session.human &= ~(1 << cell)
+                self.stats["moves"] -= 1
+                if isinstance(exc, asyncio.CancelledError):
+                    raise
+                self.stats["ai_errors"] += 1
+                print(f"[server] AI move failed ({exc or type(exc).__name__}); the human move was undone.")
+                return {"ok": False, "error": f"The AI failed to move ({type(exc).__name__}); send the move again."}
+            finally:
+                session.busy = False
+            session.ai |= 1 << ai_move
+        winner = session.winner()
+        return {
+            "ok": True,
+            "board": session.board(),
+            "ai_move": ai_move,
+            "source": source,
+            "over": winner is not None or session.is_full(),
+            "winner": winner,
+        }
+
+    async def ai_move(self, session: Session) -> Tuple[int, str]:
+        """The AI's cell and where it came from: solver, cache, llm or search."""
+        human, ai = session.human, session.ai
+        if session.classic and session.ai_kind == "solver":
+            # The solved table is already the cheapest cache there is.
+            self.stats["solver_moves"] += 1
+            return tictactoe_solver.lookup_masks(human, ai, True)[1], "solver"
+        key = (session.ai_kind, session.size, session.k, human, ai)
+        move = self.memo.get(key)
+        if move is not None:
+            self.stats["cache_hits"] += 1
+            return move, "cache"
+        if session.ai_kind == "llm":
+            move = await self._llm().move(human, ai)
+            if move is None:
+                # Not cached, so the position is asked again next time.
+                self.stats["llm_fallbacks"] += 1
+                self.stats["solver_moves"] += 1
+                return tictactoe_solver.lookup_masks(human, ai, True)[1], "solver"
+            self.stats["llm_moves"] += 1
+            source = "llm"
+        else:
+            move = await self._search(session)
+            source = "search"
+        self.memo.put(key, move)
+        return move, source
+
+    async def _search(self, session: Session) -> int:
+        key = (session.size, session.k, session.human, session.ai)
+        future = self._searches.get(key)
+        if future is not None:
+            self.stats["search_deduplicated"] += 1
+            return await asyncio.shield(future)
+        loop = asyncio.get_running_loop()
+        pool = self._search_pool()
+        try:
+            future = loop.run_in_executor(
+                pool, _search, session.size, session.k, session.human, session.ai, self.search_seconds
+            )
+            self._searches[key] = future
+            try:
+                move = await future
+            finally:
+                del self._searches[key]
+        except BrokenProcessPool:
+            # A worker died and the pool refuses new work: the next search starts a fresh one.
+            if self._pool is pool:
+                self._pool = None
+                pool.shutdown(wait=False)
+            raise
+        self.stats["search_moves"] += 1
+        if move is None:
+            # Out of time before depth 1 finished: play the first free cell from the centre out.
+            geo = tictactoe_mnk.square(session.size, session.k)
+            free = geo.full_mask & ~(session.human | session.ai)
+            move = next(idx for idx in geo.centre_order if free >> idx & 1)
+        return move
+
+    async def _expire_idle(self) -> None:
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 60.0))
+            cutoff = time.monotonic() - self.idle_timeout
+            stale = [game for game, session in self.sessions.items() if session.last_used < cutoff]
+            for game in stale:
+                del self.sessions[game]
+            self.stats["expired"] += len(stale)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "cached_positions": len(self.memo.entries),
+            "uptime": round(time.monotonic() - self.started, 1),
+            **self.stats,
+        }
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+        if self._batcher is not None:
+            self._batcher.close()
+        if self._store is not None:
+            self._store.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve many concurrent TicTacToe games over line-delimited JSON.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port.")
+    parser.add_argument("--ai", type=str, choices=AI_KINDS, default="solver", help="Default AI for new games.")
+    parser.add_argument("--model", type=str, default=OPENAI_MODEL, help="Chat completions model for --ai llm.")
+    parser.add_argument("--batch-size", type=int, default=16, help="Most positions per LLM request.")
+    parser.add_argument(
+        "--batch-window", type=float, default=0.02, help="Seconds to gather positions before an LLM request."
+    )
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="LLM requests in flight at once.")
+    parser.add_argument("--llm-timeout", type=float, default=OPENAI_TIMEOUT, help="Seconds per LLM request.")
+    parser.add_argument(
+        "--search-seconds", type=float, default=0.2, help="Search time per AI move on boards bigger than 3x3."
+    )
+    parser.add_argument(
+        "--search-workers", type=int, default=0, help="Processes searching bigger boards (0 = one per CPU)."
+    )
+    parser.add_argument("--max-sessions", type=int, default=100_000, help="Most games open at once.")
+    parser.add_argument("--idle-timeout", type=float, default=600.0, help="Seconds before an idle game is dropped.")
+    parser.add_argument("--cache-entries", type=int, default=100_000, help="Positions kept in the shared move cache.")
+    parser.add_argument(
+        "--cache-path",
+        type=str,
+        default=os.getenv("OPENAI_CACHE_PATH", "").strip(),
+        help="SQLite MoveCache shared with the app for LLM answers (default OPENAI_CACHE_PATH; empty disables).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.ai == "llm" and not OPENAI_API_KEY:
+        raise SystemExit("OPENAI_API_KEY is not set.")
+    server = GameServer(
+        ai=args.ai,
+        model=args.model,
+        batch_size=args.batch_size,
+        batch_window=args.batch_window,
+        llm_concurrency=args.llm_concurrency,
+        llm_timeout=args.llm_timeout,
+        search_seconds=args.search_seconds,
+        search_workers=args.search_workers,
+        max_sessions=args.max_sessions,
+        idle_timeout=args.idle_timeout,
+        cache_entries=args.cache_entries,
+        cache_path=args.cache_path,
+    )
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    print(f"[server] Stopped: {json.dumps(server.snapshot())}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+from functools import lru_cache
+from typing import Dict, Optional, Sequence, Tuple
+
+from tictactoe_board import CELL_MASKS, MOVES, from_cells, is_full, legal_moves, position_hash, winner
+from tictactoe_symmetry import canonicalize, restore_mask
+
+HUMAN = "X"
+AI = "O"
+EMPTY = ""
+
+# Mask order used throughout the solver: human (X) is player 0, AI (O) is player 1.
+MARKS = (HUMAN, AI)
+
+Entry = Tuple[int, Optional[int]]
+# (minimax value, mask of every optimal move) in canonical orientation.
+SolvedEntry = Tuple[int, int]
+Table = Dict[Tuple[int, bool], SolvedEntry]
+
+
+def _terminal_score(human: int, ai: int) -> Optional[int]:
+    mark = winner(human, ai)
+    if mark == 1:
+        return 1
+    if mark == 0:
+        return -1
+    if is_full(human, ai):
+        return 0
+    return None
+
+
+def _solve(human: int, ai: int, maximizing: bool, table: Table) -> int:
+    human, ai, _ = canonicalize(human, ai)
+    key = (position_hash(human, ai), maximizing)
+    entry = table.get(key)
+    if entry is not None:
+        return entry[0]
+
+    score = _terminal_score(human, ai)
+    if score is not None:
+        table[key] = (score, 0)
+        return score
+
+    best_score: Optional[int] = None
+    best_moves = 0
+    for idx in legal_moves(human, ai):
+        if maximizing:
+            score = _solve(human, ai | CELL_MASKS[idx], False, table)
+        else:
+            score = _solve(human | CELL_MASKS[idx], ai, True, table)
+        if (
+            best_score is None
+            or (maximizing and score > best_score)
+            or (not maximizing and score < best_score)
+        ):
+            best_score = score
+            best_moves = CELL_MASKS[idx]
+        elif score == best_score:
+            best_moves |= CELL_MASKS[idx]
+
+    assert best_score is not None
+    table[key] = (best_score, best_moves)
+    return best_score
+
+
+@lru_cache(maxsize=None)
+def solved_table() -> Table:
+    """
+    Every position reachable from the empty board with either side moving first, up
+    to rotation and reflection: keyed by (canonical position hash, maximizing) and
+    mapped to (minimax value, mask of optimal moves in canonical orientation).
+    Built once on first use; the X-first half is 765 of the classic 5,478 positions.
+    """
+    table: Table = {}
+    _solve(0, 0, False, table)
+    _solve(0, 0, True, table)
+    return table
+
+
+def _entry(human: int, ai: int, maximizing: bool) -> Tuple[int, int]:
+    """(value, optimal-move mask in the actual orientation)."""
+    canon_human, canon_ai, sym = canonicalize(human, ai)
+    key = (position_hash(canon_human, canon_ai), maximizing)
+    entry = solved_table().get(key)
+    if entry is None:
+        # Not reachable by legal alternating play (hand-edited board); search it directly.
+        scratch: Table = {}
+        _solve(canon_human, canon_ai, maximizing, scratch)
+        entry = scratch[key]
+    return entry[0], restore_mask(entry[1], sym)
+
+
+def optimal_moves(human: int, ai: int, maximizing: bool) -> Tuple[int, ...]:
+    """Every move that keeps the minimax value for the side to move, in ascending order."""
+    return MOVES[_entry(human, ai, maximizing)[1]]
+
+
+def lookup_masks(human: int, ai: int, maximizing: bool) -> Entry:
+    value, moves = _entry(human, ai, maximizing)
+    return value, (MOVES[moves][0] if moves else None)
+
+
+def lookup(board: Sequence[str], maximizing: bool) -> Entry:
+    return lookup_masks(*from_cells(board, MARKS), maximizing)
+
+
+def value(board: Sequence[str], maximizing: bool) -> int:
+    return lookup(board, maximizing)[0]
+
+
+def best_move(board: Sequence[str], maximizing: bool = True) -> Optional[int]:
+    """Lowest-index move with the best value for the side to move, or None if the game is over."""
+    return lookup(board, maximizing)[1]
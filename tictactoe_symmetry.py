@@ -0,0 +1,89 @@
+"""
+The 8 symmetries of the 3x3 board (rotations and reflections) as index permutations.
+
+``PERMUTATIONS[s][i]`` is the cell of the original board that lands on cell ``i``
+after symmetry ``s``, so ``transformed[i] = board[PERMUTATIONS[s][i]]``. A position's
+canonical form is the orientation with the smallest bitboard position hash.
+"""
+from typing import Any, Callable, List, Sequence, Tuple
+
+from tictactoe_board import FULL_MASK, position_hash
+
+
+def _permutation(source: Callable[[int, int], Tuple[int, int]]) -> Tuple[int, ...]:
+    cells = []
+    for idx in range(9):
+        row, col = source(*divmod(idx, 3))
+        cells.append(row * 3 + col)
+    return tuple(cells)
+
+
+PERMUTATIONS: Tuple[Tuple[int, ...], ...] = tuple(
+    _permutation(source)
+    for source in (
+        lambda r, c: (r, c),  # identity
+        lambda r, c: (2 - c, r),  # rotate 90 clockwise
+        lambda r, c: (2 - r, 2 - c),  # rotate 180
+        lambda r, c: (c, 2 - r),  # rotate 270 clockwise
+        lambda r, c: (r, 2 - c),  # mirror left-right
+        lambda r, c: (2 - r, c),  # mirror top-bottom
+        lambda r, c: (c, r),  # transpose
+        lambda r, c: (2 - c, 2 - r),  # anti-transpose
+    )
+)
+
+# INVERSE[s][j] is the cell that original cell j moves to under symmetry s.
+INVERSE: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(perm.index(cell) for cell in range(9)) for perm in PERMUTATIONS
+)
+
+# INVERSE_SYMMETRY[s] is the symmetry that undoes s.
+INVERSE_SYMMETRY: Tuple[int, ...] = tuple(PERMUTATIONS.index(inv) for inv in INVERSE)
+
+# MASK_MAPS[s][mask] applies symmetry s to a 9-bit mask.
+MASK_MAPS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(sum(1 << idx for idx in range(9) if mask >> perm[idx] & 1) for mask in range(FULL_MASK + 1))
+    for perm in PERMUTATIONS
+)
+
+
+def transform_cells(board: Sequence[Any], sym: int) -> List[Any]:
+    perm = PERMUTATIONS[sym]
+    return [board[perm[idx]] for idx in range(9)]
+
+
+def transform_mask(mask: int, sym: int) -> int:
+    return MASK_MAPS[sym][mask]
+
+
+def restore_mask(mask: int, sym: int) -> int:
+    """Undo ``transform_mask(mask, sym)``."""
+    return MASK_MAPS[INVERSE_SYMMETRY[sym]][mask]
+
+
+def canonicalize(first: int, second: int) -> Tuple[int, int, int]:
+    """(canonical first mask, canonical second mask, symmetry taking the position there)."""
+    best_key = -1
+    best = (first, second, 0)
+    for sym, table in enumerate(MASK_MAPS):
+        a, b = table[first], table[second]
+        key = position_hash(a, b)
+        if best_key < 0 or key < best_key:
+            best_key = key
+            best = (a, b, sym)
+    return best
+
+
+def canonical_key(first: int, second: int) -> int:
+    a, b, _ = canonicalize(first, second)
+    return position_hash(a, b)
+
+
+def to_canonical_move(move: int, sym: int) -> int:
+    """Actual-orientation cell -> the same cell in the symmetry's orientation."""
+    return INVERSE[sym][move]
+
+
+def from_canonical_move(move: int, sym: int) -> int:
+    """Cell in the symmetry's orientation -> the actual board cell."""
+    return PERMUTATIONS[sym][move]
@@ -0,0 +1,208 @@
+"""
+Episode statistics for training runs (train_tictactoe_wandb.py --stats-freq).
+
+VecEpisodeStats sits directly on the backend env and counts, in preallocated
+arrays, how every episode ended (win/draw/loss/invalid, split by who moved
+first), which cells the agent and the opponent played, the opponent's openings
+and episode lengths. Everything is read off the observations the env already
+returns; only rows that finished an episode look at their info dict, and nothing
+is allocated per row. GameStatsCallback flushes the counters under ``game/`` -
+rates as scalars, cell distributions as histograms - and starts a new window.
+"""
+from typing import Any, Dict, Optional
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import VecEnvObs, VecEnvStepReturn, VecEnvWrapper
+
+from tictactoe_vec_env import OPPONENT_MARK
+
+OUTCOMES = ("win", "draw", "loss", "invalid")
+STARTERS = ("agent_first", "opponent_first")
+_OUTCOME_INDEX = {name: idx for idx, name in enumerate(OUTCOMES)}
+_INVALID = _OUTCOME_INDEX["invalid"]
+
+# Histograms only make sense in TensorBoard (and W&B through it), not in the text outputs.
+_HISTOGRAM_EXCLUDE = ("stdout", "log", "json", "csv")
+
+
+class EpisodeStats:
+    """
+    Counters since the last reset().
+
+    ``outcomes[starter, outcome]`` counts finished episodes (rows as in STARTERS,
+    columns as in OUTCOMES); ``agent_moves`` and ``opponent_moves`` count legal
+    moves per cell, ``opponent_openings`` the opponent's first move when it
+    started, and ``lengths[n]`` episodes that took the agent n steps.
+    """
+
+    def __init__(self, cells: int = 9) -> None:
+        self.cells = cells
+        self.outcomes = np.zeros((len(STARTERS), len(OUTCOMES)), dtype=np.int64)
+        self.agent_moves = np.zeros(cells, dtype=np.int64)
+        self.opponent_moves = np.zeros(cells, dtype=np.int64)
+        self.opponent_openings = np.zeros(cells, dtype=np.int64)
+        self.lengths = np.zeros(cells + 1, dtype=np.int64)
+
+    @property
+    def episodes(self) -> int:
+        return int(self.outcomes.sum())
+
+    def reset(self) -> None:
+        for counts in self.counters().values():
+            counts.fill(0)
+
+    def counters(self) -> Dict[str, np.ndarray]:
+        return {
+            "outcomes": self.outcomes,
+            "agent_moves": self.agent_moves,
+            "opponent_moves": self.opponent_moves,
+            "opponent_openings": self.opponent_openings,
+            "lengths": self.lengths,
+        }
+
+    def rates(self) -> Dict[str, float]:
+        """Outcome rates overall and per starter, plus the mean episode length; empty without episodes."""
+        total = self.episodes
+        if not total:
+            return {}
+        rates: Dict[str, float] = {}
+        for idx, name in enumerate(OUTCOMES):
+            rates[f"{name}_rate"] = float(self.outcomes[:, idx].sum() / total)
+        for row, starter in enumerate(STARTERS):
+            games = int(self.outcomes[row].sum())
+            rates[f"{starter}_share"] = games / total
+            if games:
+                for idx, name in enumerate(OUTCOMES):
+                    rates[f"{starter}/{name}_rate"] = float(self.outcomes[row, idx] / games)
+        rates["ep_len_mean"] = float(self.lengths @ np.arange(self.lengths.size) / total)
+        return rates
+
+
+class VecEpisodeStats(VecEnvWrapper):
+    """
+    Fills an EpisodeStats from the wrapped env. Wrap the backend env itself, under
+    VecSymmetryAugment, so cells are counted in the env's own orientation.
+    """
+
+    def __init__(self, venv: VecEnv, stats: Optional[EpisodeStats] = None) -> None:
+        super().__init__(venv)
+        cells = int(np.prod(self.observation_space.shape))
+        self.stats = stats if stats is not None else EpisodeStats(cells)
+        self._rows = np.arange(self.num_envs)
+        self._actions = np.zeros(self.num_envs, dtype=np.int64)
+        # The observation each game's pending action was chosen from.
+        self._obs = np.zeros((self.num_envs, cells), dtype=np.int8)
+        self._opponent_first = np.zeros(self.num_envs, dtype=np.int64)
+        self._lengths = np.zeros(self.num_envs, dtype=np.int64)
+
+    def reset(self) -> VecEnvObs:
+        obs = self.venv.reset()
+        self._lengths.fill(0)
+        self._record_starts(self._rows, obs)
+        self._obs[:] = obs
+        return obs
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._actions[:] = np.asarray(actions).reshape(self.num_envs)
+        self.venv.step_async(actions)
+
+    def step_wait(self) -> VecEnvStepReturn:
+        obs, rewards, dones, infos = self.venv.step_wait()
+        stats = self.stats
+        before = self._obs
+        legal = before[self._rows, self._actions] == 0
+        stats.agent_moves += np.bincount(self._actions[legal], minlength=stats.cells)
+        self._lengths += 1
+
+        after = obs
+        done_rows = np.flatnonzero(dones)
+        if done_rows.size:
+            # Finished rows already hold the next episode; their last board is in the info.
+            after = obs.copy()
+            outcomes = np.empty(done_rows.size, dtype=np.int64)
+            for slot, row in enumerate(done_rows):
+                info = infos[row]
+                after[row] = info["terminal_observation"]
+                outcomes[slot] = _INVALID if info.get("invalid_action") else _OUTCOME_INDEX[info["result"]]
+            np.add.at(stats.outcomes, (self._opponent_first[done_rows], outcomes), 1)
+            np.add.at(stats.lengths, self._lengths[done_rows], 1)
+            self._lengths[done_rows] = 0
+            self._record_starts(done_rows, obs)
+        stats.opponent_moves += ((after == OPPONENT_MARK) & (before != OPPONENT_MARK)).sum(axis=0)
+
+        self._obs[:] = obs
+        return obs, rewards, dones, infos
+
+    def get_state(self) -> Dict[str, Any]:
+        return {
+            "counters": {name: counts.copy() for name, counts in self.stats.counters().items()},
+            "obs": self._obs.copy(),
+            "opponent_first": self._opponent_first.copy(),
+            "lengths": self._lengths.copy(),
+        }
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        for name, counts in self.stats.counters().items():
+            counts[:] = state["counters"][name]
+        self._obs[:] = state["obs"]
+        self._opponent_first[:] = state["opponent_first"]
+        self._lengths[:] = state["lengths"]
+
+    def _record_starts(self, rows: np.ndarray, obs: np.ndarray) -> None:
+        # A fresh board holding an opponent mark means the opponent opened there.
+        opened = obs[rows] == OPPONENT_MARK
+        self._opponent_first[rows] = opened.any(axis=1)
+        self.stats.opponent_openings += opened.sum(axis=0)
+
+
+class GameStatsCallback(BaseCallback):
+    """Logs the EpisodeStats under ``game/`` every ``log_freq`` timesteps, then resets it."""
+
+    def __init__(self, stats: EpisodeStats, log_freq: int, verbose: int = 0) -> None:
+        super().__init__(verbose)
+        self.stats = stats
+        self.log_freq = log_freq
+        self._next_log = log_freq
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_rollout_end(self) -> None:
+        # Flushing at the end of a rollout lands each window in the logger dump that follows it.
+        if self.num_timesteps >= self._next_log:
+            self._next_log = self.num_timesteps + self.log_freq
+            self.flush()
+
+    def get_state(self) -> Dict[str, Any]:
+        return {"next_log": self._next_log}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self._next_log = state["next_log"]
+
+    def flush(self) -> None:
+        stats = self.stats
+        if not stats.episodes:
+            return
+        self.logger.record("game/episodes", stats.episodes)
+        for key, value in stats.rates().items():
+            self.logger.record(f"game/{key}", value)
+        cells = np.arange(stats.cells)
+        for key, counts in (
+            ("agent_moves", stats.agent_moves),
+            ("opponent_moves", stats.opponent_moves),
+            ("opponent_openings", stats.opponent_openings),
+        ):
+            if counts.any():
+                self.logger.record(f"game/{key}", np.repeat(cells, counts), exclude=_HISTOGRAM_EXCLUDE)
+        self.logger.record(
+            "game/ep_len", np.repeat(np.arange(stats.lengths.size), stats.lengths), exclude=_HISTOGRAM_EXCLUDE
+        )
+        if self.verbose:
+            rates = stats.rates()
+            print(
+                f"[game] {self.num_timesteps} steps: {stats.episodes} episodes, win {rates['win_rate']:.1%}, "
+                f"draw {rates['draw_rate']:.1%}, loss {rates['loss_rate']:.1%}, invalid {rates['invalid_rate']:.1%}"
+            )
+        stats.reset()
@@ -0,0 +1,558 @@
+"""
+Batched TicTacToe: N games stepped together as one (N, 9) int8 array.
+
+Transitions match N independent TicTacToeEnv instances seeded ``seed + rank``;
+every per-game random draw still comes from that game's own generator.
+"""
+import copy
+import multiprocessing as mp
+import os
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from gymnasium import spaces
+from gymnasium.utils import seeding
+from stable_baselines3.common.vec_env.base_vec_env import (
+    VecEnv,
+    VecEnvIndices,
+    VecEnvObs,
+    VecEnvStepReturn,
+    VecEnvWrapper,
+)
+
+from tictactoe_board import WINNING_LINES
+from tictactoe_symmetry import PERMUTATIONS
+from tictactoe_opponents import NO_MOVE, forced_table, get_opponent, perfect_table, random_fallback
+from tictactoe_selfplay import SELF_PLAY, OpponentPool
+
+AGENT_MARK = 1
+OPPONENT_MARK = 2
+CELL_BITS = (1 << np.arange(9)).astype(np.int32)
+PERMUTATION_ARRAY = np.array(PERMUTATIONS, dtype=np.int64)
+
+# LINE_MATRIX[cell, line] is 1 when the cell lies on that winning line.
+LINE_MATRIX = np.zeros((9, len(WINNING_LINES)), dtype=np.int8)
+for _line, _cells in enumerate(WINNING_LINES):
+    LINE_MATRIX[list(_cells), _line] = 1
+
+
+def line_counts(boards: np.ndarray, mark: int) -> np.ndarray:
+    """(N, 8) count of ``mark`` on each winning line."""
+    return (boards == mark).astype(np.int8) @ LINE_MATRIX
+
+
+class BatchedTicTacToeVecEnv(VecEnv):
+    render_mode = None
+
+    def __init__(
+        self,
+        num_envs: int,
+        invalid_penalty: float = -1.0,
+        draw_reward: float = 0.0,
+        step_penalty: float = -0.01,
+        opponent_first_prob: float = 0.5,
+        opponent: str = "heuristic",
+        seed: Optional[int] = None,
+        opponent_pool: Optional[OpponentPool] = None,
+    ) -> None:
+        self.invalid_penalty = invalid_penalty
+        self.draw_reward = draw_reward
+        self.step_penalty = step_penalty
+        self.opponent_first_prob = opponent_first_prob
+        if opponent != SELF_PLAY:
+            get_opponent(opponent)
+        self.opponent = opponent
+        self.opponent_pool = opponent_pool if opponent_pool is not None else OpponentPool(seed=seed)
+        self.agent_mark = AGENT_MARK
+        self.opponent_mark = OPPONENT_MARK
+
+        self.boards = np.zeros((num_envs, 9), dtype=np.int8)
+        # Self-play: the pool snapshot each game is facing (None falls back to the heuristic).
+        self.row_opponents: List[Any] = [None] * num_envs
+        self.np_randoms: List[np.random.Generator] = [
+            seeding.np_random(None if seed is None else seed + rank)[0] for rank in range(num_envs)
+        ]
+        self.actions = np.zeros(num_envs, dtype=np.int64)
+
+        super().__init__(
+            num_envs,
+            spaces.Box(low=0, high=2, shape=(9,), dtype=np.int8),
+            spaces.Discrete(9),
+        )
+        self.metadata = {"render_modes": ["human"]}
+
+    def reset(self) -> VecEnvObs:
+        for rank, seed in enumerate(self._seeds):
+            if seed is not None:
+                self.np_randoms[rank] = seeding.np_random(seed)[0]
+        self._reset_seeds()
+        self._reset_options()
+        self._reset_rows(np.arange(self.num_envs))
+        return self.boards.copy()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self) -> VecEnvStepReturn:
+        boards = self.boards
+        rows = np.arange(self.num_envs)
+        actions = self.actions
+        rewards = np.full(self.num_envs, self.step_penalty, dtype=np.float32)
+
+        invalid = boards[rows, actions] != 0
+        valid = ~invalid
+        boards[rows[valid], actions[valid]] = AGENT_MARK
+
+        agent_win = valid & (line_counts(boards, AGENT_MARK) == 3).any(axis=1)
+        full = (boards != 0).all(axis=1)
+        agent_draw = valid & ~agent_win & full
+        needs_reply = valid & ~agent_win & ~full
+
+        reply_rows = np.flatnonzero(needs_reply)
+        if reply_rows.size:
+            boards[reply_rows, self._opponent_moves(reply_rows)] = OPPONENT_MARK
+        opponent_win = needs_reply & (line_counts(boards, OPPONENT_MARK) == 3).any(axis=1)
+        full = (boards != 0).all(axis=1)
+        opponent_draw = needs_reply & ~opponent_win & full
+
+        rewards[invalid] = self.invalid_penalty
+        rewards[agent_win] = 1.0
+        rewards[opponent_win] = -1.0
+        rewards[agent_draw | opponent_draw] = self.draw_reward
+        dones = invalid | agent_win | agent_draw | opponent_win | opponent_draw
+
+        infos: List[Dict[str, Any]] = [{} for _ in range(self.num_envs)]
+        for name, mask in (
+            ("win", agent_win),
+            ("draw", agent_draw | opponent_draw),
+            ("loss", opponent_win),
+        ):
+            for row in np.flatnonzero(mask):
+                infos[row]["result"] = name
+        for row in np.flatnonzero(invalid):
+            infos[row]["invalid_action"] = True
+        for info in infos:
+            info["TimeLimit.truncated"] = False
+
+        masks = boards == 0
+        for info, mask in zip(infos, masks):
+            info["action_mask"] = mask
+        done_rows = np.flatnonzero(dones)
+        if done_rows.size:
+            for row in done_rows:
+                infos[row]["terminal_observation"] = boards[row].copy()
+                snapshot = self.row_opponents[row]
+                if snapshot is not None and "result" in infos[row]:
+                    snapshot.record(infos[row]["result"])
+            self._reset_rows(done_rows)
+
+        return boards.copy(), rewards, dones, infos
+
+    def action_masks(self) -> np.ndarray:
+        """(N, 9) legal moves for the agent in every game: True on empty cells."""
+        return self.boards == 0
+
+    def get_state(self) -> Dict[str, Any]:
+        """Boards, pending actions and every game's generator, for tictactoe_checkpoint."""
+        return {
+            "boards": self.boards.copy(),
+            "actions": self.actions.copy(),
+            "np_randoms": [rng.bit_generator.state for rng in self.np_randoms],
+            "row_opponents": list(self.row_opponents),
+            "reset_infos": copy.deepcopy(self.reset_infos),
+        }
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self.boards[:] = state["boards"]
+        self.actions = state["actions"].copy()
+        for rng, rng_state in zip(self.np_randoms, state["np_randoms"]):
+            rng.bit_generator.state = rng_state
+        self.row_opponents = list(state["row_opponents"])
+        self.reset_infos = copy.deepcopy(state["reset_infos"])
+
+    def close(self) -> None:
+        return None
+
+    def render(self, mode: Optional[str] = None) -> None:
+        symbols = {0: ".", AGENT_MARK: "X", OPPONENT_MARK: "O"}
+        for board in self.boards:
+            print("\n".join(" ".join(symbols[int(v)] for v in board[r * 3 : r * 3 + 3]) for r in range(3)))
+            print()
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> List[Any]:
+        ranks = self._get_indices(indices)
+        if attr_name == "np_random":
+            return [self.np_randoms[rank] for rank in ranks]
+        if attr_name == "board":
+            return [self.boards[rank] for rank in ranks]
+        value = getattr(self, attr_name)
+        return [value for _ in ranks]
+
+    def set_attr(self, attr_name: str, value: Any, indices: VecEnvIndices = None) -> None:
+        # Reward shaping and opponent settings are shared by every game in the batch.
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices: VecEnvIndices = None, **method_kwargs) -> List[Any]:
+        # action_masks is the one per-env method MaskablePPO calls; it comes straight from the batch.
+        if method_name == "action_masks":
+            masks = self.action_masks()
+            return [masks[rank] for rank in self._get_indices(indices)]
+        raise NotImplementedError(f"{type(self).__name__} does not expose per-env method '{method_name}'.")
+
+    def env_is_wrapped(self, wrapper_class: type, indices: VecEnvIndices = None) -> List[bool]:
+        return [False for _ in self._get_indices(indices)]
+
+    def _reset_rows(self, rows: Sequence[int]) -> None:
+        rows = np.asarray(rows, dtype=np.int64)
+        self.boards[rows] = 0
+        if self.opponent == SELF_PLAY:
+            for row, snapshot in zip(rows, self.opponent_pool.sample(rows.size)):
+                self.row_opponents[row] = snapshot
+        starts = np.array(
+            [self.np_randoms[row].random() < self.opponent_first_prob for row in rows], dtype=bool
+        )
+        start_rows = rows[starts]
+        if start_rows.size:
+            self.boards[start_rows, self._opponent_moves(start_rows)] = OPPONENT_MARK
+        for row, started in zip(rows, starts):
+            self.reset_infos[row] = {"opponent_started": True} if started else {}
+            self.reset_infos[row]["action_mask"] = self.boards[row] == 0
+
+    def _opponent_moves(self, rows: np.ndarray) -> np.ndarray:
+        """Reply for each row from the opponent's lookup table; random draws stay per game."""
+        boards = self.boards[rows]
+        agent = (boards == AGENT_MARK).astype(np.int32) @ CELL_BITS
+        opponent = (boards == OPPONENT_MARK).astype(np.int32) @ CELL_BITS
+        empty = 0x1FF & ~(agent | opponent)
+
+        if self.opponent == SELF_PLAY:
+            snapshots = [self.row_opponents[row] for row in rows]
+            pooled = np.array([snapshot is not None for snapshot in snapshots], dtype=bool)
+            if pooled.all():
+                return self.opponent_pool.act(boards, snapshots)
+            moves = self._heuristic_moves(rows, agent, opponent, empty)
+            if pooled.any():
+                positions = np.flatnonzero(pooled)
+                moves[positions] = self.opponent_pool.act(boards[positions], [snapshots[pos] for pos in positions])
+            return moves
+
+        if self.opponent == "heuristic":
+            return self._heuristic_moves(rows, agent, opponent, empty)
+
+        if self.opponent == "perfect":
+            moves = perfect_table()[agent | opponent << 9].astype(np.int64)
+            pending = np.flatnonzero(moves == NO_MOVE)
+        else:
+            moves = np.full(rows.size, NO_MOVE, dtype=np.int64)
+            pending = np.arange(rows.size)
+        policy = get_opponent(self.opponent)
+        for pos in pending:
+            moves[pos] = policy(int(agent[pos]), int(opponent[pos]), self.np_randoms[rows[pos]])
+        return moves
+
+    def _heuristic_moves(
+        self, rows: np.ndarray, agent: np.ndarray, opponent: np.ndarray, empty: np.ndarray
+    ) -> np.ndarray:
+        moves = forced_table()[agent | opponent << 9].astype(np.int64)
+        for pos in np.flatnonzero(moves == NO_MOVE):
+            moves[pos] = random_fallback(int(empty[pos]), self.np_randoms[rows[pos]])
+        return moves
+
+
+def _chunk_bounds(num_envs: int, n_workers: int) -> List[Tuple[int, int]]:
+    base, extra = divmod(num_envs, n_workers)
+    bounds = []
+    start = 0
+    for worker in range(n_workers):
+        stop = start + base + (1 if worker < extra else 0)
+        bounds.append((start, stop))
+        start = stop
+    return bounds
+
+
+def _shared_views(buffers: Dict[str, Any], num_envs: int) -> Dict[str, np.ndarray]:
+    return {
+        "obs": np.frombuffer(buffers["obs"], dtype=np.int8).reshape(num_envs, 9),
+        "rewards": np.frombuffer(buffers["rewards"], dtype=np.float32),
+        "dones": np.frombuffer(buffers["dones"], dtype=np.bool_),
+        "actions": np.frombuffer(buffers["actions"], dtype=np.int64),
+    }
+
+
+def _shared_memory_worker(
+    remote: Connection,
+    parent_remote: Connection,
+    buffers: Dict[str, Any],
+    num_envs: int,
+    start: int,
+    stop: int,
+    env_kwargs: Dict[str, Any],
+    cpu: Optional[int],
+) -> None:
+    parent_remote.close()
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+    views = _shared_views(buffers, num_envs)
+    env = BatchedTicTacToeVecEnv(stop - start, **env_kwargs)
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                obs, rewards, dones, infos = env.step(views["actions"][start:stop])
+                views["obs"][start:stop] = obs
+                views["rewards"][start:stop] = rewards
+                views["dones"][start:stop] = dones
+                done_rows = np.flatnonzero(dones).tolist()
+                # Only rows with a result or a reset are sent back; everything else is in shared memory.
+                # Action masks are rebuilt from the shared observations in the parent.
+                for info in infos:
+                    del info["TimeLimit.truncated"]
+                    del info["action_mask"]
+                reset_infos = {row: dict(env.reset_infos[row]) for row in done_rows}
+                for info in reset_infos.values():
+                    del info["action_mask"]
+                remote.send(({row: info for row, info in enumerate(infos) if info}, reset_infos))
+            elif cmd == "reset":
+                if data is not None:
+                    env.seed(data)
+                views["obs"][start:stop] = env.reset()
+                remote.send([{k: v for k, v in info.items() if k != "action_mask"} for info in env.reset_infos])
+            elif cmd == "get_attr":
+                remote.send(env.get_attr(data))
+            elif cmd == "set_attr":
+                remote.send(env.set_attr(*data))
+            elif cmd == "get_state":
+                remote.send(env.get_state())
+            elif cmd == "set_state":
+                env.set_state(data)
+                views["obs"][start:stop] = env.boards
+                remote.send(None)
+            elif cmd == "close":
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+    except KeyboardInterrupt:
+        pass
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Splits N games across worker processes, each stepping its chunk as a
+    BatchedTicTacToeVecEnv. Observations, rewards, dones and actions live in
+    shared memory; only infos for finished games cross the pipe.
+
+    :param start_method: multiprocessing start method; defaults to forkserver where available, else spawn.
+    :param cpu_affinity: CPU ids to pin workers to, assigned round-robin (Linux only).
+    """
+
+    render_mode = None
+
+    def __init__(
+        self,
+        num_envs: int,
+        n_workers: int,
+        start_method: Optional[str] = None,
+        cpu_affinity: Optional[Sequence[int]] = None,
+        seed: Optional[int] = None,
+        **env_kwargs: Any,
+    ) -> None:
+        if env_kwargs.get("opponent") == SELF_PLAY:
+            raise ValueError("Self-play needs the learning policy in-process; use the batched backend.")
+        if not 1 <= n_workers <= num_envs:
+            raise ValueError(f"n_workers must be between 1 and num_envs ({num_envs}), got {n_workers}.")
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self._buffers = {
+            "obs": ctx.RawArray("b", num_envs * 9),
+            "rewards": ctx.RawArray("f", num_envs),
+            "dones": ctx.RawArray("B", num_envs),
+            "actions": ctx.RawArray("q", num_envs),
+        }
+        self._views = _shared_views(self._buffers, num_envs)
+        self._bounds = _chunk_bounds(num_envs, n_workers)
+        self.env_kwargs = env_kwargs
+        self.waiting = False
+        self.closed = False
+
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(n_workers)])
+        self.processes = []
+        for worker, (work_remote, remote, (start, stop)) in enumerate(
+            zip(work_remotes, self.remotes, self._bounds)
+        ):
+            kwargs = dict(env_kwargs, seed=None if seed is None else seed + start)
+            cpu = cpu_affinity[worker % len(cpu_affinity)] if cpu_affinity else None
+            args = (work_remote, remote, self._buffers, num_envs, start, stop, kwargs, cpu)
+            process = ctx.Process(target=_shared_memory_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        super().__init__(
+            num_envs,
+            spaces.Box(low=0, high=2, shape=(9,), dtype=np.int8),
+            spaces.Discrete(9),
+        )
+        self.metadata = {"render_modes": []}
+
+    def reset(self) -> VecEnvObs:
+        for remote, (start, _) in zip(self.remotes, self._bounds):
+            remote.send(("reset", self._seeds[start]))
+        for remote, (start, _) in zip(self.remotes, self._bounds):
+            for row, info in enumerate(remote.recv()):
+                self.reset_infos[start + row] = info
+        for info, mask in zip(self.reset_infos, self.action_masks()):
+            info["action_mask"] = mask
+        self._reset_seeds()
+        self._reset_options()
+        return self._views["obs"].copy()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._views["actions"][:] = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self) -> VecEnvStepReturn:
+        infos: List[Dict[str, Any]] = [{} for _ in range(self.num_envs)]
+        for remote, (start, _) in zip(self.remotes, self._bounds):
+            step_infos, reset_infos = remote.recv()
+            for row, info in step_infos.items():
+                infos[start + row] = info
+            for row, info in reset_infos.items():
+                self.reset_infos[start + row] = info
+        self.waiting = False
+        masks = self.action_masks()
+        for row, info in enumerate(infos):
+            info["TimeLimit.truncated"] = False
+            terminal = info.get("terminal_observation")
+            if terminal is None:
+                info["action_mask"] = masks[row]
+            else:
+                info["action_mask"] = terminal == 0
+                self.reset_infos[row]["action_mask"] = masks[row]
+        return (
+            self._views["obs"].copy(),
+            self._views["rewards"].copy(),
+            self._views["dones"].copy(),
+            infos,
+        )
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> List[Any]:
+        values: List[Any] = []
+        for remote in self.remotes:
+            remote.send(("get_attr", attr_name))
+        for remote in self.remotes:
+            values.extend(remote.recv())
+        return [values[rank] for rank in self._get_indices(indices)]
+
+    def set_attr(self, attr_name: str, value: Any, indices: VecEnvIndices = None) -> None:
+        # Settings are shared by every game, so every worker gets the new value.
+        for remote in self.remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        for remote in self.remotes:
+            remote.recv()
+
+    def action_masks(self) -> np.ndarray:
+        """(N, 9) legal moves for the agent, read from the shared observations."""
+        return self._views["obs"] == 0
+
+    def get_state(self) -> Dict[str, Any]:
+        for remote in self.remotes:
+            remote.send(("get_state", None))
+        return {"workers": [remote.recv() for remote in self.remotes], "reset_infos": copy.deepcopy(self.reset_infos)}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        for remote, worker_state in zip(self.remotes, state["workers"]):
+            remote.send(("set_state", worker_state))
+        for remote in self.remotes:
+            remote.recv()
+        self.reset_infos = copy.deepcopy(state["reset_infos"])
+
+    def has_attr(self, attr_name: str) -> bool:
+        # Answered locally: the default probes the workers with get_attr, which would pickle their envs.
+        if attr_name == "action_masks":
+            return True
+        return super().has_attr(attr_name)
+
+    def env_method(self, method_name: str, *method_args, indices: VecEnvIndices = None, **method_kwargs) -> List[Any]:
+        if method_name == "action_masks":
+            masks = self.action_masks()
+            return [masks[rank] for rank in self._get_indices(indices)]
+        raise NotImplementedError(f"{type(self).__name__} does not expose per-env method '{method_name}'.")
+
+    def env_is_wrapped(self, wrapper_class: type, indices: VecEnvIndices = None) -> List[bool]:
+        return [False for _ in self._get_indices(indices)]
+
+
+class VecSymmetryAugment(VecEnvWrapper):
+    """
+    Shows every episode to the agent in one of the 8 board orientations, drawn at
+    random per episode: observations are rotated/reflected and the agent's actions
+    are mapped back before they reach the wrapped env. Works with any backend.
+    """
+
+    def __init__(self, venv: VecEnv, seed: Optional[int] = None) -> None:
+        super().__init__(venv)
+        self.rng = np.random.default_rng(seed)
+        self.symmetries = np.zeros(self.num_envs, dtype=np.int64)
+
+    def reset(self) -> VecEnvObs:
+        obs = self.venv.reset()
+        self.symmetries = self.rng.integers(0, len(PERMUTATIONS), size=self.num_envs)
+        return self._transform(obs, self.symmetries)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+        self.venv.step_async(PERMUTATION_ARRAY[self.symmetries, actions])
+
+    def step_wait(self) -> VecEnvStepReturn:
+        obs, rewards, dones, infos = self.venv.step_wait()
+        done_rows = np.flatnonzero(dones)
+        for row in done_rows:
+            terminal = infos[row].get("terminal_observation")
+            if terminal is not None:
+                infos[row]["terminal_observation"] = terminal[PERMUTATIONS[self.symmetries[row]], ...]
+        if done_rows.size:
+            self.symmetries[done_rows] = self.rng.integers(0, len(PERMUTATIONS), size=done_rows.size)
+        obs = self._transform(obs, self.symmetries)
+        for row, info in enumerate(infos):
+            if "action_mask" in info:
+                terminal = info.get("terminal_observation")
+                info["action_mask"] = (obs[row] if terminal is None else terminal) == 0
+        return obs, rewards, dones, infos
+
+    def get_state(self) -> Dict[str, Any]:
+        return {"rng": self.rng.bit_generator.state, "symmetries": self.symmetries.copy()}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self.rng.bit_generator.state = state["rng"]
+        self.symmetries = state["symmetries"].copy()
+
+    def env_method(self, method_name: str, *method_args, indices: VecEnvIndices = None, **method_kwargs) -> List[Any]:
+        results = self.venv.env_method(method_name, *method_args, indices=indices, **method_kwargs)
+        if method_name != "action_masks":
+            return results
+        # Masks come back in the wrapped env's orientation; show them as the agent sees the board.
+        ranks = self._get_indices(indices)
+        return [mask[PERMUTATION_ARRAY[self.symmetries[rank]]] for rank, mask in zip(ranks, results)]
+
+    @staticmethod
+    def _transform(obs: np.ndarray, symmetries: np.ndarray) -> np.ndarray:
+        rows = np.arange(obs.shape[0])[:, None]
+        return obs[rows, PERMUTATION_ARRAY[symmetries]]
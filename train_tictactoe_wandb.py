@@ -1,51 +1,144 @@
 import argparse
+import multiprocessing as mp
 import os
-from typing import Any, Callable, Dict
+import time
+from typing import Any, Callable, Dict, List, Optional
 
+import numpy as np
 import wandb
 from stable_baselines3 import PPO
-from stable_baselines3.common.vec_env import DummyVecEnv, VecMonitor
+from stable_baselines3.common.callbacks import BaseCallback, CallbackList
+from stable_baselines3.common.vec_env import DummyVecEnv, VecEnv, VecMonitor, unwrap_vec_wrapper
 from wandb.integration.sb3 import WandbCallback
 
+from tictactoe_checkpoint import AsyncCheckpointCallback, find_checkpoint, load_training_state, restore_training_state
 from tictactoe_env import TicTacToeEnv
+from tictactoe_exploitability import ExploitabilityCallback
+from tictactoe_opponents import opponent_names
+from tictactoe_profiling import ProfilingCallback, VecStepTimer, parse_window
+from tictactoe_selfplay import POOL_STRATEGIES, SELF_PLAY, OpponentPool, SelfPlayCallback
+from tictactoe_telemetry import GameStatsCallback, VecEpisodeStats
+from tictactoe_vec_env import BatchedTicTacToeVecEnv, SharedMemoryVecEnv, VecSymmetryAugment
 
+VEC_ENV_BACKENDS = ("dummy", "subproc", "batched")
 
-def build_vec_env(args: argparse.Namespace) -> VecMonitor:
+
+def parse_cpu_list(spec: str) -> Optional[List[int]]:
+    """Parse a CPU list like "0-7,16" into ids; an empty string means no pinning."""
+    if not spec:
+        return None
+    cpus: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+def build_vec_env(args: argparse.Namespace, opponent_pool: Optional[OpponentPool] = None) -> VecEnv:
     env_kwargs: Dict[str, Any] = {
         "invalid_penalty": args.invalid_penalty,
         "draw_reward": args.draw_reward,
         "step_penalty": args.step_penalty,
         "opponent_first_prob": args.opponent_first_prob,
+        "opponent": args.opponent,
     }
+    if args.opponent == SELF_PLAY:
+        env_kwargs["opponent_pool"] = opponent_pool
+
+    if args.vec_env == "batched":
+        vec_env: VecEnv = BatchedTicTacToeVecEnv(args.n_envs, seed=args.seed, **env_kwargs)
+    elif args.vec_env == "subproc":
+        n_workers = args.n_workers or min(os.cpu_count() or 1, args.n_envs)
+        vec_env = SharedMemoryVecEnv(
+            args.n_envs,
+            n_workers=n_workers,
+            start_method=args.start_method,
+            cpu_affinity=parse_cpu_list(args.cpu_affinity),
+            seed=args.seed,
+            **env_kwargs,
+        )
+    else:
+
+        def _make_env(rank: int) -> Callable[[], TicTacToeEnv]:
+            def _init() -> TicTacToeEnv:
+                env = TicTacToeEnv(**env_kwargs)
+                env.action_space.seed(args.seed + rank)
+                return env
+
+            return _init
+
+        vec_env = DummyVecEnv([_make_env(idx) for idx in range(args.n_envs)])
+        # Seeded on the first reset, like the other backends, so a --seed gives the same games on all of them.
+        vec_env.seed(args.seed)
 
-    def _make_env(rank: int) -> Callable[[], TicTacToeEnv]:
-        def _init() -> TicTacToeEnv:
-            env = TicTacToeEnv(**env_kwargs)
-            env.reset(seed=args.seed + rank)
-            env.action_space.seed(args.seed + rank)
-            return env
+    if getattr(args, "stats_freq", 0) > 0:
+        # Under the augmentation, so move histograms stay in the env's orientation.
+        vec_env = VecEpisodeStats(vec_env)
+    if args.symmetry_augment:
+        vec_env = VecSymmetryAugment(vec_env, seed=args.seed)
+    if getattr(args, "profile", False):
+        # Timers inside and outside VecMonitor split env time from monitor bookkeeping.
+        return VecStepTimer(VecMonitor(VecStepTimer(vec_env)))
+    return VecMonitor(vec_env)
 
-        return _init
 
-    env_fns = [_make_env(idx) for idx in range(args.n_envs)]
-    return VecMonitor(DummyVecEnv(env_fns))
+def measure_throughput(args: argparse.Namespace, steps: int) -> Dict[str, float]:
+    """Env steps/s for each --vec-env backend with random actions, no policy in the loop."""
+    rates: Dict[str, float] = {}
+    for backend in VEC_ENV_BACKENDS:
+        vec_env = build_vec_env(argparse.Namespace(**{**vars(args), "vec_env": backend}))
+        rng = np.random.default_rng(args.seed)
+        actions = rng.integers(0, 9, size=(steps, args.n_envs))
+        vec_env.reset()
+        start = time.perf_counter()
+        for step_actions in actions:
+            vec_env.step(step_actions)
+        elapsed = time.perf_counter() - start
+        vec_env.close()
+        rates[backend] = steps * args.n_envs / elapsed
+    return rates
 
 
-def train(args: argparse.Namespace) -> None:
+def print_throughput(rates: Dict[str, float], n_envs: int) -> None:
+    print(f"Env throughput with {n_envs} envs:")
+    for backend, rate in rates.items():
+        print(f"  {backend:<8} {rate:>14,.0f} steps/s")
+
+
+def train(args: argparse.Namespace) -> Dict[str, Any]:
     os.makedirs("runs", exist_ok=True)
     os.makedirs("models", exist_ok=True)
 
-    wandb_mode = "online" if os.getenv("WANDB_API_KEY") else "offline"
+    resume: Optional[Dict[str, Any]] = None
+    if args.resume:
+        try:
+            checkpoint = find_checkpoint(args.resume)
+            resume = load_training_state(checkpoint)
+        except ValueError as exc:
+            raise SystemExit(str(exc)) from None
+        # Continue with the arguments the run was started with, or it would not continue the same run.
+        args = argparse.Namespace(**{**resume["args"], "resume": args.resume})
+        print(f"[checkpoint] Resuming run {resume['run_id']} from {checkpoint} at {resume['timesteps']} steps")
+
+    wandb_mode = os.getenv("WANDB_MODE") or ("online" if os.getenv("WANDB_API_KEY") else "offline")
     run = wandb.init(
         project=args.project,
         entity=args.entity,
         group=args.group or None,
         notes=args.notes or None,
+        id=resume["run_id"] if resume else None,
+        resume="allow" if resume else None,
         config={
-            "algo": "PPO",
+            "algo": "MaskablePPO" if args.action_masking else "PPO",
             "env": "TicTacToeEnv",
             "total_timesteps": args.total_timesteps,
             "n_envs": args.n_envs,
+            "vec_env": args.vec_env,
+            "n_workers": args.n_workers,
             "learning_rate": args.learning_rate,
             "n_steps": args.n_steps,
             "batch_size": args.batch_size,
@@ -59,45 +152,124 @@ def train(args: argparse.Namespace) -> None:
             "draw_reward": args.draw_reward,
             "step_penalty": args.step_penalty,
             "opponent_first_prob": args.opponent_first_prob,
+            "opponent": args.opponent,
+            "symmetry_augment": args.symmetry_augment,
+            "eval_freq": args.eval_freq,
+            "action_masking": args.action_masking,
+            "profile": args.profile,
+            "pool_size": args.pool_size,
+            "pool_strategy": args.pool_strategy,
+            "snapshot_freq": args.snapshot_freq,
+            "stats_freq": args.stats_freq,
+            "checkpoint_freq": args.checkpoint_freq,
         },
         sync_tensorboard=True,
         mode=wandb_mode,
     )
 
-    vec_env = build_vec_env(args)
+    opponent_pool = None
+    if args.opponent == SELF_PLAY:
+        opponent_pool = OpponentPool(args.pool_size, args.pool_strategy, seed=args.seed)
+    vec_env = build_vec_env(args, opponent_pool)
+    start = time.perf_counter()
 
-    model = PPO(
-        "MlpPolicy",
-        vec_env,
-        learning_rate=args.learning_rate,
-        n_steps=args.n_steps,
-        batch_size=args.batch_size,
-        gamma=args.gamma,
-        gae_lambda=args.gae_lambda,
-        clip_range=args.clip_range,
-        ent_coef=args.ent_coef,
-        vf_coef=args.vf_coef,
-        verbose=1,
-        tensorboard_log=os.path.join("runs", run.id),
-        seed=args.seed,
-    )
+    if args.action_masking:
+        # Optional dependency: only needed for the masked variant.
+        from sb3_contrib import MaskablePPO
 
-    model.learn(
-        total_timesteps=args.total_timesteps,
-        callback=WandbCallback(
+        algo = MaskablePPO
+    else:
+        algo = PPO
+    if resume is not None:
+        # force_reset=False keeps the observation the interrupted rollout would have continued from.
+        model = algo.load(checkpoint, env=vec_env, force_reset=False)
+    else:
+        model = algo(
+            "MlpPolicy",
+            vec_env,
+            learning_rate=args.learning_rate,
+            n_steps=args.n_steps,
+            batch_size=args.batch_size,
+            gamma=args.gamma,
+            gae_lambda=args.gae_lambda,
+            clip_range=args.clip_range,
+            ent_coef=args.ent_coef,
+            vf_coef=args.vf_coef,
+            verbose=1,
+            tensorboard_log=os.path.join("runs", run.id),
+            seed=args.seed,
+        )
+
+    callbacks: List[BaseCallback] = [
+        WandbCallback(
             gradient_save_freq=0,
             model_save_path=None,
             log="all",
             verbose=2,
-        ),
+        )
+    ]
+    exploitability = None
+    if args.eval_freq > 0:
+        exploitability = ExploitabilityCallback(args.eval_freq, masked=args.action_masking, verbose=1)
+        callbacks.append(exploitability)
+    if args.stats_freq > 0:
+        callbacks.append(GameStatsCallback(unwrap_vec_wrapper(vec_env, VecEpisodeStats).stats, args.stats_freq))
+    if args.profile:
+        monitor_timer = vec_env
+        env_timer = monitor_timer.venv.venv
+        callbacks.append(
+            ProfilingCallback(
+                env_timer,
+                monitor_timer,
+                window=parse_window(args.profile_window),
+                dump_dir=os.path.join("runs", run.id),
+                verbose=1,
+            )
+        )
+    if opponent_pool is not None:
+        if resume is None:
+            # Seed the pool before the first reset so no episode falls back to the heuristic.
+            opponent_pool.add(model.policy, label="0")
+        callbacks.append(SelfPlayCallback(opponent_pool, args.snapshot_freq, verbose=1))
+    if args.checkpoint_freq > 0:
+        callbacks.append(
+            AsyncCheckpointCallback(
+                os.path.join("models", run.id),
+                args.checkpoint_freq,
+                keep=args.keep_checkpoints,
+                keep_every=args.keep_checkpoint_every,
+                callbacks=callbacks,
+                pool=opponent_pool,
+                extra={"run_id": run.id, "args": vars(args)},
+                verbose=1,
+            )
+        )
+    if resume is not None:
+        restore_training_state(model, resume, callbacks, opponent_pool)
+
+    model.learn(
+        total_timesteps=args.total_timesteps - model.num_timesteps,
+        callback=CallbackList(callbacks),
+        reset_num_timesteps=resume is None,
     )
 
-    model.save(os.path.join("models", f"{run.id}.zip"))
+    model_path = os.path.join("models", f"{run.id}.zip")
+    model.save(model_path)
+    episodes = list(model.ep_info_buffer)
+    summary = {
+        "run_id": run.id,
+        "model_path": model_path,
+        "ep_rew_mean": float(np.mean([ep["r"] for ep in episodes])) if episodes else float("nan"),
+        "ep_len_mean": float(np.mean([ep["l"] for ep in episodes])) if episodes else float("nan"),
+        "seconds": time.perf_counter() - start,
+        "curve": exploitability.history if exploitability is not None else [],
+    }
     vec_env.close()
     run.finish()
+    return summary
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="Train PPO on TicTacToe with Weights & Biases logging."
     )
@@ -107,6 +279,41 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--notes", type=str, default=None, help="Optional W&B notes.")
     parser.add_argument("--total-timesteps", type=int, default=500_000, help="Timesteps to train.")
     parser.add_argument("--n-envs", type=int, default=8, help="Parallel environments.")
+    parser.add_argument(
+        "--vec-env",
+        type=str,
+        choices=VEC_ENV_BACKENDS,
+        default="dummy",
+        help=(
+            "Vectorized env backend: one TicTacToeEnv per slot, worker processes stepping "
+            "chunks over shared memory, or all games in one NumPy array."
+        ),
+    )
+    parser.add_argument(
+        "--n-workers",
+        type=int,
+        default=0,
+        help="Worker processes for --vec-env subproc (0 = one per CPU, at most n-envs).",
+    )
+    parser.add_argument(
+        "--start-method",
+        type=str,
+        choices=mp.get_all_start_methods(),
+        default=None,
+        help="Multiprocessing start method for --vec-env subproc (default: forkserver, else spawn).",
+    )
+    parser.add_argument(
+        "--cpu-affinity",
+        type=str,
+        default="",
+        help='CPUs to pin subproc workers to, e.g. "0-15" (Linux only; default: no pinning).',
+    )
+    parser.add_argument(
+        "--benchmark-steps",
+        type=int,
+        default=0,
+        help="If set, report env steps/s for every --vec-env backend over this many steps and exit.",
+    )
     parser.add_argument("--learning-rate", type=float, default=3e-4, help="Optimizer learning rate.")
     parser.add_argument("--n-steps", type=int, default=256, help="Rollout steps per environment.")
     parser.add_argument("--batch-size", type=int, default=512, help="Batch size for PPO updates.")
@@ -124,9 +331,93 @@ def parse_args() -> argparse.Namespace:
         default=0.5,
         help="Probability that the opponent moves first after reset.",
     )
+    parser.add_argument(
+        "--opponent",
+        type=str,
+        choices=opponent_names() + [SELF_PLAY],
+        default="heuristic",
+        help="Scripted opponent strength, or 'self' to play frozen snapshots of the policy (needs --vec-env batched).",
+    )
+    parser.add_argument("--pool-size", type=int, default=10, help="Snapshots kept in the self-play pool.")
+    parser.add_argument(
+        "--pool-strategy",
+        type=str,
+        choices=POOL_STRATEGIES,
+        default="latest",
+        help="How each self-play episode picks its opponent from the pool.",
+    )
+    parser.add_argument(
+        "--snapshot-freq",
+        type=int,
+        default=20_000,
+        help="Timesteps between policy snapshots added to the self-play pool.",
+    )
+    parser.add_argument(
+        "--symmetry-augment",
+        action="store_true",
+        help="Show each episode in a random rotation/reflection of the board (data augmentation).",
+    )
+    parser.add_argument(
+        "--action-masking",
+        action="store_true",
+        help="Train MaskablePPO (sb3-contrib) so the policy only samples empty cells.",
+    )
+    parser.add_argument(
+        "--eval-freq",
+        type=int,
+        default=0,
+        help="Timesteps between exact evaluations against the solved game, logged under exploit/ (0, the default, disables).",
+    )
+    parser.add_argument(
+        "--stats-freq",
+        type=int,
+        default=0,
+        help="Timesteps between game/ outcome rates and move histograms in TensorBoard/W&B (0, the default, disables).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Log per-iteration rollout/optimization and env/monitor/policy timings under profile/.",
+    )
+    parser.add_argument(
+        "--profile-window",
+        type=str,
+        default="",
+        help=(
+            'With --profile, record PPO iterations START[:STOP] (1-based) with cProfile and write '
+            "runs/<run>/profile-*.prof (pstats format, e.g. for snakeviz)."
+        ),
+    )
+    parser.add_argument(
+        "--checkpoint-freq",
+        type=int,
+        default=0,
+        help="Timesteps between checkpoints in models/<run>/, written in the background (0, the default, disables).",
+    )
+    parser.add_argument("--keep-checkpoints", type=int, default=3, help="Newest checkpoints kept on disk.")
+    parser.add_argument(
+        "--keep-checkpoint-every",
+        type=int,
+        default=0,
+        help="Also keep the first checkpoint of every N timesteps for later evaluation (0 keeps none).",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        default="",
+        help="Checkpoint, or run directory (its newest checkpoint), to continue with its saved arguments.",
+    )
     parser.add_argument("--seed", type=int, default=0, help="Random seed.")
-    return parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.opponent == SELF_PLAY and args.vec_env != "batched":
+        # The other backends would run one policy forward pass per env per step for the pool opponents.
+        parser.error("--opponent self needs --vec-env batched, which answers all envs' pool opponents in one batch.")
+    return args
 
 
 if __name__ == "__main__":
-    train(parse_args())
+    cli_args = parse_args()
+    if cli_args.benchmark_steps > 0:
+        print_throughput(measure_throughput(cli_args, cli_args.benchmark_steps), cli_args.n_envs)
+    else:
+        train(cli_args)